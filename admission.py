@@ -0,0 +1,270 @@
+"""
+Admission control for the report API.
+
+Protects InfluxDB (and with it the collectors' writes) from request floods,
+e.g. an agent loop firing year-long compare_periods requests. Every request
+gets a cost estimate in raw-hour units (one hour of raw 15s samples for all
+devices = 1), based on the length of the ranges it touches and the tier the
+query planner will answer them from:
+
+    raw 1.0/h, hourly rollups 1/240 per h, daily rollups 1/5760 per h
+
+plus a base cost of 1. Three limits apply:
+
+- per client (API token, or remote address without token): a cost-weighted
+  token bucket (`client_budget` units, refilled at `client_refill` units/s)
+  and at most `client_concurrency` requests in flight
+- global: at most `max_concurrent` admitted requests run at once, and at
+  most `max_heavy` of them may cost `heavy_cost` or more, so cheap requests
+  keep flowing while expensive ones queue
+- requests wait up to `queue_timeout` seconds for a slot (at most
+  `max_queue` waiting)
+
+Requests over a limit are rejected with AdmissionRejected carrying a
+Retry-After estimate (the report API answers 429).
+
+Usage:
+    admission = AdmissionController()
+    cost = range_cost(start, end, coverage)
+    try:
+        async with admission.admit("token:ab12cd34", cost):
+            ...   # run the query
+    except AdmissionRejected as e:
+        ...   # 429, Retry-After: e.retry_after
+"""
+
+import os
+import math
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from query_planner import plan_range
+
+logger = logging.getLogger(__name__)
+
+BASE_COST = 1.0
+# Idle clients with a full bucket are forgotten beyond this many tracked clients
+MAX_TRACKED_CLIENTS = 1024
+TIER_COST_PER_HOUR = {"raw": 1.0, "hourly": 1 / 240, "daily": 1 / 5760}
+
+
+def range_cost(start: datetime, end: datetime, coverage: Optional[tuple] = None,
+               weight: float = 1.0) -> float:
+    """
+    Estimated cost of reading [start, end) through the query planner.
+
+    Args:
+        start: Range start (naive = UTC)
+        end: Range end (naive = UTC)
+        coverage: Rollup coverage (covered_from, complete_until), None = raw only
+        weight: Share of the devices read (e.g. 0.1 for a single device)
+
+    Returns:
+        Cost in raw-hour units (without the base cost)
+    """
+    cost = 0.0
+    for segment in plan_range(start, end, coverage):
+        hours = (segment.end - segment.start).total_seconds() / 3600
+        cost += hours * TIER_COST_PER_HOUR[segment.tier]
+    return cost * weight
+
+
+class AdmissionRejected(Exception):
+    """A request exceeded a limit; retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Cost-weighted token bucket."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def take(self, cost: float) -> float:
+        """
+        Take cost tokens if available.
+
+        Returns:
+            0 if taken, otherwise seconds until enough tokens are available
+        """
+        self._refill()
+        # A request larger than the bucket needs a full bucket, not a forever wait
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if self.refill_per_second <= 0:
+            return float("inf")
+        return (cost - self.tokens) / self.refill_per_second
+
+    def refund(self, cost: float):
+        """Return tokens of a request that was not run."""
+        self.tokens = min(self.capacity, self.tokens + min(cost, self.capacity))
+
+
+class AdmissionController:
+    """Global and per-client admission limits for report API requests."""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_heavy: Optional[int] = None,
+        heavy_cost: Optional[float] = None,
+        queue_timeout: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        client_budget: Optional[float] = None,
+        client_refill: Optional[float] = None,
+        client_concurrency: Optional[int] = None
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrent: Admitted requests running at once (env REPORT_API_MAX_CONCURRENT, default 8)
+            max_heavy: Heavy requests running at once (env REPORT_API_MAX_HEAVY, default 2)
+            heavy_cost: Cost from which a request is heavy (env REPORT_API_HEAVY_COST, default 100)
+            queue_timeout: Seconds a request waits for a slot (env REPORT_API_QUEUE_TIMEOUT, default 10)
+            max_queue: Requests waiting for a slot (env REPORT_API_MAX_QUEUE, default 32)
+            client_budget: Token bucket size per client (env REPORT_API_CLIENT_BUDGET, default 2000)
+            client_refill: Tokens per second per client (env REPORT_API_CLIENT_REFILL, default 10)
+            client_concurrency: In-flight requests per client (env REPORT_API_CLIENT_CONCURRENCY, default 4)
+        """
+        self.max_concurrent = max_concurrent if max_concurrent is not None else \
+            int(os.getenv("REPORT_API_MAX_CONCURRENT", "8"))
+        self.max_heavy = max_heavy if max_heavy is not None else \
+            int(os.getenv("REPORT_API_MAX_HEAVY", "2"))
+        self.heavy_cost = heavy_cost if heavy_cost is not None else \
+            float(os.getenv("REPORT_API_HEAVY_COST", "100"))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else \
+            float(os.getenv("REPORT_API_QUEUE_TIMEOUT", "10"))
+        self.max_queue = max_queue if max_queue is not None else \
+            int(os.getenv("REPORT_API_MAX_QUEUE", "32"))
+        self.client_budget = client_budget if client_budget is not None else \
+            float(os.getenv("REPORT_API_CLIENT_BUDGET", "2000"))
+        self.client_refill = client_refill if client_refill is not None else \
+            float(os.getenv("REPORT_API_CLIENT_REFILL", "10"))
+        self.client_concurrency = client_concurrency if client_concurrency is not None else \
+            int(os.getenv("REPORT_API_CLIENT_CONCURRENCY", "4"))
+
+        self._slots = asyncio.Semaphore(max(1, self.max_concurrent))
+        self._heavy_slots = asyncio.Semaphore(max(1, self.max_heavy))
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._in_flight: Dict[str, int] = {}
+        self.queued = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _reject(self, client: str, reason: str, retry_after: float) -> AdmissionRejected:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        logger.warning(f"Admission: rejected {client} ({reason}, retry after {retry_after:.0f}s)")
+        return AdmissionRejected(reason, retry_after)
+
+    def _forget_idle_clients(self):
+        for name, bucket in list(self._buckets.items()):
+            bucket._refill()
+            if name not in self._in_flight and bucket.tokens >= bucket.capacity:
+                del self._buckets[name]
+
+    async def _acquire(self, semaphore: asyncio.Semaphore, deadline: float) -> bool:
+        try:
+            await asyncio.wait_for(semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    @asynccontextmanager
+    async def admit(self, client: str, cost: float) -> AsyncIterator[None]:
+        """
+        Hold an admission slot for the duration of the block.
+
+        Args:
+            client: Client identity (hashed token or remote address)
+            cost: Estimated request cost in raw-hour units
+
+        Raises:
+            AdmissionRejected: Client over its concurrency or rate limit, queue
+                full, or no slot within queue_timeout
+        """
+        if self._in_flight.get(client, 0) >= self.client_concurrency:
+            raise self._reject(client, "client_concurrency", 1)
+
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                self._forget_idle_clients()
+            bucket = self._buckets[client] = TokenBucket(self.client_budget, self.client_refill)
+        wait = bucket.take(cost)
+        if wait > 0:
+            raise self._reject(client, "rate_limit", min(wait, 3600))
+
+        if self.queued >= self.max_queue:
+            bucket.refund(cost)
+            raise self._reject(client, "queue_full", self.queue_timeout)
+
+        heavy = cost >= self.heavy_cost
+        deadline = time.monotonic() + self.queue_timeout
+        self._in_flight[client] = self._in_flight.get(client, 0) + 1
+        self.queued += 1
+        acquired = []
+        try:
+            # Heavy requests wait for a heavy slot first so they do not hold a general one
+            for semaphore in ([self._heavy_slots] if heavy else []) + [self._slots]:
+                if not await self._acquire(semaphore, deadline):
+                    bucket.refund(cost)
+                    raise self._reject(client, "busy_heavy" if semaphore is self._heavy_slots else "busy",
+                                       self.queue_timeout)
+                acquired.append(semaphore)
+            self.queued -= 1
+            self.running += 1
+            self.admitted += 1
+            try:
+                yield
+            finally:
+                self.running -= 1
+        finally:
+            if len(acquired) < (2 if heavy else 1):
+                self.queued -= 1
+            for semaphore in acquired:
+                semaphore.release()
+            self._in_flight[client] -= 1
+            if not self._in_flight[client]:
+                del self._in_flight[client]
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters and limits for metrics endpoints."""
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "limits": {
+                "max_concurrent": self.max_concurrent,
+                "max_heavy": self.max_heavy,
+                "heavy_cost": self.heavy_cost,
+                "queue_timeout": self.queue_timeout,
+                "client_budget": self.client_budget,
+                "client_refill": self.client_refill,
+                "client_concurrency": self.client_concurrency
+            },
+            "clients": {
+                client: {"tokens": round(bucket.tokens, 1), "in_flight": self._in_flight.get(client, 0)}
+                for client, bucket in self._buckets.items()
+            }
+        }
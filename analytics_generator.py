@@ -15,6 +15,8 @@ import csv
 from dotenv import load_dotenv
 from influxdb_client import InfluxDBClient
 
+from influx_stream import read_frame
+
 load_dotenv()
 
 logging.basicConfig(
@@ -65,28 +67,24 @@ class AnalyticsGenerator:
             |> range(start: -{days}d)
             |> filter(fn: (r) => r["_measurement"] == "event")
             |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+            |> keep(columns: ["_time", "device", "event_type", "hour_of_day", "day_of_week",
+                              "duration_seconds", "energy_wh", "peak_power", "avg_power"])
         '''
 
+        numeric = ["hour_of_day", "day_of_week", "duration_seconds", "energy_wh", "peak_power", "avg_power"]
+
         events = []
         try:
             with self._get_influx_client() as client:
-                query_api = client.query_api()
-                tables = query_api.query(query)
-
-                for table in tables:
-                    for record in table.records:
-                        event = {
-                            "timestamp": record.get_time(),
-                            "device": record.values.get("device"),
-                            "event_type": record.values.get("event_type"),
-                            "hour_of_day": int(record.values.get("hour_of_day", 0)),
-                            "day_of_week": int(record.values.get("day_of_week", 0)),
-                            "duration_seconds": record.values.get("duration_seconds", 0),
-                            "energy_wh": record.values.get("energy_wh", 0),
-                            "peak_power": record.values.get("peak_power", 0),
-                            "avg_power": record.values.get("avg_power", 0),
-                        }
-                        events.append(event)
+                frame = read_frame(
+                    client, query,
+                    columns=["_time", "device", "event_type"] + numeric,
+                    dtypes={column: "float64" for column in numeric}
+                )
+
+            frame[numeric] = frame[numeric].fillna(0)
+            frame[["hour_of_day", "day_of_week"]] = frame[["hour_of_day", "day_of_week"]].astype(int)
+            events = frame.rename(columns={"_time": "timestamp"}).to_dict("records")
 
             logger.info(f"Queried {len(events)} events from last {days} days")
 
@@ -0,0 +1,178 @@
+"""
+Async adapter for InfluxQueries used by the report API.
+
+InfluxQueries (caching, query planner, fan-out) is synchronous. Calling it
+from aiohttp handlers blocks the event loop, so one slow yearly query froze
+every other request including /health. AsyncInfluxQueries runs each query on
+a bounded thread pool and awaits the result, so concurrent requests overlap
+while at most `max_workers` queries hit InfluxDB at once.
+
+Usage:
+    queries = AsyncInfluxQueries()
+    consumption = await queries.query_today_consumption()
+    data = await queries.query_comparison("week")
+    await queries.close()
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from influx_queries import InfluxQueries
+
+logger = logging.getLogger(__name__)
+
+_EXHAUSTED = object()
+
+
+class AsyncInfluxQueries:
+    """Executor-backed async interface to InfluxQueries."""
+
+    def __init__(self, queries: Optional[InfluxQueries] = None, max_workers: Optional[int] = None):
+        """
+        Initialize the adapter.
+
+        Args:
+            queries: Wrapped InfluxQueries (default: new instance)
+            max_workers: Concurrent queries (env REPORT_API_QUERY_WORKERS, default 8)
+        """
+        self.queries = queries or InfluxQueries()
+        self.max_workers = max_workers if max_workers is not None else \
+            int(os.getenv("REPORT_API_QUERY_WORKERS", "8"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, self.max_workers), thread_name_prefix="report-query"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+
+    @property
+    def cost_per_kwh(self) -> float:
+        return self.queries.cost_per_kwh
+
+    def _track(self, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            self._pending -= 1
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    async def _run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking query on the pool without blocking the event loop."""
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(partial(self._track, fn, *args, **kwargs))
+        future.add_done_callback(self._discard_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _discard_cancelled(self, future):
+        # Queued queries of disconnected clients never start
+        if future.cancelled():
+            with self._lock:
+                self._pending -= 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run another blocking InfluxDB helper (e.g. the series export) on the pool."""
+        return await self._run(fn, *args, **kwargs)
+
+    async def iterate(self, iterator: Iterator) -> AsyncIterator:
+        """
+        Consume a blocking iterator on the pool, one item per pool task.
+
+        The next item is only requested once the consumer is done with the
+        previous one, so a slow consumer throttles the producer. The iterator
+        is closed when the consumer stops early (use contextlib.aclosing).
+        """
+        future = None
+        try:
+            while True:
+                with self._lock:
+                    self._pending += 1
+                future = self._executor.submit(partial(self._track, next, iterator, _EXHAUSTED))
+                future.add_done_callback(self._discard_cancelled)
+                item = await asyncio.wrap_future(future)
+                if item is _EXHAUSTED:
+                    return
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                if future is not None and not future.done():
+                    # Still running on the pool: close once that step returns
+                    future.add_done_callback(lambda _: close())
+                else:
+                    close()
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Worker pool utilization (running and queued queries)."""
+        with self._lock:
+            return {"workers": self.max_workers, "running": self._running, "queued": self._pending}
+
+    async def close(self):
+        """Wait for running queries and stop the pool."""
+        await asyncio.to_thread(self._executor.shutdown, True)
+
+    # --- In-memory operations (no InfluxDB access, called directly) ---
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.queries.cache_stats()
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        return self.queries.latency_stats()
+
+    def invalidate_cache(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        return self.queries.invalidate_cache(start, end)
+
+    # --- Report queries ---
+
+    async def query_today_consumption(self) -> Dict[str, float]:
+        return await self._run(self.queries.query_today_consumption)
+
+    async def query_top_devices(self, days: int = 1) -> List[Dict[str, Any]]:
+        return await self._run(self.queries.query_top_devices, days=days)
+
+    async def query_events(self, days: int) -> Dict[str, Dict[str, Any]]:
+        return await self._run(self.queries.query_events, days)
+
+    async def query_solar_summary(self) -> Dict[str, Any]:
+        return await self._run(self.queries.query_solar_summary)
+
+    async def query_comparison(self, period: str = "week") -> Dict[str, Any]:
+        return await self._run(self.queries.query_comparison, period)
+
+    async def query_custom_context(self, question: str = "") -> Dict[str, Any]:
+        return await self._run(self.queries.query_custom_context, question)
+
+    # --- Tool queries ---
+
+    async def query_device_consumption(self, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.queries.query_device_consumption, **kwargs)
+
+    async def query_hourly_consumption(self, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.queries.query_hourly_consumption, **kwargs)
+
+    async def query_device_events_flexible(self, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.queries.query_device_events_flexible, **kwargs)
+
+    async def query_compare_periods(self, *args, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.queries.query_compare_periods, *args, **kwargs)
+
+    async def query_solar_history(self, **kwargs) -> Dict[str, Any]:
+        return await self._run(self.queries.query_solar_history, **kwargs)
+
+    async def query_tool_batch(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await self._run(self.queries.query_tool_batch, calls)
+
+    async def query_latest_power(self, lookback_seconds: int = 120) -> Dict[str, Any]:
+        return await self._run(self.queries.query_latest_power, lookback_seconds)
+
+    async def list_devices(self) -> Dict[str, Any]:
+        return await self._run(self.queries.list_devices)
@@ -3,17 +3,40 @@ Backfill Historical Events for MyTapo.
 
 One-time script that processes historical power consumption data and
 detects appliance events retroactively, populating the appliance_events bucket.
+
+Each weekly chunk is loaded into NumPy arrays (int64 epoch seconds, float32
+watts) and run through the vectorized kernel in detection_kernel.py; the
+per-sample streaming engine is still available with --engine stream.
+
+Events are written at their start second, so rerunning a range overwrites
+the same points instead of duplicating them. Progress is checkpointed per
+device after every chunk; --resume continues a run from the checkpoint of
+each device (over the requested range, devices whose checkpoint already
+covers it are skipped) and --since-last only fills the gap since each
+device's newest stored event or its checkpoint, whichever is later, so
+devices without recent events only scan the new data.
 """
 
 import os
 import json
+import time
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, field
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any, Tuple
+import numpy as np
+import requests
 from dotenv import load_dotenv
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import InfluxDBClient
+
+from detection_engine import DetectorState, Event, create_detector
+from detector_checkpoint import DetectorCheckpoint
+from influx_batch_writer import InfluxBatchWriter
+from retry_manager import RetryPolicy
+from detection_kernel import as_sample_arrays, detect_batch, detect_stream
+from influx_stream import read_series
+from power_mirror import PowerMirror
 
 load_dotenv()
 
@@ -23,129 +46,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-
-@dataclass
-class DetectorState:
-    """Tracks the state of an appliance detector."""
-    state: str = "idle"
-    event_start: Optional[datetime] = None
-    cooling_start: Optional[datetime] = None
-    power_readings: List[tuple] = field(default_factory=list)
-    last_event_end: Optional[datetime] = None
-
-
-@dataclass
-class DetectedEvent:
-    """Represents a detected appliance event."""
-    device: str
-    event_type: str
-    start_time: datetime
-    end_time: datetime
-    duration_seconds: float
-    energy_wh: float
-    peak_power: float
-    avg_power: float
-
-
-class BackfillEventDetector:
-    """Processes historical power data to detect events."""
-
-    def __init__(self, device_name: str, profile: dict, settings: dict):
-        self.device_name = device_name
-        self.profile = profile
-        self.settings = settings
-        self.state = DetectorState()
-        self.detected_events: List[DetectedEvent] = []
-
-    def process_reading(self, power: float, timestamp: datetime):
-        """Process a single power reading."""
-        profile = self.profile
-        state = self.state
-
-        # Cooldown check
-        if state.last_event_end:
-            cooldown = profile.get("cooldown_seconds", 60)
-            if (timestamp - state.last_event_end).total_seconds() < cooldown:
-                return
-
-        if state.state == "idle":
-            if power >= profile["threshold_on"]:
-                state.state = "active"
-                state.event_start = timestamp
-                state.power_readings = [(power, timestamp)]
-
-        elif state.state == "active":
-            state.power_readings.append((power, timestamp))
-            if power < profile["threshold_off"]:
-                state.state = "cooling_down"
-                state.cooling_start = timestamp
-
-        elif state.state == "cooling_down":
-            if power >= profile["threshold_off"]:
-                state.state = "active"
-                state.power_readings.append((power, timestamp))
-                state.cooling_start = None
-            else:
-                cooling_confirmation = self.settings.get("cooling_confirmation_seconds", 30)
-                cooling_duration = (timestamp - state.cooling_start).total_seconds()
-                if cooling_duration >= cooling_confirmation:
-                    self._finalize_event(timestamp)
-
-    def _finalize_event(self, end_time: datetime):
-        """Complete an event and add it to detected events."""
-        state = self.state
-        profile = self.profile
-
-        duration = (end_time - state.event_start).total_seconds()
-
-        # Validate duration
-        min_dur = profile.get("min_duration_seconds", 0)
-        max_dur = profile.get("max_duration_seconds")
-
-        if duration < min_dur or (max_dur and duration > max_dur):
-            self._reset()
-            return
-
-        # Calculate metrics
-        powers = [p for p, t in state.power_readings]
-        peak_power = max(powers) if powers else 0
-        avg_power = sum(powers) / len(powers) if powers else 0
-        energy_wh = (avg_power * duration) / 3600
-
-        event = DetectedEvent(
-            device=self.device_name,
-            event_type=profile["event_name"],
-            start_time=state.event_start,
-            end_time=end_time,
-            duration_seconds=duration,
-            energy_wh=energy_wh,
-            peak_power=peak_power,
-            avg_power=avg_power
-        )
-        self.detected_events.append(event)
-        state.last_event_end = end_time
-        self._reset()
-
-    def _reset(self):
-        """Reset detector state."""
-        self.state.state = "idle"
-        self.state.event_start = None
-        self.state.cooling_start = None
-        self.state.power_readings = []
-
-    def finalize(self):
-        """Force-close any open event at end of processing."""
-        if self.state.state in ("active", "cooling_down") and self.state.event_start:
-            # Use last reading timestamp as end time
-            if self.state.power_readings:
-                last_timestamp = self.state.power_readings[-1][1]
-                self._finalize_event(last_timestamp)
+DEFAULT_STATE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "state",
+    "backfill"
+)
 
 
 class EventBackfiller:
     """Main backfill orchestrator."""
 
-    def __init__(self, days_back: int = 365):
+    ENGINES = {"vectorized": detect_batch, "stream": detect_stream}
+
+    def __init__(
+        self,
+        days_back: int = 365,
+        engine: str = "vectorized",
+        workers: Optional[int] = None,
+        prefetch_chunks: int = 2,
+        chunk_days: int = 7,
+        resume: bool = False,
+        since_last: bool = False,
+        use_mirror: bool = True
+    ):
         # InfluxDB configuration
         self.influx_host = os.getenv("INFLUXDB_HOST", "192.168.178.114")
         self.influx_port = os.getenv("INFLUXDB_PORT", "8088")
@@ -156,16 +79,32 @@ class EventBackfiller:
         self.events_bucket = os.getenv("INFLUXDB_EVENTS_BUCKET", "appliance_events")
 
         self.days_back = days_back
+        self.engine = engine
+        self.detect = self.ENGINES[engine]
+        self.prefetch_chunks = max(1, prefetch_chunks)
+        self.chunk_days = chunk_days
+        self.write_retry = RetryPolicy(max_retries=3, max_delay=30, raise_on_auth_error=False)
+        self.resume = resume
+        self.since_last = since_last
+        self.state_dir = os.getenv("BACKFILL_STATE_DIR", DEFAULT_STATE_DIR)
+        self.mirror = PowerMirror() if use_mirror else None
         self.profiles: Dict[str, dict] = {}
         self.settings: dict = {}
-        self.detectors: Dict[str, BackfillEventDetector] = {}
 
         # Statistics
         self.total_events = 0
+        self.total_readings = 0
         self.events_by_type: Dict[str, int] = {}
 
         self._load_profiles()
 
+        # One worker per device by default, bounded by the available cores
+        if workers is None:
+            workers = int(os.getenv("BACKFILL_WORKERS", "0")) or min(
+                len(self.profiles) or 1, os.cpu_count() or 1
+            )
+        self.workers = max(1, workers)
+
     def _load_profiles(self):
         """Load appliance profiles."""
         config_path = os.path.join(
@@ -205,8 +144,109 @@ class EventBackfiller:
             logger.warning(f"Could not check existing events: {e}")
         return 0
 
-    def _query_power_data(self, device: str, start: datetime, end: datetime) -> List[tuple]:
-        """Query power data for a device in a time range."""
+    def _newest_event_starts(self) -> Dict[str, datetime]:
+        """Start time of the newest stored event per device (one query)."""
+        query = f'''
+        from(bucket: "{self.events_bucket}")
+            |> range(start: -{self.days_back}d)
+            |> filter(fn: (r) => r["_measurement"] == "event")
+            |> filter(fn: (r) => r["_field"] == "duration_seconds")
+            |> group(columns: ["device"])
+            |> last()
+        '''
+        newest: Dict[str, datetime] = {}
+        try:
+            with self._get_client() as client:
+                tables = client.query_api().query(query)
+                for table in tables:
+                    for record in table.records:
+                        device = record.values.get("device")
+                        if device:
+                            newest[device] = record.get_time()
+        except Exception as e:
+            logger.warning(f"Could not query newest events: {e}")
+        return newest
+
+    def _device_checkpoint(self, device_name: str) -> DetectorCheckpoint:
+        """Progress checkpoint file of one device."""
+        return DetectorCheckpoint(path=os.path.join(self.state_dir, f"{device_name}.json"))
+
+    def _continuation(
+        self, device_name: str, start: datetime, end: datetime
+    ) -> Optional[Tuple[datetime, Optional[dict], datetime]]:
+        """
+        Where a device's run over [start, end) starts, given its checkpoint.
+
+        A checkpoint whose covered range reaches back to `start` and forward
+        past it is continued: from its completed_through with the saved
+        detector state (which carries an event that was still open), or, if
+        that run finalized an open event at its end (the event may have been
+        cut off), from that event's start so it is re-detected and
+        overwritten. Otherwise the requested range runs from `start`.
+
+        Args:
+            device_name: Device to backfill
+            start: Requested range start (UTC)
+            end: Requested range end (UTC)
+
+        Returns:
+            Tuple of (start, detector state dict to continue with or None,
+            start of the range the checkpoint will cover), or None if the
+            checkpoint already covers the whole requested range
+        """
+        snapshot = self._device_checkpoint(device_name).load()
+        if not snapshot:
+            return start, None, start
+        progress = snapshot["payload"]
+        try:
+            covered_from = datetime.fromisoformat(progress["start"])
+            completed_through = datetime.fromisoformat(progress["completed_through"])
+        except (KeyError, TypeError, ValueError):
+            return start, None, start
+        if covered_from > start or completed_through < start:
+            # The checkpoint does not connect to the requested range
+            return start, None, start
+        if completed_through >= end:
+            return None
+        if progress.get("finalized_event_start"):
+            return max(start, datetime.fromisoformat(progress["finalized_event_start"])), None, covered_from
+        return completed_through, progress["detector"], covered_from
+
+    def query_power_data(
+        self, device: str, start: datetime, end: datetime
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Query power data for a device in a time range.
+
+        Days covered by the local Parquet mirror are read from disk; only the
+        remaining tail is queried from InfluxDB.
+
+        Returns:
+            Tuple of (int64 epoch seconds, float32 watts) arrays, time-ordered
+        """
+        if self.mirror is None:
+            return self._query_influx_power(device, start, end)
+
+        mirrored_until = self.mirror.covered_until(start, end)
+        if mirrored_until <= start:
+            return self._query_influx_power(device, start, end)
+
+        try:
+            timestamps, powers = self.mirror.read_arrays(device, start, mirrored_until)
+        except Exception as e:
+            logger.warning(f"Power mirror read failed for {device}, using InfluxDB: {e}")
+            return self._query_influx_power(device, start, end)
+
+        if mirrored_until >= end:
+            return timestamps, powers
+
+        tail_timestamps, tail_powers = self._query_influx_power(device, mirrored_until, end)
+        return np.concatenate([timestamps, tail_timestamps]), np.concatenate([powers, tail_powers])
+
+    def _query_influx_power(
+        self, device: str, start: datetime, end: datetime
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Query raw power data for a device from InfluxDB."""
         start_str = start.strftime("%Y-%m-%dT%H:%M:%SZ")
         end_str = end.strftime("%Y-%m-%dT%H:%M:%SZ")
 
@@ -216,61 +256,169 @@ class EventBackfiller:
             |> filter(fn: (r) => r["_measurement"] == "power_consumption")
             |> filter(fn: (r) => r["_field"] == "power")
             |> filter(fn: (r) => r["device"] == "{device}")
+            |> keep(columns: ["_time", "_value"])
+            |> toFloat()
+            |> group()
             |> sort(columns: ["_time"])
         '''
 
-        readings = []
         try:
             with self._get_client() as client:
-                tables = client.query_api().query(query)
-                for table in tables:
-                    for record in table.records:
-                        power = record.get_value()
-                        timestamp = record.get_time()
-                        if power is not None and timestamp:
-                            # Convert to naive datetime for consistency
-                            if timestamp.tzinfo:
-                                timestamp = timestamp.replace(tzinfo=None)
-                            readings.append((power, timestamp))
+                return read_series(client, query)
         except Exception as e:
             logger.error(f"Failed to query power data for {device}: {e}")
 
-        return readings
+        return as_sample_arrays([], [])
 
-    def _write_events(self, events: List[DetectedEvent]):
-        """Write detected events to InfluxDB."""
-        if not events:
-            return
+    def _event_writer(self) -> InfluxBatchWriter:
+        """Create a batch writer for the events bucket."""
+        return InfluxBatchWriter(
+            influx_host=self.influx_host,
+            influx_port=self.influx_port,
+            influx_token=self.influx_token,
+            influx_bucket=self.events_bucket,
+            influx_org=self.influx_org
+        )
 
-        try:
-            with self._get_client() as client:
-                write_api = client.write_api(write_options=SYNCHRONOUS)
-
-                for event in events:
-                    point = Point("event") \
-                        .tag("device", event.device) \
-                        .tag("event_type", event.event_type) \
-                        .tag("hour_of_day", str(event.start_time.hour)) \
-                        .tag("day_of_week", str(event.start_time.weekday())) \
-                        .field("duration_seconds", event.duration_seconds) \
-                        .field("energy_wh", event.energy_wh) \
-                        .field("peak_power", event.peak_power) \
-                        .field("avg_power", event.avg_power) \
-                        .time(event.start_time, WritePrecision.NS)
-
-                    write_api.write(
-                        bucket=self.events_bucket,
-                        org=self.influx_org,
-                        record=point
-                    )
-
-                    # Update statistics
-                    self.total_events += 1
-                    self.events_by_type[event.event_type] = \
-                        self.events_by_type.get(event.event_type, 0) + 1
+    def _write_events(self, writer: InfluxBatchWriter, events: List[Event]) -> int:
+        """
+        Write a chunk's events to InfluxDB in a single request.
 
-        except Exception as e:
-            logger.error(f"Failed to write events: {e}")
+        A failed batch is retried as a unit; if it still fails, its events
+        stay queued and go out together with the next chunk.
+
+        Returns:
+            Number of events written (including earlier queued ones)
+        """
+        for event in events:
+            writer.add_event(event)
+
+        pending = writer.batch_size()
+        if pending and writer.flush_sync(retry_policy=self.write_retry):
+            return pending
+        return 0
+
+    def _chunk_ranges(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        """Split the backfill range into query chunks."""
+        ranges = []
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(days=self.chunk_days), end)
+            ranges.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+        return ranges
+
+    def process_device(
+        self, device_name: str, profile: dict, start: datetime, end: datetime,
+        initial_state: Optional[dict] = None, covered_from: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Detect and write all events of one device (runs inside a pool worker).
+
+        Chunks are processed strictly in time order so detector state carries
+        across chunk boundaries, while the queries for the next
+        `prefetch_chunks` chunks already run in background threads. After
+        each chunk whose events were written, the covered range, the end of
+        the chunk and the detector state are checkpointed so the next
+        --resume or --since-last run can continue there.
+
+        Args:
+            device_name: Device to backfill
+            profile: Appliance profile of the device
+            start: Start of the backfill range (UTC)
+            end: End of the backfill range (UTC)
+            initial_state: Detector state to continue with (from the checkpoint)
+            covered_from: Start of the contiguous range already covered before
+                `start` (default: start)
+
+        Returns:
+            Per-device statistics (readings, events, written, seconds)
+        """
+        started = time.monotonic()
+        detector = create_detector(device_name, profile, self.settings)
+        if initial_state is not None:
+            detector.state = DetectorState.from_dict(initial_state)
+        checkpoint = self._device_checkpoint(device_name)
+        result = {
+            "device": device_name,
+            "event_type": profile["event_name"],
+            "readings": 0,
+            "events": 0,
+            "written": 0,
+            "seconds": 0.0
+        }
+
+        chunks = self._chunk_ranges(start, end)
+        logger.info(f"Processing {device_name} ({profile['event_name']}, "
+                    f"{profile.get('detection_type', 'sustained')}) "
+                    f"from {start:%Y-%m-%d %H:%M}"
+                    f"{' (continued from checkpoint)' if initial_state is not None else ''}...")
+
+        writer = self._event_writer()
+        finalized_event_start = None
+        with ThreadPoolExecutor(max_workers=self.prefetch_chunks) as prefetcher:
+            pending = deque(
+                (chunk_end, prefetcher.submit(self.query_power_data, device_name, chunk_start, chunk_end))
+                for chunk_start, chunk_end in chunks[:self.prefetch_chunks]
+            )
+            next_chunk = len(pending)
+
+            while pending:
+                chunk_end, future = pending.popleft()
+                timestamps, powers = future.result()
+                if next_chunk < len(chunks):
+                    next_start, next_end = chunks[next_chunk]
+                    pending.append((next_end, prefetcher.submit(
+                        self.query_power_data, device_name, next_start, next_end
+                    )))
+                    next_chunk += 1
+                last_chunk = not pending
+
+                result["readings"] += len(timestamps)
+                # Detector state carries over to the next chunk
+                events = self.detect(detector, timestamps, powers)
+
+                # Finalize an open event at the end of the data; in --since-last
+                # mode it is most likely still running and is left to the next run
+                if last_chunk and not self.since_last:
+                    event = detector.finalize()
+                    if event:
+                        events.append(event)
+                        finalized_event_start = event.start_time.isoformat()
+
+                result["events"] += len(events)
+                result["written"] += self._write_events(writer, events)
+
+                # Only checkpoint once everything up to this chunk is stored
+                if writer.batch_size() == 0:
+                    checkpoint.save({
+                        "device": device_name,
+                        "start": (covered_from or start).isoformat(),
+                        "end": end.isoformat(),
+                        "completed_through": chunk_end.isoformat(),
+                        "finished": last_chunk,
+                        "finalized_event_start": finalized_event_start,
+                        "detector": detector.state.to_dict()
+                    })
+
+        result["seconds"] = time.monotonic() - started
+        return result
+
+    def _record_result(self, result: Dict[str, Any]):
+        """Update statistics and log progress for a finished device."""
+        self.total_events += result["written"]
+        self.total_readings += result["readings"]
+        if result["written"]:
+            self.events_by_type[result["event_type"]] = \
+                self.events_by_type.get(result["event_type"], 0) + result["written"]
+
+        seconds = max(result["seconds"], 1e-9)
+        logger.info(f"  -> {result['device']}: {result['events']} {result['event_type']} events "
+                    f"from {result['readings']:,} readings in {result['seconds']:.1f}s "
+                    f"({result['readings'] / seconds:,.0f} readings/s, "
+                    f"{result['events'] / seconds:,.1f} events/s)")
+        if result["written"] < result["events"]:
+            logger.warning(f"     only {result['written']} of {result['events']} events written")
 
     def run(self):
         """Run the backfill process."""
@@ -279,64 +427,107 @@ class EventBackfiller:
         logger.info("=" * 60)
         logger.info(f"Source bucket: {self.source_bucket}")
         logger.info(f"Events bucket: {self.events_bucket}")
-        logger.info(f"Days to process: {self.days_back}")
+        logger.info(f"Days to process: {self.days_back}"
+                    f"{' (since last stored event)' if self.since_last else ''}")
+        if self.resume:
+            logger.info(f"Resuming from checkpoints in {self.state_dir}")
+        logger.info(f"Detection engine: {self.engine}")
+        logger.info(f"Workers: {self.workers} (prefetching {self.prefetch_chunks} chunks per device)")
         logger.info(f"Devices to analyze: {list(self.profiles.keys())}")
 
         # Check for existing events
         existing = self._check_existing_events()
         if existing > 0:
-            logger.warning(f"Found {existing} existing events in bucket")
-            logger.warning("Continuing will add new events (duplicates possible)")
+            logger.info(f"Found {existing} existing events in bucket "
+                        f"(events of the same device and start second are overwritten)")
 
-        # Process each device
-        end_date = datetime.utcnow()
+        end_date = datetime.now(timezone.utc)
         start_date = end_date - timedelta(days=self.days_back)
-
-        for device_name, profile in self.profiles.items():
-            logger.info(f"\nProcessing {device_name} ({profile['event_name']})...")
-
-            detector = BackfillEventDetector(device_name, profile, self.settings)
-
-            # Process in weekly chunks to manage memory
-            chunk_start = start_date
-            chunk_days = 7
-            readings_processed = 0
-
-            while chunk_start < end_date:
-                chunk_end = min(chunk_start + timedelta(days=chunk_days), end_date)
-
-                # Query power data for this chunk
-                readings = self._query_power_data(device_name, chunk_start, chunk_end)
-                readings_processed += len(readings)
-
-                # Process each reading
-                for power, timestamp in readings:
-                    detector.process_reading(power, timestamp)
-
-                chunk_start = chunk_end
-
-            # Finalize any open event
-            detector.finalize()
-
-            # Write detected events
-            events = detector.detected_events
-            if events:
-                self._write_events(events)
-                logger.info(f"  -> Detected {len(events)} {profile['event_name']} events")
-                logger.info(f"     ({readings_processed:,} power readings processed)")
-            else:
-                logger.info(f"  -> No events detected ({readings_processed:,} readings)")
+        started = time.monotonic()
+
+        # Per-device plan: the full range, or in --since-last mode from the
+        # newest stored event; with --resume or --since-last a checkpoint that
+        # connects to that start continues where it stopped
+        newest_events = self._newest_event_starts() if self.since_last else {}
+        plans: Dict[str, Tuple[datetime, Optional[dict], datetime]] = {}
+        for device_name in self.profiles:
+            start = start_date
+            source = "range start"
+            newest = newest_events.get(device_name)
+            if newest is not None and newest > start:
+                start, source = newest, "newest event"
+            plan = (start, None, start)
+            if self.resume or self.since_last:
+                plan = self._continuation(device_name, start, end_date)
+                if plan is None:
+                    logger.info(f"  {device_name}: skipped, checkpoint already covers the range")
+                    continue
+                if plan[0] != start or plan[1] is not None:
+                    source = "checkpoint"
+            plans[device_name] = plan
+            logger.info(f"  {device_name}: since {plan[0]:%Y-%m-%d %H:%M} ({source})")
+
+        # Devices are independent, so they fan out across worker processes
+        if self.workers <= 1:
+            for device_name, (start, state, covered_from) in plans.items():
+                try:
+                    self._record_result(self.process_device(
+                        device_name, self.profiles[device_name], start, end_date, state, covered_from
+                    ))
+                except Exception as e:
+                    logger.error(f"Backfill failed for {device_name}: {e}")
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = {
+                    pool.submit(
+                        self.process_device, device_name, self.profiles[device_name], start, end_date,
+                        state, covered_from
+                    ): device_name
+                    for device_name, (start, state, covered_from) in plans.items()
+                }
+                for future in as_completed(futures):
+                    try:
+                        self._record_result(future.result())
+                    except Exception as e:
+                        logger.error(f"Backfill failed for {futures[future]}: {e}")
+
+        elapsed = max(time.monotonic() - started, 1e-9)
 
         # Print summary
         logger.info("\n" + "=" * 60)
         logger.info("BACKFILL COMPLETE")
         logger.info("=" * 60)
         logger.info(f"Total events created: {self.total_events}")
+        logger.info(f"Total readings processed: {self.total_readings:,} in {elapsed:.1f}s "
+                    f"({self.total_readings / elapsed:,.0f} readings/s, "
+                    f"{self.total_events / elapsed:,.1f} events/s)")
         logger.info("\nEvents by type:")
         for event_type, count in sorted(self.events_by_type.items()):
             logger.info(f"  {event_type}: {count}")
         logger.info("=" * 60)
 
+        if self.total_events and plans:
+            self._invalidate_report_cache(min(plan[0] for plan in plans.values()), end_date)
+
+    def _invalidate_report_cache(self, start: datetime, end: datetime):
+        """Ask the report API to drop cached results of the rewritten range (if REPORT_API_URL is set)."""
+        api_url = os.getenv("REPORT_API_URL")
+        if not api_url:
+            return
+
+        token = os.getenv("REPORT_API_TOKEN", "")
+        try:
+            response = requests.post(
+                f"{api_url.rstrip('/')}/admin/cache/invalidate",
+                json={"start": start.isoformat(), "end": end.isoformat()},
+                headers={"Authorization": f"Bearer {token}"} if token else {},
+                timeout=10
+            )
+            response.raise_for_status()
+            logger.info(f"Report API cache invalidated: {response.json().get('invalidated', 0)} entries")
+        except Exception as e:
+            logger.warning(f"Could not invalidate report API cache: {e}")
+
 
 def main():
     """Entry point."""
@@ -349,9 +540,51 @@ def main():
         default=365,
         help="Number of days to look back (default: 365)"
     )
+    parser.add_argument(
+        "--engine",
+        choices=sorted(EventBackfiller.ENGINES),
+        default="vectorized",
+        help="Detection engine: vectorized NumPy kernel or per-sample stream (default: vectorized)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Parallel device workers (default: env BACKFILL_WORKERS or one per device, "
+             "up to the CPU count; 1 = sequential)"
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=2,
+        help="Chunks queried ahead while detection runs (default: 2)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue from the per-device checkpoints (devices already covered are skipped)"
+    )
+    parser.add_argument(
+        "--since-last",
+        action="store_true",
+        help="Only backfill the gap since each device's newest stored event"
+    )
+    parser.add_argument(
+        "--no-mirror",
+        action="store_true",
+        help="Query all raw data from InfluxDB instead of the local Parquet mirror"
+    )
     args = parser.parse_args()
 
-    backfiller = EventBackfiller(days_back=args.days)
+    backfiller = EventBackfiller(
+        days_back=args.days,
+        engine=args.engine,
+        workers=args.workers,
+        prefetch_chunks=args.prefetch,
+        resume=args.resume,
+        since_last=args.since_last,
+        use_mirror=not args.no_mirror
+    )
     backfiller.run()
 
 
@@ -14,6 +14,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 from io import BytesIO
+import requests
 from dotenv import load_dotenv
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
@@ -23,6 +24,9 @@ import matplotlib.pyplot as plt
 
 from utils import send_pushover_notification_with_image, get_awtrix_client
 from awtrix_client import AwtrixMessage
+from query_fanout import QueryFanout
+from query_planner import QueryPlanner, mean_power
+from rollup_job import RollupJob
 
 load_dotenv()
 
@@ -54,6 +58,15 @@ class ConsumptionReporter:
         self.influx_org = "None"
         self.influx_bucket = os.getenv("INFLUXDB_BUCKET", "power_consumption")
         self.consumption_bucket = os.getenv("INFLUXDB_CONSUMPTION_BUCKET", "consumption_daily")
+        self.hourly_bucket = os.getenv("INFLUXDB_HOURLY_BUCKET", "power_hourly")
+
+        # Hourly/daily rollups; the planner answers aligned parts of a range from them
+        self.planner = QueryPlanner(self.influx_bucket, self.hourly_bucket, self.consumption_bucket)
+        self.rollup_job = RollupJob()
+
+        # Report API whose snapshots are refreshed after new rollups (optional)
+        self.report_api_url = os.getenv("REPORT_API_URL", "")
+        self.report_api_token = os.getenv("REPORT_API_TOKEN", "")
 
         # Pushover configuration
         self.pushover_user = os.getenv("PUSHOVER_USER_GROUP_WOERIS")
@@ -74,6 +87,7 @@ class ConsumptionReporter:
         self.last_yearly = None
         self.last_awtrix_carousel = None
         self.last_daily_storage = None
+        self.last_rollup = None
 
         # Devices to exclude from reports (e.g., solar is generation, not consumption)
         self.exclude_devices = {"solar"}
@@ -101,6 +115,21 @@ class ConsumptionReporter:
             org=self.influx_org
         )
 
+    def _refresh_report_snapshots(self) -> None:
+        """Tell the report API that new rollups are available (if REPORT_API_URL is set)."""
+        if not self.report_api_url:
+            return
+        try:
+            response = requests.post(
+                f"{self.report_api_url.rstrip('/')}/admin/snapshots/refresh",
+                headers={"Authorization": f"Bearer {self.report_api_token}"} if self.report_api_token else {},
+                timeout=10
+            )
+            response.raise_for_status()
+            logger.info(f"Report API snapshots refreshing: {', '.join(response.json().get('refreshing', [])) or 'none in use'}")
+        except Exception as e:
+            logger.warning(f"Could not refresh report API snapshots: {e}")
+
     async def query_consumption_for_period(
         self,
         start: datetime,
@@ -109,33 +138,23 @@ class ConsumptionReporter:
         """
         Query total energy consumption (kWh) per device for a time period.
 
-        Uses mean power × hours to calculate energy.
+        Uses mean power × hours to calculate energy. The query planner reads
+        whole days and hours from the rollups and only the edges from raw data.
         """
-        start_str = start.strftime("%Y-%m-%dT%H:%M:%SZ")
-        end_str = end.strftime("%Y-%m-%dT%H:%M:%SZ")
-        hours = (end - start).total_seconds() / 3600
+        return await asyncio.to_thread(self._consumption_for_period, start, end)
 
-        query = f'''
-        from(bucket: "{self.influx_bucket}")
-            |> range(start: {start_str}, stop: {end_str})
-            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
-            |> filter(fn: (r) => r["_field"] == "power")
-            |> group(columns: ["device"])
-            |> mean()
-        '''
+    def _consumption_for_period(self, start: datetime, end: datetime) -> Dict[str, float]:
+        hours = (end - start).total_seconds() / 3600
 
         consumption = {}
         try:
             with self._get_client() as client:
-                tables = client.query_api().query(query)
-                for table in tables:
-                    for record in table.records:
-                        device = record.values.get("device", "unknown")
-                        mean_power = record.get_value() or 0
-                        # Energy (kWh) = mean power (W) × hours / 1000
-                        kwh = (mean_power * hours) / 1000
-                        if device not in self.exclude_devices:
-                            consumption[device] = kwh
+                mean_powers = mean_power(self.planner.device_moments(client, start, end))
+            for device, power in mean_powers.items():
+                # Energy (kWh) = mean power (W) × hours / 1000
+                kwh = (power * hours) / 1000
+                if device not in self.exclude_devices:
+                    consumption[device] = kwh
         except Exception as e:
             logger.error(f"Failed to query consumption data: {e}")
 
@@ -158,37 +177,48 @@ class ConsumptionReporter:
 
         Returns list of (hour, avg_power_watts) tuples.
         """
-        start_str = start.strftime("%Y-%m-%dT%H:%M:%SZ")
-        end_str = end.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        query = f'''
-        import "date"
-
-        from(bucket: "{self.influx_bucket}")
-            |> range(start: {start_str}, stop: {end_str})
-            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
-            |> filter(fn: (r) => r["_field"] == "power")
-            |> map(fn: (r) => ({{r with hour: date.hour(t: r._time)}}))
-            |> group(columns: ["hour"])
-            |> mean()
-            |> sort(columns: ["_value"], desc: true)
-            |> limit(n: {top_n})
-        '''
+        return await asyncio.to_thread(self._peak_hours, start, end, top_n)
 
+    def _peak_hours(self, start: datetime, end: datetime, top_n: int) -> List[Tuple[int, float]]:
         peak_hours = []
         try:
             with self._get_client() as client:
-                tables = client.query_api().query(query)
-                for table in tables:
-                    for record in table.records:
-                        hour = record.values.get("hour", 0)
-                        power = record.get_value() or 0
-                        peak_hours.append((hour, power))
+                moments = self.planner.hourly_moments(client, start, end).reset_index()
+            if not moments.empty:
+                # Mean over all samples per hour of day (UTC)
+                hour = moments["_time"].dt.hour
+                power_sum = moments["power_sum"].groupby(hour).sum()
+                samples = moments["samples"].groupby(hour).sum()
+                means = (power_sum / samples[samples > 0]).dropna().nlargest(top_n)
+                peak_hours = [(int(h), float(power)) for h, power in means.items()]
         except Exception as e:
             logger.error(f"Failed to query peak hours: {e}")
 
         return peak_hours
 
+    async def query_report_data(
+        self,
+        name: str,
+        start: datetime,
+        end: datetime,
+        prev_start: datetime,
+        prev_end: datetime,
+        top_n: int = 3
+    ) -> Tuple[Dict[str, float], Dict[str, float], List[Tuple[int, float]]]:
+        """
+        Query current consumption, previous consumption and peak hours concurrently.
+
+        Returns:
+            Tuple of (current_consumption, previous_consumption, peak_hours)
+        """
+        with QueryFanout(name) as queries:
+            current, previous, peak_hours = await queries.gather(
+                queries.submit(self._consumption_for_period, start, end),
+                queries.submit(self._consumption_for_period, prev_start, prev_end),
+                queries.submit(self._peak_hours, start, end, top_n)
+            )
+        return current, previous, peak_hours
+
     def calculate_device_breakdown(
         self,
         consumption: Dict[str, float]
@@ -376,9 +406,9 @@ class ConsumptionReporter:
         prev_end = start
 
         # Query current and previous period
-        current_consumption = await self.query_consumption_for_period(start, end)
-        previous_consumption = await self.query_consumption_for_period(prev_start, prev_end)
-        peak_hours = await self.query_peak_hours(start, end)
+        current_consumption, previous_consumption, peak_hours = await self.query_report_data(
+            "weekly_report", start, end, prev_start, prev_end
+        )
 
         current_total = sum(current_consumption.values())
         previous_total = sum(previous_consumption.values())
@@ -415,9 +445,9 @@ class ConsumptionReporter:
         prev_end = start
         prev_start = (prev_end - timedelta(days=1)).replace(day=1)
 
-        current_consumption = await self.query_consumption_for_period(start, end)
-        previous_consumption = await self.query_consumption_for_period(prev_start, prev_end)
-        peak_hours = await self.query_peak_hours(start, end)
+        current_consumption, previous_consumption, peak_hours = await self.query_report_data(
+            "monthly_report", start, end, prev_start, prev_end
+        )
 
         current_total = sum(current_consumption.values())
         previous_total = sum(previous_consumption.values())
@@ -451,9 +481,9 @@ class ConsumptionReporter:
         prev_end = start
         prev_start = prev_end.replace(year=prev_end.year - 1)
 
-        current_consumption = await self.query_consumption_for_period(start, end)
-        previous_consumption = await self.query_consumption_for_period(prev_start, prev_end)
-        peak_hours = await self.query_peak_hours(start, end, top_n=5)
+        current_consumption, previous_consumption, peak_hours = await self.query_report_data(
+            "yearly_report", start, end, prev_start, prev_end, top_n=5
+        )
 
         current_total = sum(current_consumption.values())
         previous_total = sum(previous_consumption.values())
@@ -595,10 +625,23 @@ class ConsumptionReporter:
 
         polling_interval = 60  # Check every minute
 
+        await asyncio.to_thread(self.rollup_job.ensure_bucket)
+
         while True:
             try:
                 now = datetime.now()
 
+                # Hourly/daily rollups: at startup, then every hour at xx:02
+                if self.last_rollup is None or (
+                    now.minute == 2 and (now - self.last_rollup).total_seconds() >= 600
+                ):
+                    self.last_rollup = now
+                    try:
+                        if await asyncio.to_thread(self.rollup_job.run_once):
+                            await asyncio.to_thread(self._refresh_report_snapshots)
+                    except Exception as e:
+                        logger.error(f"Rollup job failed: {e}")
+
                 # Daily consumption storage: 00:05 every day (store yesterday's data)
                 if (now.hour == 0 and now.minute == 5
                     and (self.last_daily_storage is None or self.last_daily_storage.date() != now.date())):
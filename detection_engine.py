@@ -0,0 +1,385 @@
+"""
+Appliance event detection engine for MyTapo.
+
+Shared by the live event detector (event_detector.py) and the historical
+backfill (backfill_events.py). Each profile's `detection_type` selects a
+specialized state machine:
+
+- sustained: hysteresis between threshold_on/threshold_off, the event ends
+  once power stayed below threshold_off for cooling_confirmation_seconds
+  (TV sessions, chargers, airfryer)
+- spike: like sustained, but an event only starts on a rising edge through
+  threshold_on, so a device that is still above threshold when its cooldown
+  expires does not open a second event (espresso, hairdryer)
+- cycle: tolerates low-power pauses of up to pause_tolerance_seconds inside a
+  program (washing machine soak phases, dryer reversing) and ends the event
+  at the start of the final pause
+
+The state machines are allocation-free per sample: timestamps are epoch
+seconds (floats) and power statistics are kept as running sums instead of a
+list of readings.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Type, Union
+
+logger = logging.getLogger(__name__)
+
+IDLE = "idle"
+ACTIVE = "active"
+COOLING = "cooling_down"
+
+DEFAULT_DETECTION_TYPE = "sustained"
+
+
+def to_epoch(timestamp: datetime) -> float:
+    """Convert a datetime to epoch seconds (naive datetimes are treated as UTC)."""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def from_epoch(seconds: float) -> datetime:
+    """Convert epoch seconds to an aware UTC datetime."""
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+@dataclass
+class Event:
+    """Represents a detected appliance event."""
+    device: str
+    event_type: str
+    start_time: datetime
+    end_time: datetime
+    duration_seconds: float
+    energy_wh: float
+    peak_power: float
+    avg_power: float
+
+    def to_dict(self) -> dict:
+        """Serialize for checkpointing."""
+        return {
+            "device": self.device,
+            "event_type": self.event_type,
+            "start_time": self.start_time.isoformat(),
+            "end_time": self.end_time.isoformat(),
+            "duration_seconds": self.duration_seconds,
+            "energy_wh": self.energy_wh,
+            "peak_power": self.peak_power,
+            "avg_power": self.avg_power
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Event":
+        """Restore from a checkpoint entry."""
+        return cls(
+            device=data["device"],
+            event_type=data["event_type"],
+            start_time=datetime.fromisoformat(data["start_time"]),
+            end_time=datetime.fromisoformat(data["end_time"]),
+            duration_seconds=data["duration_seconds"],
+            energy_wh=data["energy_wh"],
+            peak_power=data["peak_power"],
+            avg_power=data["avg_power"]
+        )
+
+
+def _epoch_or_none(value: Union[None, float, str]) -> Optional[float]:
+    """Checkpoint timestamps are epoch floats (older snapshots: ISO strings)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return to_epoch(datetime.fromisoformat(value))
+    return float(value)
+
+
+@dataclass
+class DetectorState:
+    """Tracks the state of an appliance detector (timestamps in epoch seconds)."""
+    state: str = IDLE  # idle, active, cooling_down
+    event_start: Optional[float] = None
+    cooling_start: Optional[float] = None
+    last_reading: Optional[float] = None  # last sample counted into the event
+    power_sum: float = 0.0
+    power_count: int = 0
+    peak_power: float = 0.0
+    last_event_end: Optional[float] = None
+    last_power: Optional[float] = None  # previous sample, for edge triggers
+
+    def to_dict(self) -> dict:
+        """Serialize for checkpointing."""
+        return {
+            "state": self.state,
+            "event_start": self.event_start,
+            "cooling_start": self.cooling_start,
+            "last_reading": self.last_reading,
+            "power_sum": self.power_sum,
+            "power_count": self.power_count,
+            "peak_power": self.peak_power,
+            "last_event_end": self.last_event_end,
+            "last_power": self.last_power
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DetectorState":
+        """Restore from a checkpoint entry (also accepts the list-based v1 layout)."""
+        state = cls(
+            state=data.get("state", IDLE),
+            event_start=_epoch_or_none(data.get("event_start")),
+            cooling_start=_epoch_or_none(data.get("cooling_start")),
+            last_reading=_epoch_or_none(data.get("last_reading")),
+            power_sum=data.get("power_sum", 0.0),
+            power_count=data.get("power_count", 0),
+            peak_power=data.get("peak_power", 0.0),
+            last_event_end=_epoch_or_none(data.get("last_event_end")),
+            last_power=data.get("last_power")
+        )
+
+        readings = data.get("power_readings")
+        if readings:
+            powers = [p for p, _ in readings]
+            state.power_sum = float(sum(powers))
+            state.power_count = len(powers)
+            state.peak_power = max(powers)
+            state.last_reading = _epoch_or_none(readings[-1][1])
+
+        return state
+
+
+class DetectorEngine:
+    """
+    Base state machine shared by all detection types.
+
+    Subclasses specialize behaviour through two class attributes:
+    `edge_triggered` (start only on a rising edge through threshold_on) and
+    `end_at_pause_start` (report the event end at the start of the final
+    low-power phase instead of at its confirmation).
+    """
+
+    detection_type = DEFAULT_DETECTION_TYPE
+    edge_triggered = False
+    end_at_pause_start = False
+    # Profile key read by _confirmation_seconds
+    confirmation_parameter = "cooling_confirmation_seconds"
+
+    def __init__(self, device_name: str, profile: dict, settings: dict, log_events: bool = False):
+        """
+        Initialize a detector for one device.
+
+        Args:
+            device_name: Device the readings belong to
+            profile: Appliance profile from appliance_profiles.json
+            settings: Global settings from appliance_profiles.json
+            log_events: Log event start/end at INFO level (live service)
+        """
+        self.device_name = device_name
+        self.profile = profile
+        self.settings = settings
+        self.log_events = log_events
+
+        self.event_type = profile["event_name"]
+        self.threshold_on = profile["threshold_on"]
+        self.threshold_off = profile["threshold_off"]
+        self.min_duration = profile.get("min_duration_seconds") or 0
+        self.max_duration = profile.get("max_duration_seconds")
+        self.cooldown = profile.get("cooldown_seconds", 60)
+        self.confirmation = self._confirmation_seconds(profile, settings)
+
+        self.state = DetectorState()
+
+    @staticmethod
+    def _confirmation_seconds(profile: dict, settings: dict) -> float:
+        """How long power must stay below threshold_off to end an event."""
+        return profile.get(
+            "cooling_confirmation_seconds",
+            settings.get("cooling_confirmation_seconds", 30)
+        )
+
+    def process_reading(self, power: float, timestamp: datetime) -> Optional[Event]:
+        """
+        Process a power reading and return an Event if one completed.
+
+        Args:
+            power: Current power reading in watts
+            timestamp: Timestamp of the reading
+
+        Returns:
+            Event object if an event completed, None otherwise
+        """
+        return self.process_sample(power, to_epoch(timestamp))
+
+    def process_sample(self, power: float, ts: float) -> Optional[Event]:
+        """Process a reading with an epoch-seconds timestamp (hot path)."""
+        state = self.state
+        previous_power = state.last_power
+        state.last_power = power
+
+        # Cooldown check - prevent duplicate events
+        if state.last_event_end is not None and ts - state.last_event_end < self.cooldown:
+            return None
+
+        if state.state == IDLE:
+            if power >= self.threshold_on and (
+                not self.edge_triggered
+                or previous_power is None
+                or previous_power < self.threshold_on
+            ):
+                state.state = ACTIVE
+                state.event_start = ts
+                state.last_reading = ts
+                state.power_sum = power
+                state.power_count = 1
+                state.peak_power = power
+                if self.log_events:
+                    logger.info(f"{self.device_name}: Event started (power={power:.1f}W)")
+
+        elif state.state == ACTIVE:
+            state.power_sum += power
+            state.power_count += 1
+            state.last_reading = ts
+            if power > state.peak_power:
+                state.peak_power = power
+
+            if power < self.threshold_off:
+                state.state = COOLING
+                state.cooling_start = ts
+                if self.log_events:
+                    logger.debug(f"{self.device_name}: Cooling down (power={power:.1f}W)")
+
+        elif state.state == COOLING:
+            if power >= self.threshold_off:
+                # False alarm (or end of a pause), back to active
+                state.state = ACTIVE
+                state.cooling_start = None
+                state.power_sum += power
+                state.power_count += 1
+                state.last_reading = ts
+                if power > state.peak_power:
+                    state.peak_power = power
+                if self.log_events:
+                    logger.debug(f"{self.device_name}: Back to active (power={power:.1f}W)")
+            elif ts - state.cooling_start >= self.confirmation:
+                end = state.cooling_start if self.end_at_pause_start else ts
+                return self._finalize_event(end, ts)
+
+        return None
+
+    def finalize(self) -> Optional[Event]:
+        """Force-close an open event at its last counted reading (end of data)."""
+        state = self.state
+        if state.state != IDLE and state.event_start is not None and state.last_reading is not None:
+            return self._finalize_event(state.last_reading, state.last_reading)
+        return None
+
+    def _finalize_event(self, end: float, closed_at: float) -> Optional[Event]:
+        """
+        Validate the open event and build the Event object.
+
+        Args:
+            end: Reported event end (epoch seconds)
+            closed_at: Time the detector closed the event (starts the cooldown)
+        """
+        state = self.state
+        duration = end - state.event_start
+
+        if duration < self.min_duration:
+            if self.log_events:
+                logger.info(f"{self.device_name}: Event too short "
+                            f"({duration:.0f}s < {self.min_duration}s), discarding")
+            self.reset()
+            return None
+
+        if self.max_duration and duration > self.max_duration:
+            if self.log_events:
+                logger.info(f"{self.device_name}: Event too long "
+                            f"({duration:.0f}s > {self.max_duration}s), discarding")
+            self.reset()
+            return None
+
+        avg_power = state.power_sum / state.power_count if state.power_count else 0
+        energy_wh = (avg_power * duration) / 3600
+
+        event = Event(
+            device=self.device_name,
+            event_type=self.event_type,
+            start_time=from_epoch(state.event_start),
+            end_time=from_epoch(end),
+            duration_seconds=duration,
+            energy_wh=energy_wh,
+            peak_power=state.peak_power,
+            avg_power=avg_power
+        )
+
+        if self.log_events:
+            logger.info(f"{self.device_name}: Event completed - {self.event_type} "
+                        f"(duration={duration:.0f}s, energy={energy_wh:.1f}Wh, "
+                        f"peak={state.peak_power:.0f}W)")
+
+        state.last_event_end = closed_at
+        self.reset()
+        return event
+
+    def reset(self):
+        """Reset detector state for next event (cooldown and edge history are kept)."""
+        state = self.state
+        state.state = IDLE
+        state.event_start = None
+        state.cooling_start = None
+        state.last_reading = None
+        state.power_sum = 0.0
+        state.power_count = 0
+        state.peak_power = 0.0
+
+
+DETECTOR_TYPES: Dict[str, Type[DetectorEngine]] = {}
+
+
+def register_detector(detection_type: str) -> Callable[[Type[DetectorEngine]], Type[DetectorEngine]]:
+    """Class decorator registering a detector for a profile detection_type."""
+    def decorator(cls: Type[DetectorEngine]) -> Type[DetectorEngine]:
+        cls.detection_type = detection_type
+        DETECTOR_TYPES[detection_type] = cls
+        return cls
+    return decorator
+
+
+@register_detector("sustained")
+class SustainedDetector(DetectorEngine):
+    """Extended power draw with hysteresis and cooling confirmation."""
+
+
+@register_detector("spike")
+class SpikeDetector(DetectorEngine):
+    """Short bursts; events start only on a rising edge through threshold_on."""
+
+    edge_triggered = True
+
+
+@register_detector("cycle")
+class CycleDetector(DetectorEngine):
+    """Programs with low-power pauses; pauses up to pause_tolerance_seconds stay in the event."""
+
+    end_at_pause_start = True
+    confirmation_parameter = "pause_tolerance_seconds"
+
+    @staticmethod
+    def _confirmation_seconds(profile: dict, settings: dict) -> float:
+        return profile.get(
+            "pause_tolerance_seconds",
+            settings.get("cycle_pause_tolerance_seconds", 600)
+        )
+
+
+def create_detector(
+    device_name: str, profile: dict, settings: dict, log_events: bool = False
+) -> DetectorEngine:
+    """Create the detector matching the profile's detection_type."""
+    detection_type = profile.get("detection_type", DEFAULT_DETECTION_TYPE)
+    cls = DETECTOR_TYPES.get(detection_type)
+    if cls is None:
+        logger.warning(f"{device_name}: Unknown detection_type '{detection_type}', "
+                       f"using '{DEFAULT_DETECTION_TYPE}'")
+        cls = DETECTOR_TYPES[DEFAULT_DETECTION_TYPE]
+    return cls(device_name, profile, settings, log_events=log_events)
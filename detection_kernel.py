@@ -0,0 +1,235 @@
+"""
+Vectorized batch detection kernel for MyTapo.
+
+Runs the state machines of detection_engine.py over whole chunks of samples
+held in NumPy arrays (int64 epoch seconds, float32 watts) instead of calling
+process_sample once per reading. The runs of readings below threshold_off
+are located in one pass and checked against the cooling confirmation (or
+cycle pause) window together; event starts, cooldowns and edge triggers are
+vectorized searches. Python therefore only runs a constant number of steps per
+event, however often a flickering appliance crosses threshold_off within it.
+
+The kernel reads and updates the detector's DetectorState, so state carries
+across chunk boundaries and a detector can switch between batch and streaming
+processing at any point. Events are identical to the streaming detector fed
+with the same samples (metrics up to floating-point summation order).
+"""
+
+import math
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from detection_engine import ACTIVE, COOLING, IDLE, DetectorEngine, Event
+
+logger = logging.getLogger(__name__)
+
+
+def as_sample_arrays(timestamps, powers) -> Tuple[np.ndarray, np.ndarray]:
+    """Coerce sample sequences to the kernel's (int64 seconds, float32 watts) layout."""
+    return (
+        np.ascontiguousarray(timestamps, dtype=np.int64),
+        np.ascontiguousarray(powers, dtype=np.float32)
+    )
+
+
+def _first_at_or_after(timestamps: np.ndarray, seconds: float) -> int:
+    """Index of the first timestamp >= seconds."""
+    # An integer key keeps searchsorted from promoting the int64 array to float
+    return int(timestamps.searchsorted(math.ceil(seconds), side="left"))
+
+
+def _first_true(mask: np.ndarray, position: int) -> int:
+    """Index of the first True entry at or after position (len(mask) if none)."""
+    if position >= len(mask):
+        return len(mask)
+    # argmax stops at the first True of a boolean array
+    k = position + int(mask[position:].argmax())
+    return k if mask[k] else len(mask)
+
+
+def _below_runs(below: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and exclusive end indices of the runs of below-threshold readings."""
+    n = len(below)
+    changes = np.flatnonzero(below[1:] != below[:-1]) + 1
+    bounds = np.concatenate(([0], changes, [n]))
+    # Runs alternate between below and above, starting with the first reading's side
+    first = 0 if below[0] else 1
+    return bounds[first:-1:2], bounds[first + 1::2]
+
+
+def detect_batch(
+    detector: DetectorEngine,
+    timestamps: np.ndarray,
+    powers: np.ndarray
+) -> List[Event]:
+    """
+    Process one chunk of time-ordered samples and return completed events.
+
+    Args:
+        detector: Detector whose parameters and state are used (state is updated)
+        timestamps: int64 epoch seconds, ascending
+        powers: float32 power readings in watts
+
+    Returns:
+        Events completed within this chunk
+    """
+    n = len(timestamps)
+    if n == 0:
+        return []
+
+    state = detector.state
+    on = detector.threshold_on
+    off = detector.threshold_off
+    confirmation = detector.confirmation
+    ts = timestamps
+    power = powers
+
+    below = power < off
+    start_ok = power >= on
+    if detector.edge_triggered:
+        previous = np.empty_like(power)
+        previous[0] = -np.inf if state.last_power is None else state.last_power
+        previous[1:] = power[:-1]
+        start_ok &= previous < on
+
+    # An active event that enters a below-threshold run at its first reading
+    # ends once a later reading of the same run is `confirmation` seconds
+    # away, i.e. when the run lasts at least that long
+    run_starts, run_ends = _below_runs(below)
+    last_in_run = run_ends - 1
+    confirming = np.flatnonzero(
+        (last_in_run > run_starts) & (ts[last_in_run] - ts[run_starts] >= confirmation)
+    )
+
+    # An active event counts every reading >= threshold_off and the first
+    # reading of each below-threshold run
+    counted = ~below
+    counted[run_starts] = True
+
+    def count_readings(lo: int, hi: int, extra: int = -1):
+        """Add the counted readings of [lo, hi) and reading `extra` (-1 = none)."""
+        segment = power[lo:hi]
+        mask = counted[lo:hi]
+        state.power_sum += float(np.add.reduce(segment, dtype=np.float64, where=mask))
+        state.power_count += int(np.count_nonzero(mask))
+        peak = float(segment.max())
+        if peak < off:
+            # Uncounted readings are all below threshold_off, so only then can they hold the maximum
+            peak = float(np.maximum.reduce(segment, where=mask, initial=-np.inf))
+        state.peak_power = max(state.peak_power, peak)
+        if extra >= 0:
+            p = float(power[extra])
+            state.power_sum += p
+            state.power_count += 1
+            state.peak_power = max(state.peak_power, p)
+
+    def close_event(closing: int, closed: int):
+        state.last_reading = float(ts[closing])
+        state.state = COOLING
+        state.cooling_start = float(ts[closing])
+        closed_at = float(ts[closed])
+        end = state.cooling_start if detector.end_at_pause_start else closed_at
+        event = detector._finalize_event(end, closed_at)
+        if event:
+            events.append(event)
+
+    events: List[Event] = []
+    pos = 0
+
+    if state.state == COOLING:
+        # The chunk may continue the pause the previous chunk ended in
+        r = int(run_ends[0]) if below[0] else 0
+        m = _first_at_or_after(ts, state.cooling_start + confirmation)
+        if m < r:
+            closed_at = float(ts[m])
+            end = state.cooling_start if detector.end_at_pause_start else closed_at
+            event = detector._finalize_event(end, closed_at)
+            if event:
+                events.append(event)
+            pos = m + 1
+        elif r >= n:
+            pos = n
+        else:
+            state.state = ACTIVE
+            state.cooling_start = None
+            state.last_reading = float(ts[r])
+            count_readings(r, r + 1)
+            pos = r + 1
+
+    while pos < n:
+        if state.state == IDLE:
+            lowest = pos
+            if state.last_event_end is not None:
+                cooldown_end = state.last_event_end + detector.cooldown
+                lowest = max(lowest, _first_at_or_after(ts, cooldown_end))
+            i = _first_true(start_ok, lowest)
+            if i >= n:
+                break
+
+            p = float(power[i])
+            state.state = ACTIVE
+            state.event_start = float(ts[i])
+            state.last_reading = float(ts[i])
+            state.power_sum = p
+            state.power_count = 1
+            state.peak_power = p
+            pos = i + 1
+            continue
+
+        # ACTIVE: the next below-threshold reading starts a pause. It only
+        # lies inside a run if the event started below threshold_off
+        # (threshold_on < threshold_off); that reading is counted and its
+        # pause checked on its own.
+        k = int(run_starts.searchsorted(pos, side="left"))
+        extra = -1
+        closing = closed = n
+        if k > 0 and run_ends[k - 1] > pos:
+            k -= 1
+            extra = pos
+            m = max(pos + 1, _first_at_or_after(ts, float(ts[pos]) + confirmation))
+            if m < run_ends[k]:
+                closing, closed = pos, m
+            k += 1
+        if closing >= n:
+            j = int(confirming.searchsorted(k, side="left"))
+            if j < len(confirming):
+                closing = int(run_starts[confirming[j]])
+                closed = max(closing + 1, _first_at_or_after(ts, float(ts[closing]) + confirmation))
+
+        if closing < n:
+            count_readings(pos, closing + 1, extra)
+            close_event(closing, closed)
+            pos = closed + 1
+            continue
+
+        # No confirmed pause in the rest of the chunk
+        count_readings(pos, n, extra)
+        if below[n - 1]:
+            # Cooling since the entry into the trailing below-threshold run
+            entry = max(pos, int(run_starts[-1]))
+            state.state = COOLING
+            state.cooling_start = float(ts[entry])
+            state.last_reading = float(ts[entry])
+        else:
+            state.last_reading = float(ts[n - 1])
+        break
+
+    state.last_power = float(power[-1])
+    return events
+
+
+def detect_stream(
+    detector: DetectorEngine,
+    timestamps: np.ndarray,
+    powers: np.ndarray
+) -> List[Event]:
+    """Reference path: feed the same arrays through the per-sample state machine."""
+    events: List[Event] = []
+    process = detector.process_sample
+    for t, p in zip(timestamps.tolist(), powers.tolist()):
+        event: Optional[Event] = process(p, t)
+        if event:
+            events.append(event)
+    return events
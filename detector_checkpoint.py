@@ -0,0 +1,161 @@
+"""
+Crash-safe state checkpointing for the MyTapo event detector.
+
+Snapshots the in-memory detector state (in-progress events, cooldowns and the
+day's completed events) to a small local JSON file so that a container restart
+in the middle of a long wash cycle does not lose the event, and the daily
+summary still knows about the morning.
+
+Snapshots are written atomically (write to a temp file, fsync, rename) and
+carry a format version plus the time they were taken, so the loader can
+reject incompatible files and judge how stale a snapshot is.
+"""
+
+import os
+import json
+import logging
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when the payload layout changes; snapshots down to
+# MIN_SUPPORTED_VERSION are still migrated by the payload loaders
+CHECKPOINT_VERSION = 2
+MIN_SUPPORTED_VERSION = 1
+
+DEFAULT_STATE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "state",
+    "event_detector_state.json"
+)
+
+
+class DetectorCheckpoint:
+    """
+    Periodic, atomic snapshot file for detector state.
+
+    Usage:
+        checkpoint = DetectorCheckpoint(interval_seconds=60)
+
+        snapshot = checkpoint.load()
+        if snapshot:
+            gap = checkpoint.gap_seconds(snapshot)
+            ...restore from snapshot["payload"]...
+
+        if checkpoint.is_due():
+            checkpoint.save(payload)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        interval_seconds: float = 60,
+    ):
+        """
+        Initialize the checkpoint file handler.
+
+        Args:
+            path: Snapshot file path (defaults to env EVENT_DETECTOR_STATE_FILE)
+            interval_seconds: Minimum time between periodic snapshots
+        """
+        self.path = path or os.getenv("EVENT_DETECTOR_STATE_FILE", DEFAULT_STATE_FILE)
+        self.interval_seconds = interval_seconds
+        self.last_saved: Optional[datetime] = None
+
+    def is_due(self, now: Optional[datetime] = None) -> bool:
+        """Return True if the periodic snapshot interval has elapsed."""
+        if self.last_saved is None:
+            return True
+        now = now or datetime.now(timezone.utc)
+        return (now - self.last_saved).total_seconds() >= self.interval_seconds
+
+    def save(self, payload: Dict[str, Any]) -> bool:
+        """
+        Atomically write a snapshot of the given payload.
+
+        Args:
+            payload: JSON-serializable detector state
+
+        Returns:
+            True if the snapshot was written, False otherwise
+        """
+        now = datetime.now(timezone.utc)
+        snapshot = {
+            "version": CHECKPOINT_VERSION,
+            "saved_at": now.isoformat(),
+            "payload": payload
+        }
+
+        directory = os.path.dirname(self.path) or "."
+        tmp_path = None
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=".checkpoint-", suffix=".tmp", dir=directory
+            )
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            tmp_path = None
+            self.last_saved = now
+            logger.debug(f"Saved detector checkpoint to {self.path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to save detector checkpoint: {e}")
+            return False
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        Load the last snapshot if present and compatible.
+
+        Returns:
+            Dict with "version", "saved_at" (aware datetime) and "payload", or None
+        """
+        if not os.path.exists(self.path):
+            logger.info(f"No detector checkpoint found at {self.path}")
+            return None
+
+        try:
+            with open(self.path, "r") as f:
+                snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable detector checkpoint: {e}")
+            return None
+
+        version = snapshot.get("version")
+        if not isinstance(version, int) or not (
+            MIN_SUPPORTED_VERSION <= version <= CHECKPOINT_VERSION
+        ):
+            logger.warning(
+                f"Ignoring detector checkpoint with version {version} "
+                f"(supported {MIN_SUPPORTED_VERSION}-{CHECKPOINT_VERSION})"
+            )
+            return None
+
+        try:
+            saved_at = datetime.fromisoformat(snapshot["saved_at"])
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Ignoring detector checkpoint without valid timestamp")
+            return None
+
+        return {
+            "version": version,
+            "saved_at": saved_at,
+            "payload": snapshot.get("payload", {})
+        }
+
+    @staticmethod
+    def gap_seconds(snapshot: Dict[str, Any], now: Optional[datetime] = None) -> float:
+        """Seconds elapsed between the snapshot and now."""
+        now = now or datetime.now(timezone.utc)
+        return max(0.0, (now - snapshot["saved_at"]).total_seconds())
@@ -0,0 +1,126 @@
+"""
+Point-budget downsampling of power series for charts.
+
+A day of 15s samples is 5,760 points per device, a year about 2.1 million.
+Charts need a few hundred. Both methods select existing samples (no
+averaging), so short spikes such as an espresso shot keep their height:
+
+- lttb: Largest-Triangle-Three-Buckets. Splits the series into equal-count
+  buckets and keeps the point of each bucket that spans the largest triangle
+  with the previously kept point and the next bucket's average. Best visual
+  shape for a given budget.
+- minmax: keeps the minimum and maximum of each bucket. Guarantees every
+  extreme survives, at the cost of a noisier line.
+
+Both work on NumPy arrays: bucket statistics are computed with reduceat and
+LTTB only loops over buckets, never over samples.
+
+Usage:
+    indices = downsample(timestamps, powers, 500)              # LTTB
+    indices = downsample(timestamps, powers, 500, "minmax")
+    timestamps, powers = timestamps[indices], powers[indices]
+"""
+
+from typing import Callable, Dict
+
+import numpy as np
+
+
+def _bucket_edges(start: int, stop: int, buckets: int) -> np.ndarray:
+    """Edges of `buckets` equal-count buckets over [start, stop) (requires buckets <= stop - start)."""
+    return np.linspace(start, stop, buckets + 1).astype(np.int64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    Args:
+        x: Ascending sample times (e.g. epoch seconds)
+        y: Sample values
+        n_out: Point budget (>= 3); the first and last point are always kept
+
+    Returns:
+        Ascending int64 indices into x/y (all indices if len(x) <= n_out)
+    """
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n, dtype=np.int64)
+    if n_out < 3:
+        raise ValueError("LTTB needs a budget of at least 3 points")
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # n_out - 2 buckets between the fixed first and last point
+    edges = _bucket_edges(1, n - 1, n_out - 2)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x, edges[:-1]) / counts
+    mean_y = np.add.reduceat(y, edges[:-1]) / counts
+    # Third vertex for bucket i: mean of bucket i + 1, the last point for the last bucket
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((ax - next_x[i]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[i] - ay))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Indices of the minimum and maximum of n_out / 2 equal-count buckets.
+
+    Args:
+        x: Ascending sample times (unused, for a uniform signature)
+        y: Sample values
+        n_out: Point budget (>= 2)
+
+    Returns:
+        Ascending int64 indices (at most n_out; all indices if len(y) <= n_out)
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n, dtype=np.int64)
+    if n_out < 2:
+        raise ValueError("Min/max downsampling needs a budget of at least 2 points")
+
+    y = np.asarray(y)
+    buckets = n_out // 2
+    edges = _bucket_edges(0, n, buckets)
+    starts, counts = edges[:-1], np.diff(edges)
+
+    def first_match(bucket_values: np.ndarray) -> np.ndarray:
+        # Every bucket contains its own extreme, so the first hit at or after
+        # the bucket start lies inside the bucket
+        hits = np.flatnonzero(y == np.repeat(bucket_values, counts))
+        return hits[hits.searchsorted(starts)]
+
+    lows = first_match(np.minimum.reduceat(y, starts))
+    highs = first_match(np.maximum.reduceat(y, starts))
+    return np.unique(np.concatenate([lows, highs]))
+
+
+METHODS: Dict[str, Callable[[np.ndarray, np.ndarray, int], np.ndarray]] = {
+    "lttb": lttb_indices,
+    "minmax": minmax_indices,
+}
+
+
+def downsample(x: np.ndarray, y: np.ndarray, n_out: int, method: str = "lttb") -> np.ndarray:
+    """
+    Indices of the points to keep for a chart with a budget of n_out points.
+
+    Raises:
+        ValueError: Unknown method or a budget too small for the method
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}' (expected one of {', '.join(METHODS)})")
+    return METHODS[method](x, y, n_out)
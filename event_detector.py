@@ -7,17 +7,22 @@ consumption data and stores them in a dedicated InfluxDB bucket for analytics.
 
 import os
 import json
+import time
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any, Tuple
-from dataclasses import dataclass, field
 from collections import deque
 from dotenv import load_dotenv
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import InfluxDBClient
 
 from awtrix_client import AwtrixClient, AwtrixMessage
+from detection_engine import DetectorEngine, DetectorState, Event, create_detector
+from detector_checkpoint import DetectorCheckpoint
+from event_summary_store import EventSummaryStore
+from influx_batch_writer import InfluxBatchWriter
+from influx_stream import read_frame
+from retry_manager import RetryPolicy
 from utils import send_pushover_notification_new
 
 load_dotenv()
@@ -29,144 +34,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-@dataclass
-class Event:
-    """Represents a detected appliance event."""
-    device: str
-    event_type: str
-    start_time: datetime
-    end_time: datetime
-    duration_seconds: float
-    energy_wh: float
-    peak_power: float
-    avg_power: float
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
 
 
-@dataclass
-class DetectorState:
-    """Tracks the state of an appliance detector."""
-    state: str = "idle"  # idle, active, cooling_down
-    event_start: Optional[datetime] = None
-    cooling_start: Optional[datetime] = None
-    power_readings: List[tuple] = field(default_factory=list)
-    last_event_end: Optional[datetime] = None
-
-
-class ApplianceEventDetector:
-    """Generic event detector using configurable profiles."""
-
-    def __init__(self, device_name: str, profile: dict, settings: dict):
-        self.device_name = device_name
-        self.profile = profile
-        self.settings = settings
-        self.detector_state = DetectorState()
-
-        logger.info(f"Initialized detector for {device_name}: {profile['event_name']} "
-                   f"(on>{profile['threshold_on']}W, off<{profile['threshold_off']}W)")
-
-    def process_reading(self, power: float, timestamp: datetime) -> Optional[Event]:
-        """
-        Process a power reading and return an Event if one completed.
-
-        Args:
-            power: Current power reading in watts
-            timestamp: Timestamp of the reading
-
-        Returns:
-            Event object if an event completed, None otherwise
-        """
-        state = self.detector_state
-        profile = self.profile
-
-        # Cooldown check - prevent duplicate events
-        if state.last_event_end:
-            cooldown = profile.get("cooldown_seconds", 60)
-            if (timestamp - state.last_event_end).total_seconds() < cooldown:
-                return None
-
-        if state.state == "idle":
-            if power >= profile["threshold_on"]:
-                state.state = "active"
-                state.event_start = timestamp
-                state.power_readings = [(power, timestamp)]
-                logger.info(f"{self.device_name}: Event started (power={power:.1f}W)")
-
-        elif state.state == "active":
-            state.power_readings.append((power, timestamp))
-
-            if power < profile["threshold_off"]:
-                state.state = "cooling_down"
-                state.cooling_start = timestamp
-                logger.debug(f"{self.device_name}: Cooling down (power={power:.1f}W)")
-
-        elif state.state == "cooling_down":
-            if power >= profile["threshold_off"]:
-                # False alarm, back to active
-                state.state = "active"
-                state.power_readings.append((power, timestamp))
-                state.cooling_start = None
-                logger.debug(f"{self.device_name}: Back to active (power={power:.1f}W)")
-            else:
-                # Check if cooling period elapsed
-                cooling_confirmation = self.settings.get("cooling_confirmation_seconds", 30)
-                cooling_duration = (timestamp - state.cooling_start).total_seconds()
-
-                if cooling_duration >= cooling_confirmation:
-                    return self._finalize_event(timestamp)
-
-        return None
-
-    def _finalize_event(self, end_time: datetime) -> Optional[Event]:
-        """Calculate event metrics and return Event object."""
-        state = self.detector_state
-        profile = self.profile
-
-        duration = (end_time - state.event_start).total_seconds()
-
-        # Validate duration
-        min_dur = profile.get("min_duration_seconds", 0)
-        max_dur = profile.get("max_duration_seconds")
-
-        if duration < min_dur:
-            logger.info(f"{self.device_name}: Event too short ({duration:.0f}s < {min_dur}s), discarding")
-            self._reset()
-            return None
-
-        if max_dur and duration > max_dur:
-            logger.info(f"{self.device_name}: Event too long ({duration:.0f}s > {max_dur}s), discarding")
-            self._reset()
-            return None
-
-        # Calculate metrics
-        powers = [p for p, t in state.power_readings]
-        peak_power = max(powers) if powers else 0
-        avg_power = sum(powers) / len(powers) if powers else 0
-        energy_wh = (avg_power * duration) / 3600
-
-        event = Event(
-            device=self.device_name,
-            event_type=profile["event_name"],
-            start_time=state.event_start,
-            end_time=end_time,
-            duration_seconds=duration,
-            energy_wh=energy_wh,
-            peak_power=peak_power,
-            avg_power=avg_power
-        )
-
-        logger.info(f"{self.device_name}: Event completed - {profile['event_name']} "
-                   f"(duration={duration:.0f}s, energy={energy_wh:.1f}Wh, peak={peak_power:.0f}W)")
-
-        state.last_event_end = end_time
-        self._reset()
-        return event
-
-    def _reset(self):
-        """Reset detector state for next event."""
-        self.detector_state.state = "idle"
-        self.detector_state.event_start = None
-        self.detector_state.cooling_start = None
-        self.detector_state.power_readings = []
+def _from_iso(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
 
 
 class EventDetectorService:
@@ -193,10 +66,27 @@ class EventDetectorService:
         # Load profiles
         self.profiles: Dict[str, dict] = {}
         self.settings: dict = {}
-        self.detectors: Dict[str, ApplianceEventDetector] = {}
+        self.detectors: Dict[str, DetectorEngine] = {}
 
         # Event tracking for summaries
         self.today_events: List[Event] = []
+        self.summary_store = EventSummaryStore()
+
+        # Completed events are coalesced and written in batches
+        self.event_writer = InfluxBatchWriter(
+            influx_host=self.influx_host,
+            influx_port=self.influx_port,
+            influx_token=self.influx_token,
+            influx_bucket=self.events_bucket,
+            influx_org=self.influx_org
+        )
+        self.event_write_retry = RetryPolicy(max_retries=3, max_delay=30, raise_on_auth_error=False)
+        self.pending_events: List[Event] = []
+        self.pending_since: Optional[float] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Per-device high-water mark of the last processed power sample
+        self.cursors: Dict[str, datetime] = {}
         self.last_summary_minute: Optional[int] = None  # Track which xx:x5 minute we last ran summary
         self.last_daily_summary: Optional[datetime] = None
 
@@ -206,6 +96,12 @@ class EventDetectorService:
         self._load_profiles()
         self._initialize_detectors()
 
+        # Crash-safe state snapshots (restored on startup)
+        self.checkpoint = DetectorCheckpoint(
+            interval_seconds=self.settings.get("checkpoint_interval_seconds", 60)
+        )
+        self._restore_checkpoint()
+
     def _load_profiles(self):
         """Load appliance profiles from configuration file."""
         config_path = os.path.join(
@@ -230,11 +126,93 @@ class EventDetectorService:
     def _initialize_detectors(self):
         """Create detector instances for each profiled device."""
         for device_name, profile in self.profiles.items():
-            self.detectors[device_name] = ApplianceEventDetector(
-                device_name, profile, self.settings
-            )
+            detector = create_detector(device_name, profile, self.settings, log_events=True)
+            self.detectors[device_name] = detector
+            logger.info(f"Initialized {detector.detection_type} detector for {device_name}: "
+                        f"{profile['event_name']} (on>{profile['threshold_on']}W, "
+                        f"off<{profile['threshold_off']}W)")
         logger.info(f"Initialized {len(self.detectors)} event detectors")
 
+    def _checkpoint_payload(self) -> dict:
+        """Collect all state that must survive a restart."""
+        return {
+            "detectors": {
+                name: detector.state.to_dict()
+                for name, detector in self.detectors.items()
+            },
+            "today_events": [event.to_dict() for event in self.today_events],
+            "last_daily_summary": _iso(self.last_daily_summary),
+            "cursors": {device: ts.isoformat() for device, ts in self.cursors.items()},
+            "pending_events": [event.to_dict() for event in self.pending_events]
+        }
+
+    def _save_checkpoint(self, force: bool = False):
+        """Write a snapshot if the interval elapsed (or unconditionally if forced)."""
+        if force or self.checkpoint.is_due():
+            self.checkpoint.save(self._checkpoint_payload())
+
+    def _restore_checkpoint(self):
+        """
+        Restore detector state and today's events from the last snapshot.
+
+        If the snapshot is younger than checkpoint_max_gap_seconds, open
+        events and ingestion cursors are resumed and the samples written
+        while the service was down are replayed from the cursors. After a
+        longer outage open events and cursors are dropped and only cooldowns
+        and completed events are kept.
+        """
+        snapshot = self.checkpoint.load()
+        if not snapshot:
+            return
+
+        payload = snapshot["payload"]
+        gap = self.checkpoint.gap_seconds(snapshot)
+        max_gap = self.settings.get("checkpoint_max_gap_seconds", 21600)
+        resume_open_events = gap <= max_gap
+
+        try:
+            for name, state_data in payload.get("detectors", {}).items():
+                detector = self.detectors.get(name)
+                if detector is None:
+                    continue
+                detector.state = DetectorState.from_dict(state_data)
+                if detector.state.state != "idle" and not resume_open_events:
+                    logger.warning(f"{name}: Dropping in-progress event from stale checkpoint "
+                                   f"({gap:.0f}s old > {max_gap}s)")
+                    detector.reset()
+
+            today = datetime.now().date()
+            self.today_events = [
+                event for event in (Event.from_dict(e) for e in payload.get("today_events", []))
+                if event.start_time.date() == today
+            ]
+            self.last_daily_summary = _from_iso(payload.get("last_daily_summary"))
+
+            # Events detected but not yet written when the service stopped
+            for event in (Event.from_dict(e) for e in payload.get("pending_events", [])):
+                self._queue_event(event)
+
+            if resume_open_events:
+                self.cursors = {
+                    device: datetime.fromisoformat(ts)
+                    for device, ts in payload.get("cursors", {}).items()
+                    if device in self.detectors
+                }
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Invalid detector checkpoint, starting fresh: {e}")
+            for detector in self.detectors.values():
+                detector.state = DetectorState()
+            self.today_events = []
+            self.cursors = {}
+            self.event_writer.clear()
+            self.pending_events = []
+            self.pending_since = None
+            return
+
+        active = [name for name, d in self.detectors.items() if d.state.state != "idle"]
+        logger.info(f"Restored checkpoint from {gap:.0f}s ago: "
+                    f"{len(self.today_events)} events today, in-progress: {active or 'none'}")
+
     def _is_carousel_window(self) -> bool:
         """
         Check if we're currently in the carousel display window.
@@ -305,58 +283,12 @@ class EventDetectorService:
             org=self.influx_org
         )
 
-    def _query_events_from_influx(self, days: int) -> Dict[str, Dict[str, Any]]:
-        """
-        Query event counts and durations from InfluxDB for a given time range.
-
-        Args:
-            days: Number of days to look back
-
-        Returns:
-            Dict mapping event_type to {count, total_duration_seconds}
-        """
-        query = f'''
-        from(bucket: "{self.events_bucket}")
-            |> range(start: -{days}d)
-            |> filter(fn: (r) => r["_measurement"] == "event")
-            |> filter(fn: (r) => r["_field"] == "duration_seconds")
-            |> group(columns: ["event_type"])
-        '''
-
-        results: Dict[str, Dict[str, Any]] = {}
-
-        try:
-            with self._get_influx_client() as client:
-                query_api = client.query_api()
-                tables = query_api.query(query)
-
-                for table in tables:
-                    event_type = None
-                    count = 0
-                    total_duration = 0.0
-
-                    for record in table.records:
-                        event_type = record.values.get("event_type")
-                        count += 1
-                        total_duration += record.get_value() or 0
-
-                    if event_type:
-                        results[event_type] = {
-                            "count": count,
-                            "total_duration_seconds": total_duration
-                        }
-
-        except Exception as e:
-            logger.error(f"Failed to query events from InfluxDB: {e}")
-
-        return results
-
     def _format_period_summary(self, events: Dict[str, Dict[str, Any]], period: str) -> Optional[str]:
         """
         Format a summary string for a time period.
 
         Args:
-            events: Dict from _query_events_from_influx
+            events: Dict from EventSummaryStore.summarize
             period: Period name (Day, Week, Month, Year)
 
         Returns:
@@ -410,70 +342,138 @@ class EventDetectorService:
 
         return f"{period}: {', '.join(parts)}"
 
-    async def _query_latest_power(self) -> Dict[str, tuple]:
+    async def _query_new_power(self) -> Dict[str, List[Tuple[float, datetime]]]:
         """
-        Query latest power readings for all profiled devices.
+        Fetch every power sample newer than each device's cursor in one query.
+
+        Each device keeps a high-water-mark timestamp of the last sample it
+        processed, so no reading between two polls is skipped and none is
+        processed twice, even if the loop lags or the service restarts.
+        Devices without a cursor start ingest_initial_lookback_seconds back;
+        cursors older than checkpoint_max_gap_seconds are dropped.
 
         Returns:
-            Dict mapping device name to (power, timestamp) tuple
+            Dict mapping device name to time-ordered (power, timestamp) tuples
         """
-        device_names = list(self.profiles.keys())
-        device_filter = " or ".join([f'r["device"] == "{d}"' for d in device_names])
+        now = datetime.now(timezone.utc)
+        initial_start = now - timedelta(
+            seconds=self.settings.get("ingest_initial_lookback_seconds", 60)
+        )
+        oldest_allowed = now - timedelta(
+            seconds=self.settings.get("checkpoint_max_gap_seconds", 21600)
+        )
+
+        since: Dict[str, datetime] = {}
+        for device in self.profiles:
+            cursor = self.cursors.get(device)
+            if cursor is not None and cursor < oldest_allowed:
+                logger.warning(f"{device}: Cursor {cursor.isoformat()} is beyond the catch-up "
+                               f"window, skipping the gap and resetting the detector")
+                self.detectors[device].reset()
+                del self.cursors[device]
+                cursor = None
+            # Timestamps are microsecond-truncated on the client, so "newer than
+            # the cursor" means at least one microsecond later
+            since[device] = cursor + timedelta(microseconds=1) if cursor else initial_start
+
+        if not since:
+            return {}
+
+        def flux_time(ts: datetime) -> str:
+            return ts.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+        device_filter = " or ".join(
+            f'(r["device"] == "{d}" and r["_time"] >= time(v: "{flux_time(ts)}"))'
+            for d, ts in since.items()
+        )
 
         query = f'''
         from(bucket: "{self.source_bucket}")
-            |> range(start: -1m)
+            |> range(start: {flux_time(min(since.values()))})
             |> filter(fn: (r) => r["_measurement"] == "power_consumption")
             |> filter(fn: (r) => r["_field"] == "power")
             |> filter(fn: (r) => {device_filter})
-            |> last()
+            |> group(columns: ["device"])
+            |> sort(columns: ["_time"])
+            |> keep(columns: ["_time", "device", "_value"])
+            |> toFloat()
         '''
 
-        results = {}
+        results: Dict[str, List[Tuple[float, datetime]]] = {}
         try:
             with self._get_influx_client() as client:
-                query_api = client.query_api()
-                tables = query_api.query(query)
-
-                for table in tables:
-                    for record in table.records:
-                        device = record.values.get("device")
-                        power = record.get_value()
-                        timestamp = record.get_time()
-                        if device and power is not None:
-                            results[device] = (power, timestamp)
-
+                frame = read_frame(client, query, ["_time", "device", "_value"], {"_value": "float64"})
         except Exception as e:
             logger.error(f"Failed to query power data: {e}")
+            return results
+
+        frame = frame.dropna(subset=["_time", "device", "_value"])
+        # Cursors hold microsecond datetimes, so compare at that precision
+        timestamps = frame["_time"].dt.floor("us")
+        for device, power, timestamp in zip(frame["device"], frame["_value"], timestamps):
+            timestamp = timestamp.to_pydatetime()
+            cursor = self.cursors.get(device)
+            if device and (cursor is None or timestamp > cursor):
+                results.setdefault(device, []).append((float(power), timestamp))
 
         return results
 
-    async def _write_event(self, event: Event):
-        """Write detected event to InfluxDB events bucket."""
-        try:
-            point = Point("event") \
-                .tag("device", event.device) \
-                .tag("event_type", event.event_type) \
-                .tag("hour_of_day", str(event.start_time.hour)) \
-                .tag("day_of_week", str(event.start_time.weekday())) \
-                .field("duration_seconds", event.duration_seconds) \
-                .field("energy_wh", event.energy_wh) \
-                .field("peak_power", event.peak_power) \
-                .field("avg_power", event.avg_power) \
-                .time(event.start_time, WritePrecision.NS)
+    def _queue_event(self, event: Event):
+        """Buffer a detected event for the next batched write."""
+        # Keep period summaries current without re-querying InfluxDB
+        if self.summary_store.seeded:
+            self.summary_store.add(
+                event.event_type, event.start_time, event.duration_seconds, event.energy_wh
+            )
 
-            with self._get_influx_client() as client:
-                write_api = client.write_api(write_options=SYNCHRONOUS)
-                write_api.write(
-                    bucket=self.events_bucket,
-                    org=self.influx_org,
-                    record=point
-                )
+        self.event_writer.add_event(event)
+        self.pending_events.append(event)
+        if self.pending_since is None:
+            self.pending_since = time.monotonic()
 
-            logger.info(f"Wrote event to InfluxDB: {event.event_type} from {event.device}")
+    async def _flush_events(self, force: bool = False):
+        """
+        Start writing buffered events once the coalescing window elapsed.
 
-        except Exception as e:
-            logger.error(f"Failed to write event to InfluxDB: {e}")
+        The write (and its retry backoff during an InfluxDB outage) runs in
+        the background, so sample processing continues meanwhile. A failed
+        batch is retried as a unit; if it still fails, the events stay
+        buffered (and checkpointed) for the next cycle.
+
+        Args:
+            force: Flush regardless of the coalescing window
+        """
+        if not self.pending_events:
+            return
+        if self._flush_task is not None and not self._flush_task.done():
+            return  # previous write still running; new events go with the next one
+
+        window = self.settings.get("event_write_window_seconds", 15)
+        if not force and time.monotonic() - self.pending_since < window:
+            return
+
+        self._flush_task = asyncio.ensure_future(self._write_pending_events())
+
+    async def _write_pending_events(self):
+        # Events queued while the write runs are kept for the next flush
+        count = len(self.pending_events)
+        if await self.event_writer.flush(retry_policy=self.event_write_retry):
+            logger.info(f"Wrote {count} event(s) to InfluxDB")
+            del self.pending_events[:count]
+            self.pending_since = time.monotonic() if self.pending_events else None
+            self._save_checkpoint(force=True)
+        else:
+            logger.error(f"Failed to write {count} event(s) to InfluxDB, keeping them buffered")
+
+    def _seed_summary_store(self) -> bool:
+        """Seed period summaries from InfluxDB plus events still waiting to be written."""
+        if not self.summary_store.seed(self._get_influx_client, self.events_bucket):
+            return False
+        for event in self.pending_events:
+            self.summary_store.add(
+                event.event_type, event.start_time, event.duration_seconds, event.energy_wh
+            )
+        return True
 
     def _send_event_notification(self, event: Event):
         """Send AWTRIX notification for completed event (if enabled)."""
@@ -521,6 +521,10 @@ class EventDetectorService:
         if self.last_summary_minute == current_minute:
             return
 
+        # Seed once from the events bucket; afterwards the store is updated in place
+        if not self.summary_store.seeded and not self._seed_summary_store():
+            return
+
         logger.info(f"Sending period summaries at {now.strftime('%H:%M')}")
 
         # Define time periods: (days, label, icon, color)
@@ -535,7 +539,7 @@ class EventDetectorService:
         summaries_sent = 0
 
         for days, label, icon, color in periods:
-            events = self._query_events_from_influx(days)
+            events = self.summary_store.summarize(days)
             summary_text = self._format_period_summary(events, label)
 
             if summary_text:
@@ -649,32 +653,48 @@ class EventDetectorService:
         logger.info(f"Source bucket: {self.source_bucket}")
         logger.info(f"Events bucket: {self.events_bucket}")
         logger.info(f"Monitoring devices: {list(self.profiles.keys())}")
+        logger.info(f"State checkpoint: {self.checkpoint.path}")
         logger.info("AWTRIX schedule: Period summaries (Day/Week/Month/Year) at xx:05, xx:25, xx:45")
         logger.info("AWTRIX schedule: Carousel window avoided at xx:00-xx:02 (each 10min cycle)")
 
+        # Seed period summaries once (retried at the next summary slot on failure)
+        self._seed_summary_store()
+
         while True:
             try:
-                # Query latest power readings
-                power_data = await self._query_latest_power()
+                # Fetch all samples since each device's cursor
+                power_data = await self._query_new_power()
+
+                # Process each device's readings in time order
+                for device_name, readings in power_data.items():
+                    detector = self.detectors.get(device_name)
+                    if detector is None:
+                        continue
 
-                # Process each reading through corresponding detector
-                for device_name, (power, timestamp) in power_data.items():
-                    if device_name in self.detectors:
-                        event = self.detectors[device_name].process_reading(power, timestamp)
+                    for power, timestamp in readings:
+                        event = detector.process_reading(power, timestamp)
+                        self.cursors[device_name] = timestamp
 
                         if event:
-                            # Store event
-                            await self._write_event(event)
+                            # Store event (written with the next batch)
+                            self._queue_event(event)
                             self.today_events.append(event)
+                            self._save_checkpoint(force=True)
 
                             # Send notification if enabled (immediate if safe, queued otherwise)
                             self._send_event_notification(event)
 
+                # Write events once the coalescing window elapsed
+                await self._flush_events()
+
                 # Check for scheduled summaries (runs at xx:x5 times)
                 await self._send_summary()
                 await self._send_daily_summary()
                 await self._cleanup_old_events()
 
+                # Periodic state snapshot for crash recovery
+                self._save_checkpoint()
+
                 # Process any queued AWTRIX messages (sent when outside carousel window)
                 await self._process_awtrix_queue()
 
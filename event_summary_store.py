@@ -0,0 +1,184 @@
+"""
+Incrementally maintained event summaries for MyTapo.
+
+Keeps one small aggregate row (count, total duration, total energy) per hour
+and event type in memory. The store is seeded once from the appliance_events
+bucket with a server-side hourly aggregation and then updated in place as the
+event detector emits events, so day/week/month/year summaries are answered by
+summing at most a year of rows without touching InfluxDB.
+
+Periods are rolling windows (the last 24 hours, 7 days, ...) like the
+`range(start: -Nd)` queries they replace, at hour resolution: a window
+includes the whole hour it starts in, so it never misses an event and
+includes at most one hour more. Hours are UTC, matching InfluxDB's
+aggregateWindow boundaries.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from influxdb_client import InfluxDBClient
+
+from influx_stream import read_frame
+
+logger = logging.getLogger(__name__)
+
+# Row layout: [count, total_duration_seconds, total_energy_wh]
+COUNT, DURATION, ENERGY = 0, 1, 2
+
+
+class EventSummaryStore:
+    """
+    Per-day, per-event-type aggregates for period summaries.
+
+    Usage:
+        store = EventSummaryStore()
+        store.seed(client_factory, "appliance_events")
+
+        store.add("espresso", start_time, duration_seconds=35, energy_wh=9.2)
+        week = store.summarize(7)
+    """
+
+    def __init__(self, retention_days: int = 366):
+        """
+        Initialize an empty store.
+
+        Args:
+            retention_days: Number of days to keep (rows older are pruned)
+        """
+        self.retention_days = retention_days
+        self.hourly: Dict[datetime, Dict[str, List[float]]] = {}
+        self.seeded = False
+
+    @staticmethod
+    def _utc_hour(timestamp: datetime) -> datetime:
+        """Start of the UTC hour of a timestamp (naive timestamps are UTC)."""
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _row(self, hour: datetime, event_type: str) -> List[float]:
+        rows = self.hourly.setdefault(hour, {})
+        row = rows.get(event_type)
+        if row is None:
+            row = rows[event_type] = [0, 0.0, 0.0]
+        return row
+
+    def seed(
+        self,
+        client_factory: Callable[[], InfluxDBClient],
+        bucket: str,
+        days: Optional[int] = None
+    ) -> bool:
+        """
+        Load hourly aggregates from the events bucket (one query).
+
+        Replaces any existing rows. Aggregation happens in InfluxDB, so only
+        one small record per hour with events and event type is transferred.
+
+        Args:
+            client_factory: Callable returning a new InfluxDBClient
+            bucket: Events bucket name
+            days: Days to load (defaults to retention_days)
+
+        Returns:
+            True if the store was seeded, False on query failure
+        """
+        days = days or self.retention_days
+
+        query = f'''
+        base = from(bucket: "{bucket}")
+            |> range(start: -{days}d)
+            |> filter(fn: (r) => r["_measurement"] == "event")
+            |> filter(fn: (r) => r["_field"] == "duration_seconds" or r["_field"] == "energy_wh")
+            |> group(columns: ["event_type", "_field"])
+
+        counts = base
+            |> filter(fn: (r) => r["_field"] == "duration_seconds")
+            |> aggregateWindow(every: 1h, fn: count, timeSrc: "_start", createEmpty: false)
+            |> set(key: "_field", value: "count")
+
+        sums = base
+            |> aggregateWindow(every: 1h, fn: sum, timeSrc: "_start", createEmpty: false)
+
+        union(tables: [counts, sums])
+            |> keep(columns: ["_time", "event_type", "_field", "_value"])
+            |> toFloat()
+        '''
+
+        hourly: Dict[datetime, Dict[str, List[float]]] = {}
+        slots = {"count": COUNT, "duration_seconds": DURATION, "energy_wh": ENERGY}
+
+        try:
+            with client_factory() as client:
+                frame = read_frame(client, query, ["_time", "event_type", "_field", "_value"],
+                                   {"_value": "float64"})
+        except Exception as e:
+            logger.error(f"Failed to seed event summary store: {e}")
+            return False
+
+        frame = frame[frame["event_type"].notna() & (frame["event_type"] != "") & frame["_field"].isin(slots)]
+        for event_type, field, timestamp, value in zip(
+            frame["event_type"], frame["_field"], frame["_time"], frame["_value"].fillna(0)
+        ):
+            hour = self._utc_hour(timestamp.to_pydatetime())
+            row = hourly.setdefault(hour, {}).setdefault(event_type, [0, 0.0, 0.0])
+            slot = slots[field]
+            row[slot] += int(value) if slot == COUNT else float(value)
+
+        self.hourly = hourly
+        self.seeded = True
+        self._prune()
+        logger.info(f"Seeded event summary store with {len(self.hourly)} hours of aggregates")
+        return True
+
+    def add(
+        self,
+        event_type: str,
+        start_time: datetime,
+        duration_seconds: float,
+        energy_wh: float
+    ) -> None:
+        """Account for a newly detected event."""
+        row = self._row(self._utc_hour(start_time), event_type)
+        row[COUNT] += 1
+        row[DURATION] += duration_seconds
+        row[ENERGY] += energy_wh
+
+    def summarize(self, days: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Sum the rows of the last N days (rolling, from the hour N days ago).
+
+        Returns:
+            Dict mapping event_type to {count, total_duration_seconds, total_energy_wh}
+        """
+        self._prune()
+        first_hour = self._utc_hour(self._now() - timedelta(days=days))
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for hour, rows in self.hourly.items():
+            if hour < first_hour:
+                continue
+            for event_type, row in rows.items():
+                summary = results.get(event_type)
+                if summary is None:
+                    summary = results[event_type] = {
+                        "count": 0,
+                        "total_duration_seconds": 0.0,
+                        "total_energy_wh": 0.0
+                    }
+                summary["count"] += int(row[COUNT])
+                summary["total_duration_seconds"] += row[DURATION]
+                summary["total_energy_wh"] += row[ENERGY]
+
+        return results
+
+    def _prune(self) -> None:
+        """Drop rows that fell out of the retention window."""
+        cutoff = self._utc_hour(self._now() - timedelta(days=self.retention_days))
+        for hour in [h for h in self.hourly if h < cutoff]:
+            del self.hourly[hour]
@@ -0,0 +1,69 @@
+"""
+Pluggable JSON serializer for the report API.
+
+Uses orjson when it is installed (several times faster than the stdlib for
+the large report payloads, and it writes bytes directly) and falls back to
+the stdlib json module otherwise. The backend can be forced with
+JSON_BACKEND=json|orjson (default auto).
+
+Differences of the orjson backend: compact separators, NaN/Infinity become
+null (the stdlib writes invalid JSON for them), and NumPy scalars/arrays are
+serialized. Objects orjson rejects (e.g. integers beyond 64 bit) are passed
+to the stdlib, so every payload the stdlib accepts still works.
+
+Usage:
+    from fast_json import dumps, loads, BACKEND
+    body = dumps({"total_kwh": 12.3})    # bytes
+    data = loads(body)
+"""
+
+import os
+import json
+import logging
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+_requested = os.getenv("JSON_BACKEND", "auto").lower()
+if _requested not in ("auto", "json", "orjson"):
+    logger.warning(f"Unknown JSON_BACKEND '{_requested}', using auto")
+    _requested = "auto"
+if _requested == "orjson" and orjson is None:
+    logger.warning("JSON_BACKEND=orjson but orjson is not installed, using json")
+
+BACKEND = "orjson" if orjson is not None and _requested != "json" else "json"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj).encode()
+
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serialize obj to UTF-8 JSON bytes with the configured backend.
+
+    Raises:
+        TypeError: The object is not JSON serializable
+    """
+    if BACKEND == "orjson":
+        try:
+            return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+        except TypeError:
+            # orjson.JSONEncodeError is a TypeError; let the stdlib decide
+            pass
+    return _stdlib_dumps(obj)
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes."""
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
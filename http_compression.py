@@ -0,0 +1,137 @@
+"""
+Response compression and encoding statistics for the report API.
+
+Responses above `min_bytes` are compressed with gzip or deflate, whichever
+the client prefers in Accept-Encoding (gzip on a tie; q=0 excludes a coding).
+Bodies above `offload_bytes` are compressed in a worker thread so large
+payloads such as the custom AI context do not block the event loop.
+
+EncodingStats collects per endpoint how long serialization and compression
+took and how many bytes were produced and sent.
+
+Usage:
+    compressor = Compressor()
+    coding = compressor.negotiate(request.headers.get("Accept-Encoding", ""))
+    if coding and len(body) >= compressor.min_bytes:
+        body = await compressor.compress(body, coding)
+    stats = EncodingStats()
+    stats.record("/reports/custom", serialize_s=0.002, compress_s=0.004, raw_bytes=90_000, sent_bytes=9_000)
+"""
+
+import os
+import zlib
+import asyncio
+import threading
+from typing import Dict, Optional
+
+# Preference on equal q-values
+CODINGS = ("gzip", "deflate")
+
+
+class Compressor:
+    """Content-coding negotiation and gzip/deflate compression."""
+
+    def __init__(self, min_bytes: Optional[int] = None, level: Optional[int] = None,
+                 offload_bytes: int = 256 * 1024):
+        """
+        Initialize the compressor.
+
+        Args:
+            min_bytes: Smallest body that is compressed (env REPORT_API_COMPRESS_MIN_BYTES, default 1024)
+            level: zlib compression level 1-9 (env REPORT_API_COMPRESS_LEVEL, default 5)
+            offload_bytes: Bodies from this size are compressed in a worker thread
+        """
+        self.min_bytes = min_bytes if min_bytes is not None else \
+            int(os.getenv("REPORT_API_COMPRESS_MIN_BYTES", "1024"))
+        self.level = level if level is not None else \
+            int(os.getenv("REPORT_API_COMPRESS_LEVEL", "5"))
+        self.offload_bytes = offload_bytes
+
+    @staticmethod
+    def negotiate(accept_encoding: str) -> Optional[str]:
+        """
+        Pick the content coding from an Accept-Encoding header.
+
+        Returns:
+            "gzip", "deflate" or None (send uncompressed)
+        """
+        weights: Dict[str, float] = {}
+        for item in accept_encoding.lower().split(","):
+            coding, _, params = item.strip().partition(";")
+            q = 1.0
+            for param in params.split(";"):
+                name, _, value = param.strip().partition("=")
+                if name == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            weights[coding.strip()] = q
+        candidates = [
+            (weights.get(coding, weights.get("*", 0.0)), -index, coding)
+            for index, coding in enumerate(CODINGS)
+        ]
+        q, _, coding = max(candidates)
+        return coding if q > 0 else None
+
+    def _compress(self, body: bytes, coding: str) -> bytes:
+        # gzip = deflate with a gzip header (wbits 31); HTTP deflate is the zlib format
+        wbits = 31 if coding == "gzip" else zlib.MAX_WBITS
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        return compressor.compress(body) + compressor.flush()
+
+    async def compress(self, body: bytes, coding: str) -> bytes:
+        """Compress body with the given coding (off the event loop for large bodies)."""
+        if len(body) >= self.offload_bytes:
+            return await asyncio.to_thread(self._compress, body, coding)
+        return self._compress(body, coding)
+
+
+class EncodingStats:
+    """
+    Thread-safe per-endpoint serialization/compression counters.
+
+    Usage:
+        stats = EncodingStats()
+        stats.record("/tools/batch", 0.001, 0.002, 40_000, 6_000)
+        stats.snapshot()   # {"/tools/batch": {"count": 1, "serialize_avg_ms": 1.0, ...}}
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, serialize_s: float, compress_s: float, raw_bytes: int, sent_bytes: int):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, {
+                "count": 0, "serialize_s": 0.0, "serialize_max_s": 0.0,
+                "compressed": 0, "compress_s": 0.0, "compress_max_s": 0.0,
+                "raw_bytes": 0, "sent_bytes": 0
+            })
+            stats["count"] += 1
+            stats["serialize_s"] += serialize_s
+            stats["serialize_max_s"] = max(stats["serialize_max_s"], serialize_s)
+            if sent_bytes != raw_bytes:
+                stats["compressed"] += 1
+                stats["compress_s"] += compress_s
+                stats["compress_max_s"] = max(stats["compress_max_s"], compress_s)
+            stats["raw_bytes"] += raw_bytes
+            stats["sent_bytes"] += sent_bytes
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                endpoint: {
+                    "count": int(stats["count"]),
+                    "serialize_avg_ms": round(stats["serialize_s"] / stats["count"] * 1000, 2),
+                    "serialize_max_ms": round(stats["serialize_max_s"] * 1000, 2),
+                    "compressed": int(stats["compressed"]),
+                    "compress_avg_ms": round(stats["compress_s"] / stats["compressed"] * 1000, 2)
+                    if stats["compressed"] else None,
+                    "compress_max_ms": round(stats["compress_max_s"] * 1000, 2),
+                    "raw_bytes": int(stats["raw_bytes"]),
+                    "sent_bytes": int(stats["sent_bytes"]),
+                    "ratio": round(stats["sent_bytes"] / stats["raw_bytes"], 3) if stats["raw_bytes"] else None
+                }
+                for endpoint, stats in self._stats.items()
+            }
@@ -6,17 +6,43 @@ overhead from 3,120 connections/hour to 240 connections/hour (13 devices × 240
 """
 
 import os
+import asyncio
 import logging
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 from influxdb_client import InfluxDBClient, Point, WritePrecision
 from influxdb_client.client.write_api import SYNCHRONOUS
 from contextlib import contextmanager
 
+from retry_manager import RetryPolicy, retry_async_operation, retry_operation
+
 logger = logging.getLogger(__name__)
 
 
+def event_to_point(event: Any) -> Point:
+    """
+    Build the appliance_events point for a detected event.
+
+    Args:
+        event: Event from detection_engine (device, event_type, start_time, metrics)
+
+    Returns:
+        Point for the "event" measurement, timestamped at the start second
+    """
+    start_time = event.start_time.replace(microsecond=0)
+    return Point("event") \
+        .tag("device", event.device) \
+        .tag("event_type", event.event_type) \
+        .tag("hour_of_day", str(start_time.hour)) \
+        .tag("day_of_week", str(start_time.weekday())) \
+        .field("duration_seconds", event.duration_seconds) \
+        .field("energy_wh", event.energy_wh) \
+        .field("peak_power", event.peak_power) \
+        .field("avg_power", event.avg_power) \
+        .time(start_time, WritePrecision.S)
+
+
 class InfluxBatchWriter:
     """
     Optimized batch writer for InfluxDB that accumulates multiple data points
@@ -143,10 +169,39 @@ class InfluxBatchWriter:
         self.batch.append(point)
         logger.debug(f"Added custom measurement to batch: {measurement} (batch size: {len(self.batch)})")
 
-    async def flush(self) -> bool:
+    def add_event(self, event: Any) -> None:
+        """
+        Add a detected appliance event to the batch queue.
+
+        Args:
+            event: Event from detection_engine
+        """
+        self.batch.append(event_to_point(event))
+        logger.debug(f"Added event to batch: {event.event_type} from {event.device} "
+                     f"(batch size: {len(self.batch)})")
+
+    def _write_points(self, points: List[Point]) -> None:
+        """Write points in a single request (raises on failure)."""
+        with self._get_client() as influx_client:
+            write_api = influx_client.write_api(write_options=SYNCHRONOUS)
+            write_api.write(
+                bucket=self.influx_bucket,
+                org=self.influx_org,
+                record=points
+            )
+
+    def _complete_flush(self, batch_size: int) -> None:
+        """Drop the written points (points added meanwhile stay queued)."""
+        del self.batch[:batch_size]
+        logger.info(f"📊 Flushed {batch_size} data points to InfluxDB in single batch")
+
+    async def flush(self, retry_policy: Optional[RetryPolicy] = None) -> bool:
         """
         Write all accumulated data points to InfluxDB in a single batch operation.
 
+        Args:
+            retry_policy: Retry the whole batch with backoff (default: single attempt)
+
         Returns:
             True if successful, False otherwise
         """
@@ -154,19 +209,21 @@ class InfluxBatchWriter:
             logger.debug("No data points to flush")
             return True
 
-        batch_size = len(self.batch)
+        points = list(self.batch)
+        batch_size = len(points)
+
+        # The blocking write runs in a thread and the retry backoff sleeps
+        # asynchronously, so an InfluxDB outage never blocks the event loop
+        async def write():
+            await asyncio.to_thread(self._write_points, points)
 
         try:
-            with self._get_client() as influx_client:
-                write_api = influx_client.write_api(write_options=SYNCHRONOUS)
-                write_api.write(
-                    bucket=self.influx_bucket,
-                    org=self.influx_org,
-                    record=self.batch
-                )
-
-            logger.info(f"📊 Flushed {batch_size} data points to InfluxDB in single batch")
-            self.batch.clear()
+            if retry_policy:
+                await retry_async_operation(write, retry_policy, operation_name="flush")
+            else:
+                await write()
+
+            self._complete_flush(batch_size)
             return True
 
         except Exception as e:
@@ -174,6 +231,36 @@ class InfluxBatchWriter:
             # Don't clear batch on error - allows retry
             return False
 
+    def flush_sync(self, retry_policy: Optional[RetryPolicy] = None) -> bool:
+        """
+        Blocking variant of flush() for scripts and worker processes.
+
+        Args:
+            retry_policy: Retry the whole batch with backoff (default: single attempt)
+
+        Returns:
+            True if successful, False otherwise (the batch is kept for a later flush)
+        """
+        if not self.batch:
+            logger.debug("No data points to flush")
+            return True
+
+        points = list(self.batch)
+        batch_size = len(points)
+
+        try:
+            retry_operation(
+                lambda: self._write_points(points),
+                retry_policy or RetryPolicy(max_retries=0),
+                operation_name="flush"
+            )
+            self._complete_flush(batch_size)
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to flush batch ({batch_size} points) to InfluxDB: {e}")
+            return False
+
     def clear(self) -> None:
         """Clear the batch queue without writing (use after permanent failures)"""
         cleared_count = len(self.batch)
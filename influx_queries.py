@@ -7,16 +7,38 @@ and event_detector.py over time.
 """
 
 import os
+import json
 import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
+import pandas as pd
 from dotenv import load_dotenv
 from influxdb_client import InfluxDBClient
 
+from influx_stream import read_frame
+from query_cache import QueryCache, cache_key
+from query_fanout import LatencyStats, QueryFanout
+from query_planner import QueryPlanner, mean_power
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Tools accepted by query_tool_batch: method and whether it shares the batch fan-out
+BATCH_TOOLS = {
+    "device_consumption": ("query_device_consumption", True),
+    "hourly_consumption": ("query_hourly_consumption", False),
+    "device_events": ("query_device_events_flexible", False),
+    "compare_periods": ("query_compare_periods", True),
+    "solar_history": ("query_solar_history", False),
+}
+
+# Events are stored at their start time once they end, so an event window
+# only stops changing once the longest appliance session has finished
+EVENT_SETTLE_SECONDS = 24 * 3600
+
 
 class InfluxQueries:
     """Shared InfluxDB query interface for all report types."""
@@ -30,8 +52,12 @@ class InfluxQueries:
         self.power_bucket = os.getenv("INFLUXDB_BUCKET", "power_consumption")
         self.events_bucket = os.getenv("INFLUXDB_EVENTS_BUCKET", "appliance_events")
         self.consumption_bucket = os.getenv("INFLUXDB_CONSUMPTION_BUCKET", "consumption_daily")
+        self.hourly_bucket = os.getenv("INFLUXDB_HOURLY_BUCKET", "power_hourly")
         self.cost_per_kwh = 0.28
         self.exclude_devices = {"solar"}
+        self.cache = QueryCache()
+        self.planner = QueryPlanner(self.power_bucket, self.hourly_bucket, self.consumption_bucket)
+        self.latency = LatencyStats()
 
     def _get_client(self) -> InfluxDBClient:
         return InfluxDBClient(
@@ -40,42 +66,68 @@ class InfluxQueries:
             org=self.influx_org
         )
 
+    def _now(self) -> datetime:
+        """Current UTC time, rounded to the cache's now bucket so repeated calls share keys."""
+        return self.cache.bucket_now()
+
+    def invalidate_cache(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        """Drop cached results overlapping [start, end) (all if omitted), e.g. after a backfill."""
+        return self.cache.invalidate(start, end)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the result cache."""
+        return self.cache.stats()
+
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """End-to-end latency of the composite queries."""
+        return self.latency.snapshot()
+
+    @contextmanager
+    def _fan_out(self, name: str, parent: Optional[QueryFanout] = None):
+        """Fan-out for a composite; nested composites reuse the caller's (shared de-duplication)."""
+        if parent is not None:
+            yield parent
+            return
+        with QueryFanout(name, on_complete=self.latency.record) as fanout:
+            yield fanout
+
+    def _cached(
+        self, name: str, compute, start: datetime, end: datetime,
+        settle_seconds: Optional[float] = None, **params
+    ):
+        """Run compute() through the result cache, keyed on name, window and params."""
+        key = cache_key(name, start=start, end=end, **params)
+        return self.cache.get_or_compute(key, compute, window=(start, end), settle_seconds=settle_seconds)
+
     def query_consumption_for_period(
         self, start: datetime, end: datetime
     ) -> Dict[str, float]:
         """Query total energy consumption (kWh) per device for a time period."""
-        start_str = start.strftime("%Y-%m-%dT%H:%M:%SZ")
-        end_str = end.strftime("%Y-%m-%dT%H:%M:%SZ")
+        try:
+            return self._cached(
+                "consumption", lambda: self._fetch_consumption(start, end), start, end
+            )
+        except Exception as e:
+            logger.error(f"Failed to query consumption data: {e}")
+            return {}
+
+    def _fetch_consumption(self, start: datetime, end: datetime) -> Dict[str, float]:
         hours = (end - start).total_seconds() / 3600
 
-        query = f'''
-        from(bucket: "{self.power_bucket}")
-            |> range(start: {start_str}, stop: {end_str})
-            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
-            |> filter(fn: (r) => r["_field"] == "power")
-            |> group(columns: ["device"])
-            |> mean()
-        '''
+        with self._get_client() as client:
+            mean_powers = mean_power(self.planner.device_moments(client, start, end))
 
         consumption = {}
-        try:
-            with self._get_client() as client:
-                tables = client.query_api().query(query)
-                for table in tables:
-                    for record in table.records:
-                        device = record.values.get("device", "unknown")
-                        mean_power = record.get_value() or 0
-                        kwh = (mean_power * hours) / 1000
-                        if device not in self.exclude_devices:
-                            consumption[device] = round(kwh, 3)
-        except Exception as e:
-            logger.error(f"Failed to query consumption data: {e}")
+        for device, power in mean_powers.items():
+            kwh = (power * hours) / 1000
+            if device not in self.exclude_devices:
+                consumption[device] = round(kwh, 3)
 
         return consumption
 
     def query_today_consumption(self) -> Dict[str, float]:
         """Get today's consumption so far."""
-        now = datetime.utcnow()
+        now = self._now()
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         return self.query_consumption_for_period(today_start, now)
 
@@ -85,66 +137,69 @@ class InfluxQueries:
 
         Returns dict mapping event_type to {count, total_duration_seconds, total_energy_wh}.
         """
+        now = self._now()
         results: Dict[str, Dict[str, Any]] = {}
+        try:
+            for event_type, (count, total_duration, total_energy) in \
+                    self._query_event_totals(now - timedelta(days=days), now).items():
+                results[event_type] = {
+                    "count": count,
+                    "total_duration_seconds": total_duration,
+                    "total_energy_wh": total_energy
+                }
+        except Exception as e:
+            logger.error(f"Failed to query events: {e}")
 
-        # Query duration
-        duration_query = f'''
-        from(bucket: "{self.events_bucket}")
-            |> range(start: -{days}d)
-            |> filter(fn: (r) => r["_measurement"] == "event")
-            |> filter(fn: (r) => r["_field"] == "duration_seconds")
-            |> group(columns: ["event_type"])
-        '''
+        return results
 
-        # Query energy
-        energy_query = f'''
+    def _query_event_totals(
+        self, start: datetime, end: datetime, extra_filter: str = ""
+    ) -> Dict[str, Tuple[int, float, float]]:
+        """
+        Count events and sum duration/energy per event type (one streamed query, cached).
+
+        Args:
+            start: Range start (naive UTC)
+            end: Range end (naive UTC)
+            extra_filter: Optional additional Flux filter line
+
+        Returns:
+            Dict mapping event_type to (count, total_duration_seconds, total_energy_wh)
+        """
+        return self._cached(
+            "event_totals", lambda: self._fetch_event_totals(start, end, extra_filter),
+            start, end, settle_seconds=EVENT_SETTLE_SECONDS, extra_filter=extra_filter
+        )
+
+    def _fetch_event_totals(
+        self, start: datetime, end: datetime, extra_filter: str
+    ) -> Dict[str, Tuple[int, float, float]]:
+        query = f'''
         from(bucket: "{self.events_bucket}")
-            |> range(start: -{days}d)
+            |> range(start: {start.strftime("%Y-%m-%dT%H:%M:%SZ")}, stop: {end.strftime("%Y-%m-%dT%H:%M:%SZ")})
             |> filter(fn: (r) => r["_measurement"] == "event")
-            |> filter(fn: (r) => r["_field"] == "energy_wh")
-            |> group(columns: ["event_type"])
+            |> filter(fn: (r) => r["_field"] == "duration_seconds" or r["_field"] == "energy_wh")
+            {extra_filter}
+            |> keep(columns: ["event_type", "_field", "_value"])
+            |> toFloat()
         '''
 
-        try:
-            with self._get_client() as client:
-                query_api = client.query_api()
-
-                # Process duration data
-                tables = query_api.query(duration_query)
-                for table in tables:
-                    event_type = None
-                    count = 0
-                    total_duration = 0.0
-                    for record in table.records:
-                        event_type = record.values.get("event_type")
-                        count += 1
-                        total_duration += record.get_value() or 0
-                    if event_type:
-                        results[event_type] = {
-                            "count": count,
-                            "total_duration_seconds": total_duration,
-                            "total_energy_wh": 0.0
-                        }
-
-                # Process energy data
-                tables = query_api.query(energy_query)
-                for table in tables:
-                    event_type = None
-                    total_energy = 0.0
-                    for record in table.records:
-                        event_type = record.values.get("event_type")
-                        total_energy += record.get_value() or 0
-                    if event_type and event_type in results:
-                        results[event_type]["total_energy_wh"] = total_energy
+        with self._get_client() as client:
+            frame = read_frame(client, query, ["event_type", "_field", "_value"], {"_value": "float64"})
 
-        except Exception as e:
-            logger.error(f"Failed to query events: {e}")
+        frame = frame[frame["event_type"].notna() & (frame["event_type"] != "")]
+        durations = frame[frame["_field"] == "duration_seconds"] \
+            .groupby("event_type")["_value"].agg(["count", "sum"])
+        energy = frame[frame["_field"] == "energy_wh"].groupby("event_type")["_value"].sum()
 
-        return results
+        return {
+            event_type: (int(row["count"]), float(row["sum"]), float(energy.get(event_type, 0.0)))
+            for event_type, row in durations.iterrows()
+        }
 
     def query_top_devices(self, days: int = 1) -> List[Dict[str, Any]]:
         """Query top power consumers for a period, sorted by kWh descending."""
-        now = datetime.utcnow()
+        now = self._now()
         start = now - timedelta(days=days)
         consumption = self.query_consumption_for_period(start, now)
 
@@ -163,30 +218,26 @@ class InfluxQueries:
 
     def query_solar_summary(self) -> Dict[str, Any]:
         """Query solar generation data from power_consumption bucket."""
-        now = datetime.utcnow()
+        now = self._now()
+        try:
+            return self._cached(
+                "solar_summary", lambda: self._fetch_solar_summary(now), now - timedelta(days=7), now
+            )
+        except Exception as e:
+            logger.error(f"Failed to query solar data: {e}")
+            return {
+                "today_kwh": 0.0,
+                "today_savings": 0.0,
+                "week_kwh": 0.0,
+                "week_savings": 0.0
+            }
+
+    def _fetch_solar_summary(self, now: datetime) -> Dict[str, Any]:
         today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
         hours_today = (now - today_start).total_seconds() / 3600
 
-        # Today's solar (from power_consumption, device=solar)
-        query_today = f'''
-        from(bucket: "{self.power_bucket}")
-            |> range(start: {today_start.strftime("%Y-%m-%dT%H:%M:%SZ")}, stop: {now.strftime("%Y-%m-%dT%H:%M:%SZ")})
-            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
-            |> filter(fn: (r) => r["_field"] == "power")
-            |> filter(fn: (r) => r["device"] == "solar")
-            |> mean()
-        '''
-
-        # Last 7 days solar
         week_start = now - timedelta(days=7)
-        query_week = f'''
-        from(bucket: "{self.power_bucket}")
-            |> range(start: {week_start.strftime("%Y-%m-%dT%H:%M:%SZ")}, stop: {now.strftime("%Y-%m-%dT%H:%M:%SZ")})
-            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
-            |> filter(fn: (r) => r["_field"] == "power")
-            |> filter(fn: (r) => r["device"] == "solar")
-            |> mean()
-        '''
+        solar_filter = '|> filter(fn: (r) => r["device"] == "solar")'
 
         result = {
             "today_kwh": 0.0,
@@ -195,35 +246,33 @@ class InfluxQueries:
             "week_savings": 0.0
         }
 
-        try:
-            with self._get_client() as client:
-                query_api = client.query_api()
-
-                tables = query_api.query(query_today)
-                for table in tables:
-                    for record in table.records:
-                        mean_power = record.get_value() or 0
-                        kwh = (mean_power * hours_today) / 1000
-                        result["today_kwh"] = round(kwh, 3)
-                        result["today_savings"] = round(kwh * self.cost_per_kwh, 2)
-
-                hours_week = (now - week_start).total_seconds() / 3600
-                tables = query_api.query(query_week)
-                for table in tables:
-                    for record in table.records:
-                        mean_power = record.get_value() or 0
-                        kwh = (mean_power * hours_week) / 1000
-                        result["week_kwh"] = round(kwh, 3)
-                        result["week_savings"] = round(kwh * self.cost_per_kwh, 2)
+        # Solar is recorded in power_consumption as device=solar
+        with self._get_client() as client:
+            today = mean_power(self.planner.device_moments(client, today_start, now, solar_filter))
+            week = mean_power(self.planner.device_moments(client, week_start, now, solar_filter))
 
-        except Exception as e:
-            logger.error(f"Failed to query solar data: {e}")
+        if "solar" in today:
+            kwh = (today["solar"] * hours_today) / 1000
+            result["today_kwh"] = round(kwh, 3)
+            result["today_savings"] = round(kwh * self.cost_per_kwh, 2)
+
+        if "solar" in week:
+            hours_week = (now - week_start).total_seconds() / 3600
+            kwh = (week["solar"] * hours_week) / 1000
+            result["week_kwh"] = round(kwh, 3)
+            result["week_savings"] = round(kwh * self.cost_per_kwh, 2)
 
         return result
 
-    def query_comparison(self, period: str = "week") -> Dict[str, Any]:
-        """Compare current period vs previous period."""
-        now = datetime.utcnow()
+    def query_comparison(self, period: str = "week", fanout: Optional[QueryFanout] = None) -> Dict[str, Any]:
+        """
+        Compare current period vs previous period.
+
+        Args:
+            period: "day", "week" or "month"
+            fanout: Fan-out of an enclosing composite to run the sub-queries on
+        """
+        now = self._now()
 
         if period == "day":
             current_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -242,8 +291,16 @@ class InfluxQueries:
             prev_start = current_start - timedelta(days=7)
             prev_end = current_start
 
-        current = self.query_consumption_for_period(current_start, now)
-        previous = self.query_consumption_for_period(prev_start, prev_end)
+        days_map = {"day": 1, "week": 7, "month": 30}
+        days = days_map.get(period, 7)
+
+        with self._fan_out("comparison", fanout) as queries:
+            current = queries.submit(self.query_consumption_for_period, current_start, now)
+            previous = queries.submit(self.query_consumption_for_period, prev_start, prev_end)
+            current_events = queries.submit(self.query_events, days)
+            previous_events = queries.submit(self.query_events, days * 2)
+            current, previous = current.result(), previous.result()
+            current_events, previous_events = current_events.result(), previous_events.result()
 
         current_total = sum(current.values())
         previous_total = sum(previous.values())
@@ -253,12 +310,6 @@ class InfluxQueries:
         else:
             change_pct = 0.0
 
-        # Current events
-        days_map = {"day": 1, "week": 7, "month": 30}
-        days = days_map.get(period, 7)
-        current_events = self.query_events(days)
-        previous_events = self.query_events(days * 2)
-
         return {
             "period": period,
             "current": {
@@ -283,12 +334,16 @@ class InfluxQueries:
 
         Returns a summary of recent data that can be passed to Claude API.
         """
-        today = self.query_today_consumption()
-        top_devices = self.query_top_devices(days=1)
-        events_today = self.query_events(1)
-        events_week = self.query_events(7)
-        solar = self.query_solar_summary()
-        comparison = self.query_comparison("week")
+        with self._fan_out("custom_context") as queries:
+            today = queries.submit(self.query_today_consumption)
+            top_devices = queries.submit(self.query_top_devices, days=1)
+            events_today = queries.submit(self.query_events, 1)
+            events_week = queries.submit(self.query_events, 7)
+            solar = queries.submit(self.query_solar_summary)
+            # Shares query_events(7) with events_week
+            comparison = self.query_comparison("week", fanout=queries)
+            today, top_devices = today.result(), top_devices.result()
+            events_today, events_week, solar = events_today.result(), events_week.result(), solar.result()
 
         return {
             "question": question,
@@ -309,7 +364,7 @@ class InfluxQueries:
     def query_device_consumption(
         self, device: Optional[str] = None,
         start: Optional[str] = None, end: Optional[str] = None,
-        days: Optional[int] = None
+        days: Optional[int] = None, fanout: Optional[QueryFanout] = None
     ) -> Dict[str, Any]:
         """
         Query consumption for a specific device or all devices over a flexible time range.
@@ -319,8 +374,9 @@ class InfluxQueries:
             start: ISO date/datetime string for range start
             end: ISO date/datetime string for range end (default: now)
             days: Alternative to start/end - number of days back from now
+            fanout: Caller's fan-out to share the consumption query with (tool batches)
         """
-        now = datetime.utcnow()
+        now = self._now()
 
         if days is not None:
             dt_start = now - timedelta(days=days)
@@ -332,7 +388,10 @@ class InfluxQueries:
             dt_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
             dt_end = now
 
-        consumption = self.query_consumption_for_period(dt_start, dt_end)
+        if fanout is not None:
+            consumption = fanout.submit(self.query_consumption_for_period, dt_start, dt_end).result()
+        else:
+            consumption = self.query_consumption_for_period(dt_start, dt_end)
 
         if device:
             device_lower = device.lower()
@@ -370,44 +429,26 @@ class InfluxQueries:
                 hour=0, minute=0, second=0, microsecond=0
             )
         else:
-            day_start = datetime.utcnow().replace(
+            day_start = self._now().replace(
                 hour=0, minute=0, second=0, microsecond=0
             )
 
-        now = datetime.utcnow()
+        now = self._now()
         day_end = min(
             day_start.replace(hour=23, minute=59, second=59),
             now
         )
 
-        start_str = day_start.strftime("%Y-%m-%dT%H:%M:%SZ")
-        stop_str = day_end.strftime("%Y-%m-%dT%H:%M:%SZ")
-
         device_filter = ""
         if device:
             device_filter = f'|> filter(fn: (r) => r["device"] =~ /(?i){device}/)'
 
-        query = f'''
-        from(bucket: "{self.power_bucket}")
-            |> range(start: {start_str}, stop: {stop_str})
-            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
-            |> filter(fn: (r) => r["_field"] == "power")
-            {device_filter}
-            |> aggregateWindow(every: 1h, fn: mean, createEmpty: true)
-            |> group(columns: ["_time"])
-            |> sum()
-        '''
-
-        hourly = {}
+        hourly: Dict[str, float] = {}
         try:
-            with self._get_client() as client:
-                tables = client.query_api().query(query)
-                for table in tables:
-                    for record in table.records:
-                        hour = record.get_time().strftime("%H:00")
-                        mean_power = record.get_value() or 0
-                        kwh = mean_power / 1000  # 1h window
-                        hourly[hour] = round(kwh, 3)
+            hourly = self._cached(
+                "hourly", lambda: self._fetch_hourly(day_start, day_end, device_filter),
+                day_start, day_end, device_filter=device_filter
+            )
         except Exception as e:
             logger.error(f"Failed to query hourly consumption: {e}")
 
@@ -424,6 +465,28 @@ class InfluxQueries:
             "hourly_kwh": hourly
         }
 
+    def _fetch_hourly(self, day_start: datetime, day_end: datetime, device_filter: str) -> Dict[str, float]:
+        with self._get_client() as client:
+            moments = self.planner.hourly_moments(client, day_start, day_end, device_filter).reset_index()
+
+        hourly = {}
+        if moments.empty:
+            return hourly
+
+        # Sum of the per-device mean power of every hour = kWh of that 1h window
+        moments = moments[moments["samples"] > 0]
+        sums = (moments["power_sum"] / moments["samples"]).groupby(moments["_time"]).sum()
+
+        # Labelled like aggregateWindow: window stop, truncated to the range stop
+        range_end = pd.Timestamp(day_end, tz="UTC")
+        window_start = pd.Timestamp(day_start, tz="UTC").floor("h")
+        while window_start < range_end:
+            label = min(window_start + pd.Timedelta(hours=1), range_end)
+            hourly[label.strftime("%H:00")] = round(float(sums.get(window_start, 0.0)) / 1000, 3)
+            window_start += pd.Timedelta(hours=1)
+
+        return hourly
+
     def query_device_events_flexible(
         self, device: Optional[str] = None, days: int = 7,
         start: Optional[str] = None, end: Optional[str] = None
@@ -439,72 +502,28 @@ class InfluxQueries:
         """
         if start:
             dt_start = self._parse_datetime(start)
-            dt_end = self._parse_datetime(end, end_of_day=True) if end else datetime.utcnow()
-            range_str = f"start: {dt_start.strftime('%Y-%m-%dT%H:%M:%SZ')}, stop: {dt_end.strftime('%Y-%m-%dT%H:%M:%SZ')}"
+            dt_end = self._parse_datetime(end, end_of_day=True) if end else self._now()
             period_label = f"{dt_start.strftime('%Y-%m-%d')} to {dt_end.strftime('%Y-%m-%d')}"
         else:
-            range_str = f"start: -{days}d"
-            dt_start = datetime.utcnow() - timedelta(days=days)
-            dt_end = datetime.utcnow()
+            dt_end = self._now()
+            dt_start = dt_end - timedelta(days=days)
             period_label = f"last {days} days"
 
         device_filter = ""
         if device:
             device_filter = f'|> filter(fn: (r) => r["event_type"] =~ /(?i){device}/)'
 
-        duration_query = f'''
-        from(bucket: "{self.events_bucket}")
-            |> range({range_str})
-            |> filter(fn: (r) => r["_measurement"] == "event")
-            |> filter(fn: (r) => r["_field"] == "duration_seconds")
-            {device_filter}
-            |> group(columns: ["event_type"])
-        '''
-
-        energy_query = f'''
-        from(bucket: "{self.events_bucket}")
-            |> range({range_str})
-            |> filter(fn: (r) => r["_measurement"] == "event")
-            |> filter(fn: (r) => r["_field"] == "energy_wh")
-            {device_filter}
-            |> group(columns: ["event_type"])
-        '''
-
         results: Dict[str, Dict[str, Any]] = {}
         try:
-            with self._get_client() as client:
-                query_api = client.query_api()
-
-                tables = query_api.query(duration_query)
-                for table in tables:
-                    event_type = None
-                    count = 0
-                    total_duration = 0.0
-                    for record in table.records:
-                        event_type = record.values.get("event_type")
-                        count += 1
-                        total_duration += record.get_value() or 0
-                    if event_type:
-                        results[event_type] = {
-                            "count": count,
-                            "total_duration_minutes": round(total_duration / 60, 1),
-                            "avg_duration_minutes": round(total_duration / 60 / count, 1) if count > 0 else 0,
-                            "total_energy_wh": 0.0,
-                            "cost_eur": 0.0
-                        }
-
-                tables = query_api.query(energy_query)
-                for table in tables:
-                    event_type = None
-                    total_energy = 0.0
-                    for record in table.records:
-                        event_type = record.values.get("event_type")
-                        total_energy += record.get_value() or 0
-                    if event_type and event_type in results:
-                        results[event_type]["total_energy_wh"] = round(total_energy, 1)
-                        results[event_type]["cost_eur"] = round(
-                            (total_energy / 1000) * self.cost_per_kwh, 2
-                        )
+            for event_type, (count, total_duration, total_energy) in \
+                    self._query_event_totals(dt_start, dt_end, device_filter).items():
+                results[event_type] = {
+                    "count": count,
+                    "total_duration_minutes": round(total_duration / 60, 1),
+                    "avg_duration_minutes": round(total_duration / 60 / count, 1) if count > 0 else 0,
+                    "total_energy_wh": round(total_energy, 1),
+                    "cost_eur": round((total_energy / 1000) * self.cost_per_kwh, 2)
+                }
         except Exception as e:
             logger.error(f"Failed to query device events: {e}")
 
@@ -519,7 +538,7 @@ class InfluxQueries:
     def query_compare_periods(
         self, period_a_start: str, period_a_end: str,
         period_b_start: str, period_b_end: str,
-        device: Optional[str] = None
+        device: Optional[str] = None, fanout: Optional[QueryFanout] = None
     ) -> Dict[str, Any]:
         """
         Compare two arbitrary time periods.
@@ -528,14 +547,17 @@ class InfluxQueries:
             period_a_start/end: ISO date strings for period A
             period_b_start/end: ISO date strings for period B
             device: Optional device filter
+            fanout: Caller's fan-out to share the consumption queries with (tool batches)
         """
         a_start = self._parse_datetime(period_a_start)
         a_end = self._parse_datetime(period_a_end, end_of_day=True)
         b_start = self._parse_datetime(period_b_start)
         b_end = self._parse_datetime(period_b_end, end_of_day=True)
 
-        consumption_a = self.query_consumption_for_period(a_start, a_end)
-        consumption_b = self.query_consumption_for_period(b_start, b_end)
+        with self._fan_out("compare_periods", fanout) as queries:
+            consumption_a = queries.submit(self.query_consumption_for_period, a_start, a_end)
+            consumption_b = queries.submit(self.query_consumption_for_period, b_start, b_end)
+            consumption_a, consumption_b = consumption_a.result(), consumption_b.result()
 
         if device:
             device_lower = device.lower()
@@ -580,7 +602,7 @@ class InfluxQueries:
             end: ISO date string for range end
             days: Alternative - number of days back from now
         """
-        now = datetime.utcnow()
+        now = self._now()
 
         if days is not None:
             dt_start = now - timedelta(days=days)
@@ -592,28 +614,11 @@ class InfluxQueries:
             dt_start = now - timedelta(days=7)
             dt_end = now
 
-        start_str = dt_start.strftime("%Y-%m-%dT%H:%M:%SZ")
-        stop_str = dt_end.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        query = f'''
-        from(bucket: "{self.power_bucket}")
-            |> range(start: {start_str}, stop: {stop_str})
-            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
-            |> filter(fn: (r) => r["_field"] == "power")
-            |> filter(fn: (r) => r["device"] == "solar")
-            |> aggregateWindow(every: 1d, fn: mean, createEmpty: true)
-        '''
-
-        daily = {}
+        daily: Dict[str, float] = {}
         try:
-            with self._get_client() as client:
-                tables = client.query_api().query(query)
-                for table in tables:
-                    for record in table.records:
-                        day = record.get_time().strftime("%Y-%m-%d")
-                        mean_power = record.get_value() or 0
-                        kwh = (mean_power * 24) / 1000
-                        daily[day] = round(kwh, 3)
+            daily = self._cached(
+                "solar_history", lambda: self._fetch_solar_history(dt_start, dt_end), dt_start, dt_end
+            )
         except Exception as e:
             logger.error(f"Failed to query solar history: {e}")
 
@@ -632,6 +637,112 @@ class InfluxQueries:
             "daily_kwh": daily
         }
 
+    def _fetch_solar_history(self, dt_start: datetime, dt_end: datetime) -> Dict[str, float]:
+        start_str = dt_start.strftime("%Y-%m-%dT%H:%M:%SZ")
+        stop_str = dt_end.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        query = f'''
+        from(bucket: "{self.power_bucket}")
+            |> range(start: {start_str}, stop: {stop_str})
+            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
+            |> filter(fn: (r) => r["_field"] == "power")
+            |> filter(fn: (r) => r["device"] == "solar")
+            |> aggregateWindow(every: 1d, fn: mean, createEmpty: true)
+            |> keep(columns: ["_time", "_value"])
+        '''
+
+        with self._get_client() as client:
+            frame = read_frame(client, query, ["_time", "_value"], {"_value": "float64"})
+
+        daily = {}
+        for timestamp, mean_power in zip(frame["_time"].dt.strftime("%Y-%m-%d"), frame["_value"].fillna(0)):
+            daily[timestamp] = round((mean_power * 24) / 1000, 3)
+        return daily
+
+    def query_tool_batch(self, calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run several tool queries concurrently and return their results in call order.
+
+        Identical calls run once. device_consumption and compare_periods share
+        one fan-out, so the same consumption period requested by several calls
+        is queried once (on top of the result cache).
+
+        Args:
+            calls: [{"tool": "device_consumption", "args": {"device": "cooler", "days": 7}}, ...]
+
+        Returns:
+            One entry per call: {"tool": ..., "result": ...} or {"tool": ..., "error": ...}
+        """
+        with self._fan_out("tool_batch") as shared, ThreadPoolExecutor(
+            max_workers=max(1, shared.max_workers), thread_name_prefix="tool-batch"
+        ) as tools:
+            calls_by_key: Dict[str, Future] = {}
+            pending = []
+            for call in calls:
+                tool, args = call.get("tool"), call.get("args") or {}
+                if tool not in BATCH_TOOLS or not isinstance(args, dict):
+                    pending.append((tool, f"Unknown tool '{tool}' or invalid args"))
+                    continue
+                kwargs = dict(args)
+                try:
+                    if kwargs.get("days") is not None:
+                        kwargs["days"] = int(kwargs["days"])
+                except (TypeError, ValueError):
+                    pending.append((tool, f"Invalid days '{kwargs['days']}'"))
+                    continue
+                key = json.dumps([tool, kwargs], sort_keys=True, default=str)
+                if key not in calls_by_key:
+                    method, shares_fanout = BATCH_TOOLS[tool]
+                    if shares_fanout:
+                        kwargs["fanout"] = shared
+                    calls_by_key[key] = tools.submit(getattr(self, method), **kwargs)
+                pending.append((tool, calls_by_key[key]))
+
+            results = []
+            for tool, outcome in pending:
+                if isinstance(outcome, str):
+                    results.append({"tool": tool, "error": outcome})
+                    continue
+                try:
+                    results.append({"tool": tool, "result": outcome.result()})
+                except (TypeError, ValueError) as e:
+                    results.append({"tool": tool, "error": str(e)})
+                except Exception as e:
+                    logger.error(f"Batch tool {tool} failed: {e}")
+                    results.append({"tool": tool, "error": "query failed"})
+
+        if len(calls_by_key) < len(calls):
+            logger.info(f"Tool batch: {len(calls)} calls, {len(calls_by_key)} executed")
+        return results
+
+    def query_latest_power(self, lookback_seconds: int = 120) -> Dict[str, Tuple[datetime, float]]:
+        """
+        Most recent power reading per device (uncached, for the live feed).
+
+        Args:
+            lookback_seconds: Only readings younger than this are returned
+
+        Returns:
+            Dict mapping device to (aware UTC time, watts)
+        """
+        query = f'''
+        from(bucket: "{self.power_bucket}")
+            |> range(start: -{int(lookback_seconds)}s)
+            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
+            |> filter(fn: (r) => r["_field"] == "power")
+            |> group(columns: ["device"])
+            |> last()
+            |> keep(columns: ["_time", "device", "_value"])
+            |> toFloat()
+        '''
+        with self._get_client() as client:
+            frame = read_frame(client, query, ["_time", "device", "_value"], {"_value": "float64"})
+        frame = frame.dropna(subset=["_time", "device", "_value"])
+        return {
+            str(device): (timestamp.to_pydatetime(), float(value))
+            for device, timestamp, value in zip(frame["device"], frame["_time"], frame["_value"])
+        }
+
     def list_devices(self) -> Dict[str, Any]:
         """List all monitored devices with their current status."""
         import json as json_mod
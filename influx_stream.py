@@ -0,0 +1,222 @@
+"""
+Streaming InfluxDB query decoding for MyTapo.
+
+`query_api().query()` materializes the whole FluxTable/FluxRecord object graph
+(one dict per row) before the caller sees the first value. For raw power
+history that means millions of Python objects. The helpers here request the
+result as plain CSV via `query_raw()` and let pandas' C parser decode the
+HTTP response in chunks straight into typed columns, so memory is bounded by
+the columns themselves.
+
+Queries should end with `keep(columns: [...])` (and `toFloat()` where value
+types may differ) so every table in the result shares one schema.
+
+Benchmark against the FluxRecord path:
+    python influx_stream.py --benchmark --device kaffe_bar --days 90
+"""
+
+import os
+import time
+import logging
+import tracemalloc
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from influxdb_client import Dialect, InfluxDBClient
+
+logger = logging.getLogger(__name__)
+
+# Plain CSV: one header row per table schema, no annotation rows
+CSV_DIALECT = Dialect(header=True, delimiter=",", annotations=[], date_time_format="RFC3339")
+
+DEFAULT_CHUNK_ROWS = 250_000
+
+
+def _decode_chunk(chunk: pd.DataFrame, columns: List[str], dtypes: Dict[str, str]) -> pd.DataFrame:
+    """Drop repeated header rows (table schema changes) and apply column types."""
+    text_columns = [
+        column for column in chunk.columns
+        if not pd.api.types.is_numeric_dtype(chunk[column])
+    ]
+    if text_columns:
+        header_rows = np.zeros(len(chunk), dtype=bool)
+        for column in text_columns:
+            header_rows |= (chunk[column] == column).to_numpy()
+        if header_rows.any():
+            chunk = chunk[~header_rows]
+
+    for column in columns:
+        if column not in chunk.columns:
+            chunk[column] = np.nan
+
+    for column, dtype in dtypes.items():
+        if chunk[column].dtype != dtype:
+            chunk[column] = pd.to_numeric(chunk[column], errors="coerce").astype(dtype)
+
+    # Parse per chunk so the RFC3339 strings never exist for the whole result
+    if "_time" in columns:
+        chunk["_time"] = pd.to_datetime(chunk["_time"], utc=True, format="ISO8601")
+
+    return chunk[columns]
+
+
+def iter_frames(
+    client: InfluxDBClient,
+    query: str,
+    columns: Iterable[str],
+    dtypes: Optional[Dict[str, str]] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    Run a Flux query and yield the streamed CSV result chunk by chunk.
+
+    Only one decoded chunk is held at a time, so memory stays constant
+    regardless of the result size. Closing the generator closes the HTTP
+    response.
+
+    Args:
+        client: InfluxDB client
+        query: Flux query (ideally ending with keep(columns: ...))
+        columns: Columns to return (missing ones are filled with NaN)
+        dtypes: Optional numeric dtypes per column (e.g. {"_value": "float64"})
+        chunk_rows: Rows decoded per parser chunk
+
+    Yields:
+        DataFrames with the requested columns; `_time` as datetime64[ns, UTC]
+
+    Raises:
+        RuntimeError: If InfluxDB reports a query error in the result stream
+    """
+    columns = list(columns)
+    dtypes = dict(dtypes or {})
+    wanted = set(columns) | {"error"}
+
+    response = client.query_api().query_raw(query, dialect=CSV_DIALECT)
+    try:
+        for chunk in pd.read_csv(
+            response,
+            usecols=lambda column: column in wanted,
+            chunksize=chunk_rows,
+            low_memory=False
+        ):
+            if "error" in chunk.columns and chunk["error"].notna().any():
+                raise RuntimeError(f"Flux query failed: {chunk['error'].dropna().iloc[0]}")
+            yield _decode_chunk(chunk, columns, dtypes)
+    except pd.errors.EmptyDataError:
+        pass
+    finally:
+        response.close()
+
+
+def read_frame(
+    client: InfluxDBClient,
+    query: str,
+    columns: Iterable[str],
+    dtypes: Optional[Dict[str, str]] = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> pd.DataFrame:
+    """
+    Run a Flux query and decode the streamed CSV result into a DataFrame.
+
+    Args:
+        client: InfluxDB client
+        query: Flux query (ideally ending with keep(columns: ...))
+        columns: Columns to return (missing ones are filled with NaN)
+        dtypes: Optional numeric dtypes per column (e.g. {"_value": "float64"})
+        chunk_rows: Rows decoded per parser chunk
+
+    Returns:
+        DataFrame with the requested columns; `_time` as datetime64[ns, UTC]
+
+    Raises:
+        RuntimeError: If InfluxDB reports a query error in the result stream
+    """
+    columns = list(columns)
+    dtypes = dict(dtypes or {})
+
+    frames = list(iter_frames(client, query, columns, dtypes, chunk_rows))
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+
+    frame = pd.DataFrame(columns=columns)
+    for column, dtype in dtypes.items():
+        frame[column] = frame[column].astype(dtype)
+    if "_time" in columns:
+        frame["_time"] = pd.to_datetime(frame["_time"], utc=True)
+    return frame
+
+
+def read_series(
+    client: InfluxDBClient,
+    query: str,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run a single-series query (`_time`, `_value`) and return NumPy arrays.
+
+    Returns:
+        Tuple of (int64 epoch seconds, float32 values), in result order
+    """
+    frame = read_frame(client, query, ["_time", "_value"], {"_value": "float64"}, chunk_rows)
+    frame = frame.dropna(subset=["_value"])
+    seconds = frame["_time"].to_numpy(dtype="datetime64[s]").astype(np.int64)
+    return seconds, frame["_value"].to_numpy(dtype=np.float32)
+
+
+def _benchmark(device: str, days: int):
+    """Compare FluxRecord materialization against streamed CSV decoding."""
+    load_dotenv()
+    url = f"http://{os.getenv('INFLUXDB_HOST', '192.168.178.114')}:{os.getenv('INFLUXDB_PORT', '8088')}"
+    bucket = os.getenv("INFLUXDB_BUCKET", "power_consumption")
+    query = f'''
+    from(bucket: "{bucket}")
+        |> range(start: -{days}d)
+        |> filter(fn: (r) => r["_measurement"] == "power_consumption")
+        |> filter(fn: (r) => r["_field"] == "power")
+        |> filter(fn: (r) => r["device"] == "{device}")
+        |> keep(columns: ["_time", "_value"])
+        |> toFloat()
+        |> sort(columns: ["_time"])
+    '''
+
+    def flux_records(client):
+        rows = []
+        for table in client.query_api().query(query):
+            for record in table.records:
+                rows.append((record.get_time(), record.get_value()))
+        return len(rows)
+
+    def streamed(client):
+        return len(read_series(client, query)[0])
+
+    with InfluxDBClient(url=url, token=os.getenv("INFLUXDB_TOKEN"), org="None") as client:
+        for name, run in (("FluxRecord query()", flux_records), ("streamed CSV", streamed)):
+            tracemalloc.start()
+            started = time.perf_counter()
+            rows = run(client)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:20s} {rows:>10,} rows  {elapsed:7.2f}s  peak {peak / 1e6:8.1f} MB")
+
+
+def main():
+    """Entry point (benchmark)."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Streaming Flux query helpers")
+    parser.add_argument("--benchmark", action="store_true", help="Compare against FluxRecord decoding")
+    parser.add_argument("--device", default="kaffe_bar", help="Device to fetch (default: kaffe_bar)")
+    parser.add_argument("--days", type=int, default=90, help="Days of raw data (default: 90)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args.device, args.days)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Live power feed for the report API.
+
+One upstream poller reads the latest reading per device from InfluxDB every
+`poll_seconds` while at least one client is subscribed, and fans the changed
+readings out to all subscribers. The number of InfluxDB queries does not
+depend on the number of subscribers.
+
+The feed keeps only the latest reading per device plus a version counter.
+Each subscriber remembers the last version it has seen and, when it is ready
+for the next message, receives every device that changed since (filtered to
+its devices). Slow or throttled subscribers therefore skip intermediate
+readings instead of queueing them, and memory per subscriber is constant.
+
+Usage:
+    feed = LiveFeed(queries)                      # AsyncInfluxQueries
+    with feed.subscribe(devices={"kaffe_bar"}, min_interval=10) as subscription:
+        while True:
+            readings = await subscription.next(timeout=15)   # [] on timeout
+    await feed.stop()
+"""
+
+import os
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Reading:
+    """Latest reading of one device."""
+    device: str
+    time: datetime
+    power: float
+    version: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"time": self.time.isoformat(), "power": round(self.power, 1)}
+
+
+class Subscription:
+    """One subscriber's view of the feed (device filter and throttle)."""
+
+    def __init__(self, feed: "LiveFeed", devices: Optional[Set[str]], min_interval: float):
+        self.feed = feed
+        self.devices = devices
+        self.min_interval = min_interval
+        self.seen = 0
+        self._last_sent = 0.0
+
+    def __enter__(self) -> "Subscription":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.feed.unsubscribe(self)
+        return False
+
+    def _pending(self) -> List[Reading]:
+        return [
+            reading for reading in self.feed.readings.values()
+            if reading.version > self.seen and (self.devices is None or reading.device in self.devices)
+        ]
+
+    async def next(self, timeout: Optional[float] = None) -> List[Reading]:
+        """
+        Wait for readings this subscriber has not seen yet.
+
+        The first call returns the current reading of every matching device.
+
+        Args:
+            timeout: Seconds to wait for new readings (None = forever)
+
+        Returns:
+            Changed readings, or an empty list on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # Throttle: never deliver more often than min_interval
+            delay = self._last_sent + self.min_interval - time.monotonic()
+            if delay > 0:
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+                    return []
+                await asyncio.sleep(delay)
+
+            readings = self._pending()
+            self.seen = self.feed.version
+            if readings:
+                self._last_sent = time.monotonic()
+                self.feed.delivered += 1
+                return readings
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return []
+            if not await self.feed.wait_for_change(self.seen, remaining):
+                return []
+
+
+class LiveFeed:
+    """Single upstream poller with latest-value fan-out to subscribers."""
+
+    def __init__(self, queries, poll_seconds: Optional[float] = None, lookback_seconds: int = 120):
+        """
+        Initialize the feed.
+
+        Args:
+            queries: AsyncInfluxQueries used for the upstream query
+            poll_seconds: Upstream poll interval (env LIVE_POLL_SECONDS, default 5)
+            lookback_seconds: Readings older than this are not reported
+        """
+        self.queries = queries
+        self.poll_seconds = poll_seconds if poll_seconds is not None else \
+            float(os.getenv("LIVE_POLL_SECONDS", "5"))
+        self.lookback_seconds = lookback_seconds
+        self.readings: Dict[str, Reading] = {}
+        self.version = 0
+        self.polls = 0
+        self.poll_errors = 0
+        self.delivered = 0
+        self.last_poll_ms: Optional[float] = None
+        self._subscribers: Set[Subscription] = set()
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, devices: Optional[Set[str]] = None, min_interval: float = 0.0) -> Subscription:
+        """Register a subscriber and start polling if it is the first one."""
+        subscription = Subscription(self, devices, min_interval)
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+            logger.info("Live feed: polling started")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        # The poller notices the last subscriber leaving and stops
+        self._subscribers.discard(subscription)
+
+    async def wait_for_change(self, seen: int, timeout: Optional[float] = None) -> bool:
+        """Wait until the feed version exceeds seen; False on timeout."""
+        while self.version <= seen:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def publish(self, latest: Dict[str, tuple]) -> int:
+        """
+        Store readings that are newer than the known ones and wake subscribers.
+
+        Args:
+            latest: Dict mapping device to (time, watts)
+
+        Returns:
+            Number of changed devices
+        """
+        changed = 0
+        for device, (timestamp, power) in latest.items():
+            current = self.readings.get(device)
+            if current is None or timestamp > current.time:
+                self.version += 1
+                self.readings[device] = Reading(device, timestamp, power, self.version)
+                changed += 1
+        if changed:
+            # Replace the event so later waiters block until the next change
+            event, self._changed = self._changed, asyncio.Event()
+            event.set()
+        return changed
+
+    async def poll_once(self) -> int:
+        started = time.perf_counter()
+        latest = await self.queries.query_latest_power(self.lookback_seconds)
+        self.polls += 1
+        self.last_poll_ms = round((time.perf_counter() - started) * 1000, 1)
+        return self.publish(latest)
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                await self.poll_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.poll_errors += 1
+                logger.error(f"Live feed poll failed: {e}")
+            await asyncio.sleep(self.poll_seconds)
+        logger.info("Live feed: no subscribers, polling stopped")
+
+    async def stop(self):
+        """Stop polling (on app shutdown)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for metrics endpoints."""
+        return {
+            "subscribers": len(self._subscribers),
+            "polling": self._task is not None and not self._task.done(),
+            "poll_seconds": self.poll_seconds,
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+            "last_poll_ms": self.last_poll_ms,
+            "devices": len(self.readings),
+            "messages_delivered": self.delivered
+        }
@@ -0,0 +1,289 @@
+"""
+Local Parquet mirror of raw power history for MyTapo batch tools.
+
+The backfiller and the solarbank optimizer repeatedly need months of raw 15s
+samples. Instead of re-downloading them from InfluxDB on every run, this
+module keeps a day-partitioned Parquet copy of the power_consumption bucket:
+
+    <mirror>/day=2026-10-01/part.parquet   (device, time, power)
+
+`device` is dictionary-encoded, `time` is timestamp[ns, UTC] and `power` is
+float32; rows are sorted by device and time so row-group statistics let the
+reader skip data. Only closed (past) UTC days are mirrored. Sync is
+incremental: it fetches the days that are not mirrored yet plus the most
+recent `refresh_days` days (to pick up late samples).
+
+Usage:
+    python power_mirror.py sync --days 365
+    python power_mirror.py info
+"""
+
+import os
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from influxdb_client import InfluxDBClient
+
+from influx_stream import read_frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIRROR_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "data",
+    "power_mirror"
+)
+
+SCHEMA = pa.schema([
+    ("device", pa.dictionary(pa.int32(), pa.string())),
+    ("time", pa.timestamp("ns", tz="UTC")),
+    ("power", pa.float32()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+
+
+def _utc(timestamp: datetime) -> datetime:
+    """Treat naive datetimes as UTC."""
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+class PowerMirror:
+    """
+    Day-partitioned Parquet copy of the power_consumption bucket.
+
+    Usage:
+        mirror = PowerMirror()
+        mirror.sync(client_factory, "power_consumption", days=365)
+
+        frame = mirror.read(start, end, devices=["kaffe_bar"])
+        timestamps, powers = mirror.read_arrays("kaffe_bar", start, end)
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Initialize the mirror.
+
+        Args:
+            root: Mirror directory (defaults to env POWER_MIRROR_DIR)
+        """
+        self.root = root or os.getenv("POWER_MIRROR_DIR", DEFAULT_MIRROR_DIR)
+
+    def _partition_path(self, day: date) -> str:
+        return os.path.join(self.root, f"day={day.isoformat()}", "part.parquet")
+
+    def mirrored_days(self) -> Set[date]:
+        """Days that have a partition file."""
+        days: Set[date] = set()
+        if not os.path.isdir(self.root):
+            return days
+        for entry in os.listdir(self.root):
+            if entry.startswith("day=") and os.path.exists(os.path.join(self.root, entry, "part.parquet")):
+                try:
+                    days.add(date.fromisoformat(entry[4:]))
+                except ValueError:
+                    continue
+        return days
+
+    def covered_until(self, start: datetime, end: datetime) -> datetime:
+        """
+        End of the mirrored part of [start, end) that begins at start.
+
+        Returns start if the first day is not mirrored, end if all days are.
+        """
+        start, end = _utc(start), _utc(end)
+        days = self.mirrored_days()
+        day = start.date()
+        while _day_start(day) < end and day in days:
+            day += timedelta(days=1)
+        return min(max(_day_start(day), start), end)
+
+    def sync(
+        self,
+        client_factory: Callable[[], InfluxDBClient],
+        bucket: str,
+        days: int = 365,
+        refresh_days: int = 1
+    ) -> int:
+        """
+        Mirror all closed days of the last N days that are missing locally.
+
+        Args:
+            client_factory: Callable returning a new InfluxDBClient
+            bucket: Source bucket (power_consumption)
+            days: How far back to mirror
+            refresh_days: Most recent closed days fetched again for late samples
+
+        Returns:
+            Number of day partitions written
+        """
+        today = datetime.now(timezone.utc).date()
+        wanted = [today - timedelta(days=offset) for offset in range(days, 0, -1)]
+        existing = self.mirrored_days()
+        refresh = {today - timedelta(days=offset) for offset in range(1, refresh_days + 1)}
+        missing = [day for day in wanted if day not in existing or day in refresh]
+
+        logger.info(f"Power mirror: {len(existing)} days mirrored, syncing {len(missing)} days")
+
+        written = 0
+        with client_factory() as client:
+            for day in missing:
+                try:
+                    table = self._fetch_day(client, bucket, day)
+                except Exception as e:
+                    logger.error(f"Failed to fetch {day} for power mirror: {e}")
+                    continue
+                self._write_day(day, table)
+                written += 1
+                logger.info(f"  {day}: {table.num_rows:,} samples")
+
+        return written
+
+    def _fetch_day(self, client: InfluxDBClient, bucket: str, day: date) -> pa.Table:
+        """Fetch one UTC day of raw power samples for all devices."""
+        start = _day_start(day)
+        stop = start + timedelta(days=1)
+        query = f'''
+        from(bucket: "{bucket}")
+            |> range(start: {start.strftime("%Y-%m-%dT%H:%M:%SZ")}, stop: {stop.strftime("%Y-%m-%dT%H:%M:%SZ")})
+            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
+            |> filter(fn: (r) => r["_field"] == "power")
+            |> keep(columns: ["_time", "device", "_value"])
+            |> toFloat()
+        '''
+        frame = read_frame(client, query, ["_time", "device", "_value"], {"_value": "float64"})
+        frame = frame.dropna(subset=["_time", "_value", "device"]) \
+            .sort_values(["device", "_time"], kind="stable")
+
+        return pa.table({
+            "device": pa.array(frame["device"].astype(str).to_numpy(), pa.string()).dictionary_encode(),
+            "time": pa.array(frame["_time"], pa.timestamp("ns", tz="UTC")),
+            "power": pa.array(frame["_value"].to_numpy(dtype=np.float32), pa.float32()),
+        }, schema=SCHEMA)
+
+    def _write_day(self, day: date, table: pa.Table):
+        """Atomically write a day partition (empty days are written too)."""
+        path = self._partition_path(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+
+    def read(
+        self,
+        start: datetime,
+        end: datetime,
+        devices: Optional[Iterable[str]] = None,
+        columns: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Read mirrored samples in [start, end), sorted by device and time.
+
+        Partition, device and time predicates are pushed down into the
+        Parquet scan, so only the matching days and row groups are read.
+
+        Args:
+            start: Range start (naive = UTC)
+            end: Range end, exclusive (naive = UTC)
+            devices: Optional device names to include
+            columns: Columns to return (default: device, time, power)
+
+        Returns:
+            DataFrame with the requested columns
+        """
+        start, end = _utc(start), _utc(end)
+        columns = columns or ["device", "time", "power"]
+
+        if not os.path.isdir(self.root):
+            return SCHEMA.empty_table().select(columns).to_pandas()
+
+        dataset = ds.dataset(
+            self.root,
+            format="parquet",
+            schema=SCHEMA.append(pa.field("day", pa.string())),
+            partitioning=PARTITIONING
+        )
+        time_type = SCHEMA.field("time").type
+        predicate = (
+            (ds.field("day") >= start.date().isoformat())
+            & (ds.field("day") <= end.date().isoformat())
+            & (ds.field("time") >= pa.scalar(start, type=time_type))
+            & (ds.field("time") < pa.scalar(end, type=time_type))
+        )
+        if devices is not None:
+            predicate &= ds.field("device").isin(list(devices))
+
+        frame = dataset.to_table(columns=columns, filter=predicate).to_pandas()
+        sort_keys = [name for name in ("device", "time") if name in columns]
+        if sort_keys:
+            # Partitions are already sorted, this only merges the days
+            frame = frame.sort_values(sort_keys, kind="stable", ignore_index=True)
+        return frame
+
+    def read_arrays(self, device: str, start: datetime, end: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Read one device's samples as kernel arrays.
+
+        Returns:
+            Tuple of (int64 epoch seconds, float32 watts), time-ordered
+        """
+        frame = self.read(start, end, devices=[device], columns=["time", "power"])
+        seconds = frame["time"].to_numpy(dtype="datetime64[s]").astype(np.int64)
+        return seconds, frame["power"].to_numpy(dtype=np.float32)
+
+
+def main():
+    """Entry point."""
+    import argparse
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Parquet mirror of the power_consumption bucket")
+    parser.add_argument("command", choices=["sync", "info"], help="sync: fetch missing days, info: show coverage")
+    parser.add_argument("--days", type=int, default=365, help="Days to mirror (default: 365)")
+    parser.add_argument("--refresh-days", type=int, default=1,
+                        help="Most recent closed days re-fetched for late samples (default: 1)")
+    parser.add_argument("--dir", default=None, help="Mirror directory (default: env POWER_MIRROR_DIR)")
+    args = parser.parse_args()
+
+    mirror = PowerMirror(args.dir)
+
+    if args.command == "sync":
+        host = os.getenv("INFLUXDB_HOST", "192.168.178.114")
+        port = os.getenv("INFLUXDB_PORT", "8088")
+        bucket = os.getenv("INFLUXDB_BUCKET", "power_consumption")
+
+        def client_factory() -> InfluxDBClient:
+            return InfluxDBClient(url=f"http://{host}:{port}", token=os.getenv("INFLUXDB_TOKEN"), org="None")
+
+        written = mirror.sync(client_factory, bucket, days=args.days, refresh_days=args.refresh_days)
+        logger.info(f"Power mirror sync complete: {written} days written to {mirror.root}")
+    else:
+        days = sorted(mirror.mirrored_days())
+        if not days:
+            print(f"No days mirrored in {mirror.root}")
+            return
+        size = sum(
+            os.path.getsize(os.path.join(dirpath, name))
+            for dirpath, _, names in os.walk(mirror.root) for name in names
+        )
+        print(f"{mirror.root}: {len(days)} days ({days[0]} - {days[-1]}), {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+In-process result cache for MyTapo InfluxDB queries.
+
+Report API calls and AI-agent tool calls often ask for the same windows back
+to back (today's consumption, top devices of the last day, ...). Entries are
+keyed on the query name plus its normalized parameters and bounded by an LRU
+size limit. The TTL depends on the queried window:
+
+- closed windows (ending more than `settle_seconds` ago) cannot change any
+  more and are kept for `closed_ttl` seconds (default: 1 day)
+- windows touching "now" are kept for `open_ttl` seconds (default: 60s)
+
+Callers round "now" down to `now_bucket_seconds` (see `bucket_now()`), so
+"today so far" requests within the same bucket share one key.
+
+Backfills rewrite past windows; `invalidate()` drops the affected entries
+(exposed as POST /admin/cache/invalidate by the report API).
+"""
+
+import os
+import copy
+import time
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _naive_utc(timestamp: datetime) -> datetime:
+    """InfluxQueries works with naive UTC datetimes; normalize aware ones."""
+    if timestamp.tzinfo:
+        return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+def _normalize(value: Any) -> Hashable:
+    """
+    Turn a query parameter into a hashable, canonical key component.
+
+    Strings are only stripped: device names and Flux filter literals are
+    case-sensitive in InfluxDB. Callers fold the case of parameters that are
+    case-insensitive (e.g. a period name) before building the key.
+    """
+    if isinstance(value, datetime):
+        return _naive_utc(value).isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_normalize(item) for item in value)
+    return value
+
+
+def cache_key(name: str, **params: Any) -> Tuple:
+    """Build a cache key from the query name and its parameters (order-insensitive)."""
+    return (name,) + tuple(sorted((key, _normalize(value)) for key, value in params.items()))
+
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    window: Optional[Tuple[datetime, datetime]]
+
+
+class QueryCache:
+    """
+    Thread-safe LRU + TTL cache for query results.
+
+    Usage:
+        cache = QueryCache()
+        now = cache.bucket_now()
+        key = cache_key("consumption", start=start, end=now)
+        result = cache.get_or_compute(key, lambda: fetch(start, now), window=(start, now))
+
+        cache.invalidate(start, end)   # after a backfill rewrote [start, end)
+        cache.stats()                  # hit/miss counters for /metrics
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        open_ttl: Optional[float] = None,
+        closed_ttl: Optional[float] = None,
+        now_bucket_seconds: Optional[int] = None,
+        settle_seconds: float = 300
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: LRU size bound (env QUERY_CACHE_SIZE, default 512; 0 disables caching)
+            open_ttl: TTL of windows touching now (env QUERY_CACHE_OPEN_TTL, default 60s)
+            closed_ttl: TTL of closed past windows (env QUERY_CACHE_CLOSED_TTL, default 86400s)
+            now_bucket_seconds: Granularity of "now" (env QUERY_CACHE_NOW_BUCKET, default 60s)
+            settle_seconds: Default time after which a window end counts as closed
+        """
+        self.max_entries = max_entries if max_entries is not None else \
+            int(os.getenv("QUERY_CACHE_SIZE", "512"))
+        self.open_ttl = open_ttl if open_ttl is not None else \
+            float(os.getenv("QUERY_CACHE_OPEN_TTL", "60"))
+        self.closed_ttl = closed_ttl if closed_ttl is not None else \
+            float(os.getenv("QUERY_CACHE_CLOSED_TTL", "86400"))
+        self.now_bucket_seconds = now_bucket_seconds if now_bucket_seconds is not None else \
+            int(os.getenv("QUERY_CACHE_NOW_BUCKET", "60"))
+        self.settle_seconds = settle_seconds
+
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def bucket_now(self) -> datetime:
+        """Current naive UTC time rounded down to the now bucket."""
+        now = datetime.now(timezone.utc)
+        bucket = max(1, self.now_bucket_seconds)
+        bucketed = int(now.timestamp()) // bucket * bucket
+        return datetime.fromtimestamp(bucketed, timezone.utc).replace(tzinfo=None)
+
+    def ttl_for(self, window_end: Optional[datetime], settle_seconds: Optional[float] = None) -> float:
+        """TTL of a result whose window ends at window_end (None = touches now)."""
+        if window_end is None:
+            return self.open_ttl
+        settle = self.settle_seconds if settle_seconds is None else settle_seconds
+        age = (datetime.now(timezone.utc).replace(tzinfo=None) - _naive_utc(window_end)).total_seconds()
+        return self.closed_ttl if age >= settle else self.open_ttl
+
+    def _count(self, name: str, counter: str):
+        stats = self._counters.setdefault(name, {"hits": 0, "misses": 0})
+        stats[counter] += 1
+
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        """
+        Look up a key.
+
+        Returns:
+            Tuple of (found, value); the value is a copy the caller may modify
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self._count(key[0], "misses")
+                return False, None
+            self._entries.move_to_end(key)
+            self._count(key[0], "hits")
+            value = entry.value
+        return True, copy.deepcopy(value)
+
+    def put(
+        self,
+        key: Tuple,
+        value: Any,
+        window: Optional[Tuple[datetime, datetime]] = None,
+        settle_seconds: Optional[float] = None
+    ):
+        """
+        Store a result.
+
+        Args:
+            key: Key from cache_key()
+            value: Result (stored as a private copy)
+            window: (start, end) of the queried time range, used for the TTL
+                and for invalidate(); None = treated as touching now
+            settle_seconds: Override of the closed-window grace period
+        """
+        if not self.enabled:
+            return
+        ttl = self.ttl_for(window[1] if window else None, settle_seconds)
+        entry = _Entry(
+            value=copy.deepcopy(value),
+            expires_at=time.monotonic() + ttl,
+            window=(_naive_utc(window[0]), _naive_utc(window[1])) if window else None
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(
+        self,
+        key: Tuple,
+        compute: Callable[[], Any],
+        window: Optional[Tuple[datetime, datetime]] = None,
+        settle_seconds: Optional[float] = None
+    ) -> Any:
+        """
+        Return the cached result or compute and store it.
+
+        Exceptions from compute propagate and nothing is cached, so failed
+        queries are retried on the next call.
+        """
+        if not self.enabled:
+            return compute()
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.put(key, value, window, settle_seconds)
+        return value
+
+    def invalidate(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> int:
+        """
+        Drop cached results overlapping [start, end) (everything if both are None).
+
+        Entries without a window are always dropped.
+
+        Returns:
+            Number of dropped entries
+        """
+        start = _naive_utc(start) if start else None
+        end = _naive_utc(end) if end else None
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry.window is None
+                or ((end is None or entry.window[0] < end) and (start is None or entry.window[1] > start))
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+        logger.info(f"Query cache: invalidated {len(stale)} entries "
+                    f"({start or 'begin'} - {end or 'now'})")
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters (total and per query) for metrics endpoints."""
+        with self._lock:
+            per_query = {name: dict(counts) for name, counts in self._counters.items()}
+            size = len(self._entries)
+        hits = sum(counts["hits"] for counts in per_query.values())
+        misses = sum(counts["misses"] for counts in per_query.values())
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "queries": per_query
+        }
@@ -0,0 +1,141 @@
+"""
+Bounded concurrent execution of report composites.
+
+Composite reports (AI context, period comparisons, weekly/monthly reports)
+consist of independent InfluxDB sub-queries. QueryFanout runs them on a small
+thread pool, runs identical sub-queries (same function and arguments) only
+once per composite, and reports the end-to-end latency of the composite.
+
+Usage:
+    with QueryFanout("comparison", on_complete=latency.record) as fanout:
+        current = fanout.submit(queries.query_consumption_for_period, start, now)
+        previous = fanout.submit(queries.query_consumption_for_period, prev_start, start)
+        current, previous = current.result(), previous.result()
+
+    # From async code
+    with QueryFanout("weekly_report") as fanout:
+        current, peaks = await fanout.gather(fanout.submit(...), fanout.submit(...))
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueryFanout:
+    """Runs the independent sub-queries of one composite concurrently."""
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: Optional[int] = None,
+        on_complete: Optional[Callable[[str, float], None]] = None
+    ):
+        """
+        Initialize the fan-out.
+
+        Args:
+            name: Composite name for logs and latency stats
+            max_workers: Concurrent sub-queries (env QUERY_FANOUT_WORKERS, default 4)
+            on_complete: Called with (name, seconds) when the composite finishes
+        """
+        self.name = name
+        self.max_workers = max_workers if max_workers is not None else \
+            int(os.getenv("QUERY_FANOUT_WORKERS", "4"))
+        self.on_complete = on_complete
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self.submitted = 0
+
+    def __enter__(self) -> "QueryFanout":
+        self._started = time.perf_counter()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, self.max_workers), thread_name_prefix=f"fanout-{self.name}"
+        )
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._executor.shutdown(wait=True)
+        elapsed = time.perf_counter() - self._started
+        shared = self.submitted - len(self._futures)
+        logger.info(f"{self.name}: {len(self._futures)} sub-queries"
+                    f"{f' ({shared} shared)' if shared else ''} in {elapsed * 1000:.0f} ms")
+        if self.on_complete and exc_type is None:
+            self.on_complete(self.name, elapsed)
+        return False
+
+    @staticmethod
+    def _key(fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> Optional[Hashable]:
+        """Identity of a sub-query; None if the arguments are not hashable."""
+        key = (
+            getattr(fn, "__func__", fn), id(getattr(fn, "__self__", None)),
+            args, tuple(sorted(kwargs.items()))
+        )
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """
+        Schedule fn(*args, **kwargs), or return the future of an identical earlier call.
+
+        Returns:
+            Future with the sub-query result (shared between identical calls)
+        """
+        key = self._key(fn, args, kwargs)
+        with self._lock:
+            self.submitted += 1
+            if key is not None and key in self._futures:
+                return self._futures[key]
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._futures[key if key is not None else object()] = future
+        return future
+
+    async def gather(self, *futures: Future) -> List[Any]:
+        """Await futures from async code without blocking the event loop."""
+        return list(await asyncio.gather(*(asyncio.wrap_future(future) for future in futures)))
+
+
+class LatencyStats:
+    """
+    Thread-safe end-to-end latency counters per composite.
+
+    Usage:
+        stats = LatencyStats()
+        QueryFanout("comparison", on_complete=stats.record)
+        stats.snapshot()   # {"comparison": {"count": 3, "avg_ms": 120.5, ...}}
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stats = self._stats.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0})
+            stats["count"] += 1
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+            stats["last_s"] = seconds
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                name: {
+                    "count": int(stats["count"]),
+                    "avg_ms": round(stats["total_s"] / stats["count"] * 1000, 1),
+                    "max_ms": round(stats["max_s"] * 1000, 1),
+                    "last_ms": round(stats["last_s"] * 1000, 1)
+                }
+                for name, stats in self._stats.items()
+            }
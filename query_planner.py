@@ -0,0 +1,267 @@
+"""
+Tiered query planner for MyTapo power queries.
+
+Splits a requested range into an aligned middle and two ragged edges and
+answers every piece from the coarsest complete tier:
+
+    start    ceil_hour     ceil_day              floor_day    floor_hour    end
+      | raw  |   hourly    |        daily         |   hourly   |    raw     |
+
+- daily: `power_daily` points in the consumption bucket (complete UTC days)
+- hourly: `power_hourly` points in the hourly bucket
+- raw: 15s samples in the power bucket (edges, and anything the rollups do not cover)
+
+Rollup coverage comes from the `rollup_status` point (see rollup_job.py); the
+aligned middle is clipped to it. Segments return power moments (sum of
+samples and sample count per device) which are stitched by adding them up,
+so the mean power over the whole range equals a raw mean() over the same
+points - a 365-day range costs about as much as a 2-day one.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pandas as pd
+from influxdb_client import InfluxDBClient
+
+from influx_stream import read_frame
+from rollup_job import (
+    DAILY_MEASUREMENT, FLUX_TIME_FORMAT, RollupCoverage, floor_day, floor_hour,
+    query_hourly_rollups, to_utc
+)
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("daily", "hourly", "raw")
+MOMENT_COLUMNS = ["device", "power_sum", "samples"]
+
+
+@dataclass
+class Segment:
+    """A piece of a planned range answered from one tier."""
+    tier: str
+    start: datetime
+    end: datetime
+
+
+def _ceil(timestamp: datetime, floor, step: timedelta) -> datetime:
+    floored = floor(timestamp)
+    return floored if floored == timestamp else floored + step
+
+
+def plan_range(
+    start: datetime,
+    end: datetime,
+    coverage: Optional[tuple] = None,
+    coarsest: str = "daily"
+) -> List[Segment]:
+    """
+    Split [start, end) into raw, hourly and daily segments.
+
+    Args:
+        start: Range start (naive = UTC)
+        end: Range end (naive = UTC)
+        coverage: (covered_from, complete_until) of the rollups, None = no rollups
+        coarsest: Coarsest tier to use ("daily" or "hourly")
+
+    Returns:
+        Non-empty, contiguous segments in time order
+    """
+    start, end = to_utc(start), to_utc(end)
+    if start >= end:
+        return []
+
+    aligned_start = _ceil(start, floor_hour, timedelta(hours=1))
+    aligned_end = floor_hour(end)
+    if coverage:
+        aligned_start = max(aligned_start, _ceil(to_utc(coverage[0]), floor_hour, timedelta(hours=1)))
+        aligned_end = min(aligned_end, floor_hour(to_utc(coverage[1])))
+    if not coverage or aligned_start >= aligned_end:
+        return [Segment("raw", start, end)]
+
+    pieces = [("raw", start, aligned_start)]
+    day_start = _ceil(aligned_start, floor_day, timedelta(days=1))
+    day_end = floor_day(aligned_end)
+    if coarsest == "daily" and day_start < day_end:
+        pieces += [
+            ("hourly", aligned_start, day_start),
+            ("daily", day_start, day_end),
+            ("hourly", day_end, aligned_end)
+        ]
+    else:
+        pieces.append(("hourly", aligned_start, aligned_end))
+    pieces.append(("raw", aligned_end, end))
+
+    return [Segment(tier, seg_start, seg_end) for tier, seg_start, seg_end in pieces if seg_start < seg_end]
+
+
+def mean_power(moments: pd.DataFrame) -> Dict[str, float]:
+    """Mean power per device from stitched moments."""
+    moments = moments[moments["samples"] > 0]
+    return (moments["power_sum"] / moments["samples"]).to_dict()
+
+
+class QueryPlanner:
+    """
+    Answers power queries from the coarsest complete tier.
+
+    Usage:
+        planner = QueryPlanner(power_bucket, hourly_bucket, consumption_bucket)
+        with client:
+            means = mean_power(planner.device_moments(client, start, end))
+            hourly = planner.hourly_moments(client, day_start, day_end)
+    """
+
+    def __init__(self, power_bucket: str, hourly_bucket: str, daily_bucket: str):
+        """
+        Initialize the planner.
+
+        Args:
+            power_bucket: Bucket with the raw `power_consumption` samples
+            hourly_bucket: Bucket with the hourly rollups and their status
+            daily_bucket: Bucket with the daily rollups
+        """
+        self.power_bucket = power_bucket
+        self.hourly_bucket = hourly_bucket
+        self.daily_bucket = daily_bucket
+        self.coverage = RollupCoverage(hourly_bucket)
+
+    def plan(self, client: InfluxDBClient, start: datetime, end: datetime,
+             coarsest: str = "daily") -> List[Segment]:
+        """Plan [start, end) against the current rollup coverage."""
+        segments = plan_range(start, end, self.coverage.status(client), coarsest)
+        logger.debug("Query plan: " + ", ".join(
+            f"{seg.tier} {seg.start:%Y-%m-%d %H:%M}-{seg.end:%Y-%m-%d %H:%M}" for seg in segments
+        ))
+        return segments
+
+    def _raw_source(self, segment: Segment, device_filter: str) -> str:
+        return f'''
+        data = from(bucket: "{self.power_bucket}")
+            |> range(start: {segment.start.strftime(FLUX_TIME_FORMAT)}, stop: {segment.end.strftime(FLUX_TIME_FORMAT)})
+            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
+            |> filter(fn: (r) => r["_field"] == "power")
+            {device_filter}
+            |> keep(columns: ["_start", "_stop", "_time", "_value", "device"])
+            |> toFloat()
+            |> group(columns: ["device"])
+        '''
+
+    def _raw_device_moments(self, client: InfluxDBClient, segment: Segment, device_filter: str) -> pd.DataFrame:
+        query = self._raw_source(segment, device_filter) + '''
+        union(tables: [
+            data |> sum() |> set(key: "stat", value: "power_sum"),
+            data |> count() |> toFloat() |> set(key: "stat", value: "samples")
+        ])
+            |> group()
+            |> pivot(rowKey: ["device"], columnKey: ["stat"], valueColumn: "_value")
+            |> keep(columns: ["device", "power_sum", "samples"])
+        '''
+        return read_frame(client, query, MOMENT_COLUMNS, {"power_sum": "float64", "samples": "float64"})
+
+    def _raw_hourly_moments(self, client: InfluxDBClient, segment: Segment, device_filter: str) -> pd.DataFrame:
+        query = self._raw_source(segment, device_filter) + '''
+        union(tables: [
+            data
+                |> aggregateWindow(every: 1h, fn: sum, timeSrc: "_start", createEmpty: false)
+                |> set(key: "stat", value: "power_sum"),
+            data
+                |> aggregateWindow(every: 1h, fn: count, timeSrc: "_start", createEmpty: false)
+                |> toFloat()
+                |> set(key: "stat", value: "samples")
+        ])
+            |> group()
+            |> pivot(rowKey: ["_time", "device"], columnKey: ["stat"], valueColumn: "_value")
+            |> keep(columns: ["_time", "device", "power_sum", "samples"])
+        '''
+        frame = read_frame(client, query, ["_time"] + MOMENT_COLUMNS,
+                           {"power_sum": "float64", "samples": "float64"})
+        # The first window starts at the (unaligned) range start
+        frame["_time"] = frame["_time"].dt.floor("h")
+        return frame
+
+    def _daily_rows(self, client: InfluxDBClient, segment: Segment, device_filter: str) -> pd.DataFrame:
+        query = f'''
+        from(bucket: "{self.daily_bucket}")
+            |> range(start: {segment.start.strftime(FLUX_TIME_FORMAT)}, stop: {segment.end.strftime(FLUX_TIME_FORMAT)})
+            |> filter(fn: (r) => r["_measurement"] == "{DAILY_MEASUREMENT}")
+            |> filter(fn: (r) => r["_field"] == "mean_w" or r["_field"] == "samples")
+            {device_filter}
+            |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+            |> group()
+            |> keep(columns: ["_time", "device", "mean_w", "samples"])
+        '''
+        return read_frame(client, query, ["_time", "device", "mean_w", "samples"],
+                          {"mean_w": "float64", "samples": "float64"})
+
+    @staticmethod
+    def _rollup_moments(rows: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        rows = rows.dropna(subset=["mean_w", "samples"])
+        moments = rows.assign(power_sum=rows["mean_w"] * rows["samples"])
+        return moments[keys + ["power_sum", "samples"]]
+
+    @staticmethod
+    def _stitch(parts: List[pd.DataFrame], keys: List[str]) -> pd.DataFrame:
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame(
+                {column: [] for column in keys + ["power_sum", "samples"]}
+            ).set_index(keys)
+        return pd.concat(parts, ignore_index=True).groupby(keys)[["power_sum", "samples"]].sum()
+
+    def device_moments(
+        self,
+        client: InfluxDBClient,
+        start: datetime,
+        end: datetime,
+        device_filter: str = ""
+    ) -> pd.DataFrame:
+        """
+        Power moments per device over [start, end).
+
+        Args:
+            client: InfluxDB client
+            start: Range start (naive = UTC)
+            end: Range end (naive = UTC)
+            device_filter: Optional Flux filter line on the device tag
+
+        Returns:
+            DataFrame indexed by device with power_sum (W) and samples
+        """
+        parts = []
+        for segment in self.plan(client, start, end):
+            if segment.tier == "daily":
+                rows = self._daily_rows(client, segment, device_filter)
+                parts.append(self._rollup_moments(rows, ["device"]))
+            elif segment.tier == "hourly":
+                rows = query_hourly_rollups(client, self.hourly_bucket, segment.start, segment.end, device_filter)
+                parts.append(self._rollup_moments(rows, ["device"]))
+            else:
+                parts.append(self._raw_device_moments(client, segment, device_filter))
+        return self._stitch(parts, ["device"])
+
+    def hourly_moments(
+        self,
+        client: InfluxDBClient,
+        start: datetime,
+        end: datetime,
+        device_filter: str = ""
+    ) -> pd.DataFrame:
+        """
+        Power moments per device and hour (hour start, UTC) over [start, end).
+
+        The daily tier is skipped; ragged edges contribute partial hours.
+
+        Returns:
+            DataFrame indexed by (_time, device) with power_sum (W) and samples
+        """
+        parts = []
+        for segment in self.plan(client, start, end, coarsest="hourly"):
+            if segment.tier == "hourly":
+                rows = query_hourly_rollups(client, self.hourly_bucket, segment.start, segment.end, device_filter)
+                parts.append(self._rollup_moments(rows, ["_time", "device"]))
+            else:
+                parts.append(self._raw_hourly_moments(client, segment, device_filter))
+        return self._stitch(parts, ["_time", "device"])
@@ -7,12 +7,28 @@ Called by n8n workflows, iPhone Shortcuts, or other automation tools.
 
 import os
 import json
+import time
+import asyncio
+import hashlib
 import logging
-from datetime import datetime
+from contextlib import aclosing
+from contextvars import ContextVar
+from functools import partial
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
 from aiohttp import web
 from dotenv import load_dotenv
 
-from influx_queries import InfluxQueries
+from admission import BASE_COST, AdmissionController, AdmissionRejected, range_cost
+from async_queries import AsyncInfluxQueries
+from fast_json import BACKEND as JSON_BACKEND, dumps, loads
+from http_compression import CODINGS, Compressor, EncodingStats
+from influx_queries import EVENT_SETTLE_SECONDS, InfluxQueries
+from report_snapshots import SnapshotStore, content_etag
+from downsampling import METHODS
+from live_feed import LiveFeed, Reading
+from series_export import FORMATS, SeriesExport, parse_devices, parse_every
+from single_flight import SingleFlight
 from utils import send_pushover_notification_new, get_awtrix_client
 from awtrix_client import AwtrixMessage
 
@@ -24,15 +40,67 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Endpoints whose concurrent identical requests share one computation
+COALESCED_PREFIXES = ("/reports/", "/tools/")
+
+PERIOD_DAYS = {"day": 1, "week": 7, "month": 30}
+
+# Keep idle live connections (and proxies in between) open
+LIVE_KEEPALIVE_SECONDS = 15
+
+# Maximum number of calls in one POST /tools/batch
+TOOL_BATCH_MAX_CALLS = 20
+
+# Point budget limits of /tools/chart_series
+CHART_POINTS_DEFAULT = 500
+CHART_POINTS_MAX = 10_000
+
+# Cache-Control policies: live data must be revalidated (cheap with ETag/304),
+# closed historical ranges never change, operational endpoints are never cached
+CACHE_LIVE = "private, no-cache"
+CACHE_IMMUTABLE = "private, max-age=31536000, immutable"
+CACHE_NONE = "no-store"
+UNCACHED_PATHS = ("/health", "/metrics", "/admin/")
+
+# Serialization time of the current request, collected by the compression middleware
+_encoding_timing: ContextVar[Optional[Dict[str, float]]] = ContextVar("encoding_timing", default=None)
+
+# Endpoints outside admission control (cheap, or a single shared upstream poller)
+UNMETERED_PATHS = ("/health", "/metrics", "/admin/", "/live")
+
+
+def json_response(data, status: int = 200, headers: Optional[dict] = None) -> web.Response:
+    """JSON response serialized with fast_json; the time spent is added to the request's encoding stats."""
+    started = time.perf_counter()
+    body = dumps(data)
+    timing = _encoding_timing.get()
+    if timing is not None:
+        timing["serialize_s"] += time.perf_counter() - started
+    return web.Response(body=body, status=status, headers=headers, content_type="application/json")
+
 
 class ReportAPI:
     """HTTP API for on-demand energy reports."""
 
     def __init__(self):
-        self.queries = InfluxQueries()
+        self.queries = AsyncInfluxQueries()
         self.pushover_user = os.getenv("PUSHOVER_USER_GROUP_WOERIS")
         self.awtrix_client = get_awtrix_client()
         self.api_token = os.getenv("REPORT_API_TOKEN", "")
+        self.flights = SingleFlight()
+        self.exporter = SeriesExport(self.queries.queries)
+        self.live_feed = LiveFeed(self.queries)
+        self.admission = AdmissionController()
+        self.compressor = Compressor()
+        self.encoding_stats = EncodingStats()
+
+        # Common reports are served from background-refreshed snapshots
+        self.snapshots = SnapshotStore()
+        self.snapshots.register("today", self._build_today)
+        self.snapshots.register("solar", self._build_solar)
+        for period in PERIOD_DAYS:
+            self.snapshots.register(f"top-devices:{period}", partial(self._build_top_devices, period))
+            self.snapshots.register(f"comparison:{period}", partial(self._build_comparison, period))
 
     def _check_auth(self, request: web.Request) -> bool:
         """Check API token if configured."""
@@ -43,6 +111,247 @@ class ReportAPI:
             token = request.query.get("token", "")
         return token == self.api_token
 
+    @web.middleware
+    async def compression_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """gzip/deflate for JSON responses above the size threshold; records encoding time per endpoint."""
+        timing = {"serialize_s": 0.0}
+        token = _encoding_timing.set(timing)
+        try:
+            response = await handler(request)
+        finally:
+            _encoding_timing.reset(token)
+        if not isinstance(response, web.Response) or not isinstance(response.body, bytes):
+            return response
+
+        raw_bytes = len(response.body)
+        compress_s = 0.0
+        coding = self.compressor.negotiate(request.headers.get("Accept-Encoding", ""))
+        if raw_bytes >= self.compressor.min_bytes and "Content-Encoding" not in response.headers:
+            response.headers.add("Vary", "Accept-Encoding")
+            if coding:
+                started = time.perf_counter()
+                response.body = await self.compressor.compress(response.body, coding)
+                compress_s = time.perf_counter() - started
+                response.headers["Content-Encoding"] = coding
+                # The compressed body is another representation: its strong ETag
+                # carries the coding ("<hash>-gzip"), see _etag_matches
+                etag = response.headers.get("ETag")
+                if etag and etag.endswith('"'):
+                    response.headers["ETag"] = f'{etag[:-1]}-{coding}"'
+
+        resource = request.match_info.route.resource
+        endpoint = resource.canonical if resource is not None else "unmatched"
+        self.encoding_stats.record(endpoint, timing["serialize_s"], compress_s, raw_bytes, len(response.body))
+        return response
+
+    @web.middleware
+    async def http_cache_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """
+        Strong ETags, conditional GET (304) and Cache-Control for JSON responses.
+
+        The ETag is the handler's own (e.g. a snapshot's data ETag, which
+        ignores `as_of`) or the hash of the body.
+        """
+        response = await handler(request)
+        if not isinstance(response, web.Response) or not isinstance(response.body, bytes):
+            return response
+
+        if request.path.startswith(UNCACHED_PATHS) or response.status != 200:
+            response.headers.setdefault("Cache-Control", CACHE_NONE)
+            return response
+
+        response.headers.setdefault("Cache-Control", CACHE_LIVE)
+        etag = response.headers.get("ETag") or content_etag(response.body)
+        response.headers["ETag"] = etag
+
+        matched = self._etag_matches(request, etag) if request.method in ("GET", "HEAD") else None
+        if matched:
+            # Echo the client's representation (with its coding suffix), not the identity ETag
+            return web.Response(status=304, headers={
+                "ETag": etag if matched == "*" else matched,
+                "Cache-Control": response.headers["Cache-Control"]
+            })
+        return response
+
+    @staticmethod
+    def _etag_matches(request: web.Request, etag: str) -> Optional[str]:
+        """
+        Candidate of If-None-Match that matches the identity ETag, if any.
+
+        If-None-Match uses weak comparison; a "-gzip"/"-deflate" suffix added
+        by the compression middleware names the same data.
+        """
+        for value in request.headers.get("If-None-Match", "").split(","):
+            candidate = value.strip()
+            if candidate == "*":
+                return candidate
+            opaque = candidate[2:] if candidate.startswith("W/") else candidate
+            for coding in CODINGS:
+                if opaque.endswith(f'-{coding}"'):
+                    opaque = f'{opaque[:-len(coding) - 2]}"'
+                    break
+            if opaque == etag:
+                return candidate
+        return None
+
+    @staticmethod
+    def _range_end(value: Optional[str], end_of_day: bool = True) -> Optional[datetime]:
+        """Parse an explicit range end from a query parameter (None if missing or invalid)."""
+        if not value:
+            return None
+        try:
+            return InfluxQueries._parse_datetime(value, end_of_day=end_of_day)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _json(data, closed_end: Optional[datetime] = None, has_data: bool = True) -> web.Response:
+        """
+        JSON response; ranges that ended before the settle period are immutable.
+
+        Failed queries come back as empty results, so empty answers are never
+        marked immutable (has_data=False).
+        """
+        response = json_response(data)
+        if closed_end is not None and has_data and \
+                (datetime.utcnow() - closed_end).total_seconds() >= EVENT_SETTLE_SECONDS:
+            response.headers["Cache-Control"] = CACHE_IMMUTABLE
+        return response
+
+    @web.middleware
+    async def admission_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Cost-based global and per-client limits; over-budget requests get 429 with Retry-After."""
+        if request.path.startswith(UNMETERED_PATHS) or not self._check_auth(request):
+            return await handler(request)
+        cost = await self._request_cost(request)
+        if cost is None:
+            return await handler(request)
+
+        try:
+            async with self.admission.admit(self._client_id(request), BASE_COST + cost):
+                return await handler(request)
+        except AdmissionRejected as e:
+            return json_response(
+                {"error": "too many requests", "reason": e.reason, "retry_after": e.retry_after},
+                status=429, headers={"Retry-After": str(e.retry_after)}
+            )
+
+    @staticmethod
+    def _client_id(request: web.Request) -> str:
+        """Rate-limit identity: API token fingerprint and remote address."""
+        token = request.headers.get("Authorization", "").replace("Bearer ", "") or request.query.get("token", "")
+        fingerprint = hashlib.sha256(token.encode()).hexdigest()[:8] if token else "-"
+        return f"{fingerprint}@{request.remote}"
+
+    def _range_cost(self, start: Optional[str] = None, end: Optional[str] = None, days=None,
+                    default_days: Optional[int] = None, weight: float = 1.0, rollups: bool = True) -> float:
+        """
+        Estimated cost of a tool range given as start/end or days back (0 if it cannot be parsed).
+
+        Args:
+            start: ISO date/datetime of the range start
+            end: ISO date/datetime of the range end (default: now)
+            days: Alternative to start/end - number of days back from now
+            default_days: Days back without start and days (None = since midnight)
+            weight: Share of the devices read
+            rollups: Whether the query can be answered from the rollups
+        """
+        now = datetime.utcnow()
+        try:
+            if days is not None and days != "":
+                dt_start, dt_end = now - timedelta(days=int(days)), now
+            elif start:
+                dt_start = InfluxQueries._parse_datetime(start)
+                dt_end = InfluxQueries._parse_datetime(end, end_of_day=True) if end else now
+            elif default_days is not None:
+                dt_start, dt_end = now - timedelta(days=default_days), now
+            else:
+                dt_start, dt_end = now.replace(hour=0, minute=0, second=0, microsecond=0), now
+        except (TypeError, ValueError, OverflowError):
+            return 0.0  # the handler rejects the request
+        # Uses the last known coverage; the middleware never waits for InfluxDB
+        coverage = self.queries.queries.planner.coverage.cached() if rollups else None
+        return range_cost(dt_start, dt_end, coverage, weight)
+
+    def _tool_cost(self, tool: str, args) -> float:
+        """Estimated cost of one tool call (query parameters or batch args)."""
+        if tool in ("device_consumption", "solar_history", "chart_series"):
+            raw_device = tool != "device_consumption"
+            return self._range_cost(
+                args.get("start"), args.get("end"), args.get("days"),
+                default_days=7 if tool == "solar_history" else None,
+                weight=0.1 if raw_device else 1.0, rollups=not raw_device
+            )
+        if tool == "compare_periods":
+            return sum(
+                self._range_cost(args.get(f"period_{p}_start"), args.get(f"period_{p}_end"))
+                for p in ("a", "b") if args.get(f"period_{p}_start")
+            )
+        if tool == "hourly_consumption":
+            date = args.get("date")
+            return self._range_cost(date, date) if date else self._range_cost()
+        # device_events, list_devices: events bucket and metadata only
+        return 0.0
+
+    async def _request_cost(self, request: web.Request) -> Optional[float]:
+        """Estimated cost of a request beyond BASE_COST (None = not admission controlled)."""
+        path = request.path
+        if path.startswith("/tools/"):
+            tool = path[len("/tools/"):]
+            if tool != "batch":
+                return self._tool_cost(tool, request.query)
+            try:
+                body = await request.json(loads=loads)
+                calls = body.get("calls") if isinstance(body, dict) else body
+                return sum(
+                    self._tool_cost(call.get("tool", ""), call.get("args") or {})
+                    for call in calls if isinstance(call, dict) and isinstance(call.get("args") or {}, dict)
+                )
+            except Exception:
+                return 0.0  # the handler rejects the request
+        if path == "/export/series":
+            devices = request.query.get("device")
+            weight = min(1.0, 0.1 * len(devices.split(","))) if devices else 1.0
+            try:
+                every = parse_every(request.query.get("every"))
+            except ValueError:
+                return 0.0
+            rollups = every is not None and every % timedelta(hours=1) == timedelta(0)
+            return self._range_cost(request.query.get("start"), request.query.get("end"),
+                                    weight=weight, rollups=rollups)
+        if path == "/reports/custom":
+            return self._range_cost(default_days=7)
+        # Snapshot-served reports are answered from memory
+        period = request.query.get("period")
+        snapshot = {"/reports/today": "today", "/reports/solar": "solar",
+                    "/reports/top-devices": f"top-devices:{period or 'day'}",
+                    "/reports/comparison": f"comparison:{period or 'week'}"}.get(path)
+        if snapshot in self.snapshots:
+            return None
+        if path == "/reports/top-devices":
+            return self._range_cost(days=PERIOD_DAYS.get(period, 1))
+        if path == "/reports/comparison":
+            return 2 * self._range_cost(days=PERIOD_DAYS.get(period, 7))
+        return 0.0
+
+    @web.middleware
+    async def coalesce_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Share one in-flight computation between concurrent identical report/tool requests."""
+        if not request.path.startswith(COALESCED_PREFIXES):
+            return await handler(request)
+
+        # Same endpoint, same normalized query/body and same credentials
+        body = await request.read() if request.can_read_body else b""
+        query = tuple(sorted(
+            (name, value.strip()) for name, value in request.query.items() if name != "token"
+        ))
+        credentials = (request.headers.get("Authorization", ""), request.query.get("token", ""))
+        key = (request.method, request.path, query, body, credentials)
+
+        response = await self.flights.do(key, lambda: handler(request), name=request.path)
+        # A prepared response can only be sent once; every waiter gets its own copy
+        return web.Response(body=response.body, status=response.status, headers=response.headers)
+
     def _format_summary_text(self, data: dict, report_type: str) -> str:
         """Format human-readable summary for Pushover."""
         if report_type == "today":
@@ -121,7 +430,51 @@ class ReportAPI:
         return ""
 
     async def health(self, request: web.Request) -> web.Response:
-        return web.json_response({"status": "ok", "service": "report-api"})
+        return json_response({"status": "ok", "service": "report-api"})
+
+    async def metrics(self, request: web.Request) -> web.Response:
+        """GET /metrics - Query cache, composite latency, query pool, coalescing, snapshot, live feed, admission and encoding stats."""
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        return json_response({
+            "query_cache": self.queries.cache_stats(),
+            "composite_latency": self.queries.latency_stats(),
+            "query_pool": self.queries.pool_stats(),
+            "coalescing": self.flights.stats(),
+            "snapshots": self.snapshots.stats(),
+            "live": self.live_feed.stats(),
+            "admission": self.admission.stats(),
+            "encoding": {"json_backend": JSON_BACKEND, "endpoints": self.encoding_stats.snapshot()}
+        })
+
+    async def admin_invalidate_cache(self, request: web.Request) -> web.Response:
+        """POST /admin/cache/invalidate - Drop cached results, optionally only for a time range."""
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        try:
+            body = await request.json(loads=loads) if request.can_read_body else {}
+        except Exception:
+            body = {}
+
+        try:
+            start = datetime.fromisoformat(body["start"]) if body.get("start") else None
+            end = datetime.fromisoformat(body["end"]) if body.get("end") else None
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+
+        invalidated = self.queries.invalidate_cache(start, end)
+        # New data arrived: recompute the report snapshots in use right away
+        self.snapshots.invalidate()
+        return json_response({"invalidated": invalidated})
+
+    async def admin_refresh_snapshots(self, request: web.Request) -> web.Response:
+        """POST /admin/snapshots/refresh - New data is available (e.g. rollups written), cached results stay valid."""
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        return json_response(self.snapshots.invalidate())
 
     async def list_reports(self, request: web.Request) -> web.Response:
         reports = [
@@ -131,15 +484,18 @@ class ReportAPI:
             {"endpoint": "/reports/solar", "description": "Solar generation summary"},
             {"endpoint": "/reports/comparison?period=week", "description": "Period vs previous period"},
             {"endpoint": "/reports/custom", "description": "POST - Raw data context for AI analysis"},
+            {"endpoint": "/export/series?start=&end=&device=&every=&format=ndjson|csv|arrow",
+             "description": "Streaming raw or aggregated power series export"},
+            {"endpoint": "/live?device=&interval=",
+             "description": "Live per-device power (Server-Sent Events or WebSocket)"},
         ]
-        return web.json_response({"reports": reports})
-
-    async def report_today(self, request: web.Request) -> web.Response:
-        if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+        return json_response({"reports": reports})
 
-        consumption = self.queries.query_today_consumption()
-        top_devices = self.queries.query_top_devices(days=1)
+    async def _build_today(self) -> dict:
+        consumption, top_devices = await asyncio.gather(
+            self.queries.query_today_consumption(),
+            self.queries.query_top_devices(days=1)
+        )
         total = sum(consumption.values())
         cost = total * self.queries.cost_per_kwh
 
@@ -151,23 +507,70 @@ class ReportAPI:
             "timestamp": datetime.utcnow().isoformat()
         }
 
-        return web.json_response({
+        return {
             "data": data,
             "summary_text": self._format_summary_text(data, "today"),
             "awtrix_text": self._format_awtrix_text(data, "today")
-        })
+        }
+
+    async def _build_top_devices(self, period: str) -> dict:
+        days = PERIOD_DAYS.get(period, 1)
+        devices = await self.queries.query_top_devices(days=days)
+
+        data = {"period": period, "devices": devices}
+
+        return {
+            "data": data,
+            "summary_text": self._format_summary_text(data, "top-devices"),
+            "awtrix_text": self._format_awtrix_text(data, "top-devices")
+        }
+
+    async def _build_solar(self) -> dict:
+        data = await self.queries.query_solar_summary()
+
+        return {
+            "data": data,
+            "summary_text": self._format_summary_text(data, "solar"),
+            "awtrix_text": self._format_awtrix_text(data, "solar")
+        }
+
+    async def _build_comparison(self, period: str) -> dict:
+        data = await self.queries.query_comparison(period)
+
+        return {
+            "data": data,
+            "summary_text": self._format_summary_text(data, "comparison"),
+            "awtrix_text": self._format_awtrix_text(data, "comparison")
+        }
+
+    async def _snapshot_response(self, name: str, build) -> web.Response:
+        """Serve a registered snapshot (stale-while-revalidate), or build uncommon variants on demand."""
+        if name in self.snapshots:
+            snapshot = await self.snapshots.get(name)
+            payload, as_of, etag = snapshot.payload, snapshot.as_of, snapshot.etag
+        else:
+            payload, as_of = await build(), datetime.now(timezone.utc)
+            etag = content_etag(dumps(payload))
+        # The ETag covers the data only, so a refresh with unchanged data still revalidates
+        return json_response({**payload, "as_of": as_of.isoformat()}, headers={"ETag": etag})
+
+    async def report_today(self, request: web.Request) -> web.Response:
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        return await self._snapshot_response("today", self._build_today)
 
     async def report_events(self, request: web.Request) -> web.Response:
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         period = request.query.get("period", "day")
-        days = {"day": 1, "week": 7, "month": 30}.get(period, 1)
-        events = self.queries.query_events(days)
+        days = PERIOD_DAYS.get(period, 1)
+        events = await self.queries.query_events(days)
 
         data = {"period": period, "days": days, "events": events}
 
-        return web.json_response({
+        return json_response({
             "data": data,
             "summary_text": self._format_summary_text(data, "events"),
             "awtrix_text": self._format_awtrix_text(data, "events")
@@ -175,59 +578,42 @@ class ReportAPI:
 
     async def report_top_devices(self, request: web.Request) -> web.Response:
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         period = request.query.get("period", "day")
-        days = {"day": 1, "week": 7, "month": 30}.get(period, 1)
-        devices = self.queries.query_top_devices(days=days)
-
-        data = {"period": period, "devices": devices}
-
-        return web.json_response({
-            "data": data,
-            "summary_text": self._format_summary_text(data, "top-devices"),
-            "awtrix_text": self._format_awtrix_text(data, "top-devices")
-        })
+        return await self._snapshot_response(
+            f"top-devices:{period}", lambda: self._build_top_devices(period)
+        )
 
     async def report_solar(self, request: web.Request) -> web.Response:
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
-        data = self.queries.query_solar_summary()
-
-        return web.json_response({
-            "data": data,
-            "summary_text": self._format_summary_text(data, "solar"),
-            "awtrix_text": self._format_awtrix_text(data, "solar")
-        })
+        return await self._snapshot_response("solar", self._build_solar)
 
     async def report_comparison(self, request: web.Request) -> web.Response:
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         period = request.query.get("period", "week")
-        data = self.queries.query_comparison(period)
-
-        return web.json_response({
-            "data": data,
-            "summary_text": self._format_summary_text(data, "comparison"),
-            "awtrix_text": self._format_awtrix_text(data, "comparison")
-        })
+        return await self._snapshot_response(
+            f"comparison:{period}", lambda: self._build_comparison(period)
+        )
 
     async def report_custom(self, request: web.Request) -> web.Response:
         """POST endpoint: returns full data context for Claude API analysis."""
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         try:
-            body = await request.json()
+            body = await request.json(loads=loads)
             question = body.get("question", "")
         except Exception:
             question = ""
 
-        data = self.queries.query_custom_context(question)
+        data = await self.queries.query_custom_context(question)
 
-        return web.json_response({
+        return json_response({
             "data": data,
             "summary_text": "Custom data context for AI analysis",
             "awtrix_text": ""
@@ -238,49 +624,52 @@ class ReportAPI:
     async def tool_device_consumption(self, request: web.Request) -> web.Response:
         """GET /tools/device_consumption - Query consumption for device/period."""
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         device = request.query.get("device")
         start = request.query.get("start")
         end = request.query.get("end")
         days = request.query.get("days")
 
-        data = self.queries.query_device_consumption(
+        data = await self.queries.query_device_consumption(
             device=device, start=start, end=end,
             days=int(days) if days else None
         )
-        return web.json_response(data)
+        closed_end = self._range_end(end) if start and not days else None
+        return self._json(data, closed_end, bool(data.get("devices")))
 
     async def tool_hourly_consumption(self, request: web.Request) -> web.Response:
         """GET /tools/hourly_consumption - Hourly breakdown for a day."""
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         date = request.query.get("date")
         device = request.query.get("device")
 
-        data = self.queries.query_hourly_consumption(date=date, device=device)
-        return web.json_response(data)
+        data = await self.queries.query_hourly_consumption(date=date, device=device)
+        day_start = self._range_end(date, end_of_day=False)
+        closed_end = day_start.replace(hour=0, minute=0, second=0) + timedelta(days=1) if day_start else None
+        return self._json(data, closed_end, bool(data.get("hourly_kwh")))
 
     async def tool_device_events(self, request: web.Request) -> web.Response:
         """GET /tools/device_events - Query appliance events."""
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         device = request.query.get("device")
         days = request.query.get("days", "7")
         start = request.query.get("start")
         end = request.query.get("end")
 
-        data = self.queries.query_device_events_flexible(
+        data = await self.queries.query_device_events_flexible(
             device=device, days=int(days), start=start, end=end
         )
-        return web.json_response(data)
+        return self._json(data, self._range_end(end) if start else None, bool(data.get("events")))
 
     async def tool_compare_periods(self, request: web.Request) -> web.Response:
         """GET /tools/compare_periods - Compare two time periods."""
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         a_start = request.query.get("period_a_start")
         a_end = request.query.get("period_a_end")
@@ -289,45 +678,235 @@ class ReportAPI:
         device = request.query.get("device")
 
         if not all([a_start, a_end, b_start, b_end]):
-            return web.json_response(
+            return json_response(
                 {"error": "Required: period_a_start, period_a_end, period_b_start, period_b_end"},
                 status=400
             )
 
-        data = self.queries.query_compare_periods(
+        data = await self.queries.query_compare_periods(
             a_start, a_end, b_start, b_end, device=device
         )
-        return web.json_response(data)
+        ends = [self._range_end(a_end), self._range_end(b_end)]
+        has_data = bool(data["period_a"]["devices"]) and bool(data["period_b"]["devices"])
+        return self._json(data, max(ends) if all(ends) else None, has_data)
 
     async def tool_solar_history(self, request: web.Request) -> web.Response:
         """GET /tools/solar_history - Solar generation history."""
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
         start = request.query.get("start")
         end = request.query.get("end")
         days = request.query.get("days")
 
-        data = self.queries.query_solar_history(
+        data = await self.queries.query_solar_history(
             start=start, end=end, days=int(days) if days else None
         )
-        return web.json_response(data)
+        closed_end = self._range_end(end) if start and not days else None
+        return self._json(data, closed_end, bool(data.get("daily_kwh")))
+
+    async def tool_chart_series(self, request: web.Request) -> web.Response:
+        """GET /tools/chart_series - Downsampled raw power series of one device for charts."""
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        start = request.query.get("start")
+        end = request.query.get("end")
+        days = request.query.get("days")
+        method = request.query.get("method", "lttb")
+        try:
+            devices = parse_devices(request.query.get("device"))
+            if not devices or len(devices) != 1:
+                raise ValueError("Required: exactly one device")
+            if method not in METHODS:
+                raise ValueError(f"Invalid method '{method}' (expected one of {', '.join(METHODS)})")
+            points = int(request.query.get("points", CHART_POINTS_DEFAULT))
+            if not 3 <= points <= CHART_POINTS_MAX:
+                raise ValueError(f"points must be between 3 and {CHART_POINTS_MAX}")
+
+            now = datetime.utcnow()
+            if days:
+                dt_start, dt_end = now - timedelta(days=int(days)), now
+            elif start:
+                dt_start = InfluxQueries._parse_datetime(start)
+                dt_end = InfluxQueries._parse_datetime(end, end_of_day=True) if end else now
+            else:
+                dt_start, dt_end = now.replace(hour=0, minute=0, second=0, microsecond=0), now
+            if dt_start >= dt_end:
+                raise ValueError("start must be before end")
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+
+        data = await self.queries.run(
+            self.exporter.chart_series, devices[0], dt_start, dt_end, points, method
+        )
+        closed_end = dt_end if start and end and not days else None
+        return self._json(data, closed_end, bool(data["series"]))
+
+    async def tool_batch(self, request: web.Request) -> web.Response:
+        """POST /tools/batch - Run several tool calls concurrently in one request."""
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        try:
+            body = await request.json(loads=loads)
+        except Exception:
+            return json_response({"error": "Invalid JSON body"}, status=400)
+
+        calls = body.get("calls") if isinstance(body, dict) else body
+        if not isinstance(calls, list) or not calls or not all(isinstance(call, dict) for call in calls):
+            return json_response(
+                {"error": 'Required: {"calls": [{"tool": "...", "args": {...}}, ...]}'}, status=400
+            )
+        if len(calls) > TOOL_BATCH_MAX_CALLS:
+            return json_response(
+                {"error": f"At most {TOOL_BATCH_MAX_CALLS} calls per batch"}, status=400
+            )
+
+        results = await self.queries.query_tool_batch(calls)
+        return json_response({"results": results})
 
     async def tool_list_devices(self, request: web.Request) -> web.Response:
         """GET /tools/list_devices - List all monitored devices."""
         if not self._check_auth(request):
-            return web.json_response({"error": "unauthorized"}, status=401)
+            return json_response({"error": "unauthorized"}, status=401)
 
-        data = self.queries.list_devices()
-        return web.json_response(data)
+        data = await self.queries.list_devices()
+        return json_response(data)
+
+    async def export_series(self, request: web.Request) -> web.StreamResponse:
+        """GET /export/series - Stream raw or aggregated power series as NDJSON, CSV or Arrow."""
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        fmt = request.query.get("format", "ndjson")
+        start_value = request.query.get("start")
+        end_value = request.query.get("end")
+        try:
+            if fmt not in FORMATS:
+                raise ValueError(f"Invalid format '{fmt}' (expected one of {', '.join(FORMATS)})")
+            if not start_value or not end_value:
+                raise ValueError("Required: start, end")
+            devices = parse_devices(request.query.get("device"))
+            every = parse_every(request.query.get("every"))
+            start = InfluxQueries._parse_datetime(start_value)
+            end = InfluxQueries._parse_datetime(end_value)
+            if "T" not in end_value:
+                end += timedelta(days=1)  # a date-only end includes that day
+            if start >= end:
+                raise ValueError("start must be before end")
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+
+        # Each chunk is fetched only after the previous one was written, so
+        # memory stays constant and slow clients throttle the export
+        chunks = self.queries.iterate(self.exporter.stream(start, end, devices, every, fmt))
+        async with aclosing(chunks):
+            try:
+                first = await anext(chunks, b"")
+            except Exception as e:
+                logger.error(f"Series export failed: {e}")
+                return json_response({"error": "export failed"}, status=500)
+
+            extension = "arrows" if fmt == "arrow" else fmt
+            response = web.StreamResponse(headers={
+                "Content-Type": FORMATS[fmt],
+                "Content-Disposition": f'attachment; filename="power_{start:%Y%m%d}_{end:%Y%m%d}.{extension}"',
+                "Cache-Control": CACHE_NONE
+            })
+            response.enable_chunked_encoding()
+            coding = self.compressor.negotiate(request.headers.get("Accept-Encoding", ""))
+            if coding:
+                response.enable_compression(web.ContentCoding(coding))
+            await response.prepare(request)
+            try:
+                await response.write(first)
+                async for data in chunks:
+                    await response.write(data)
+            except Exception as e:
+                # Headers are sent; aborting without the final chunk marks the body incomplete
+                logger.error(f"Series export aborted: {e}")
+                raise
+            await response.write_eof()
+            return response
+
+    @staticmethod
+    def _live_message(readings: List[Reading]) -> str:
+        return dumps({
+            "time": datetime.now(timezone.utc).isoformat(),
+            "devices": {reading.device: reading.to_dict() for reading in readings}
+        }).decode()
+
+    async def live(self, request: web.Request) -> web.StreamResponse:
+        """GET /live - Push per-device power updates via Server-Sent Events or WebSocket."""
+        if not self._check_auth(request):
+            return json_response({"error": "unauthorized"}, status=401)
+
+        try:
+            devices = parse_devices(request.query.get("device"))
+            min_interval = float(request.query.get("interval", "0"))
+            if not 0 <= min_interval <= 3600:
+                raise ValueError("interval must be between 0 and 3600 seconds")
+        except ValueError as e:
+            return json_response({"error": str(e)}, status=400)
+
+        with self.live_feed.subscribe(set(devices) if devices else None, min_interval) as subscription:
+            if request.headers.get("Upgrade", "").lower() == "websocket":
+                return await self._live_websocket(request, subscription)
+            return await self._live_sse(request, subscription)
+
+    async def _live_sse(self, request: web.Request, subscription) -> web.StreamResponse:
+        response = web.StreamResponse(headers={
+            "Content-Type": "text/event-stream",
+            "Cache-Control": CACHE_NONE,
+            "X-Accel-Buffering": "no"
+        })
+        await response.prepare(request)
+        try:
+            while True:
+                readings = await subscription.next(timeout=LIVE_KEEPALIVE_SECONDS)
+                if readings:
+                    await response.write(f"event: power\ndata: {self._live_message(readings)}\n\n".encode())
+                else:
+                    await response.write(b": keepalive\n\n")
+        except ConnectionResetError:
+            pass  # client went away
+        return response
+
+    async def _live_websocket(self, request: web.Request, subscription) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(heartbeat=LIVE_KEEPALIVE_SECONDS * 2)
+        await ws.prepare(request)
+
+        # Incoming messages are ignored; the reader only notices the close
+        async def read_until_closed():
+            async for _ in ws:
+                pass
+
+        reader = asyncio.ensure_future(read_until_closed())
+        try:
+            while not reader.done() and not ws.closed:
+                readings = await subscription.next(timeout=LIVE_KEEPALIVE_SECONDS)
+                if readings and not ws.closed:
+                    await ws.send_str(self._live_message(readings))
+        except ConnectionResetError:
+            pass
+        finally:
+            reader.cancel()
+            await ws.close()
+        return ws
 
 
 def create_app() -> web.Application:
     """Create and configure the aiohttp application."""
     api = ReportAPI()
-    app = web.Application()
+    app = web.Application(middlewares=[
+        api.compression_middleware, api.http_cache_middleware, api.coalesce_middleware, api.admission_middleware
+    ])
 
     app.router.add_get("/health", api.health)
+    app.router.add_get("/metrics", api.metrics)
+    app.router.add_post("/admin/cache/invalidate", api.admin_invalidate_cache)
+    app.router.add_post("/admin/snapshots/refresh", api.admin_refresh_snapshots)
     app.router.add_get("/reports", api.list_reports)
     app.router.add_get("/reports/today", api.report_today)
     app.router.add_get("/reports/events", api.report_events)
@@ -343,6 +922,23 @@ def create_app() -> web.Application:
     app.router.add_get("/tools/compare_periods", api.tool_compare_periods)
     app.router.add_get("/tools/solar_history", api.tool_solar_history)
     app.router.add_get("/tools/list_devices", api.tool_list_devices)
+    app.router.add_get("/tools/chart_series", api.tool_chart_series)
+    app.router.add_post("/tools/batch", api.tool_batch)
+
+    # Streaming endpoints (not coalesced or ETagged)
+    app.router.add_get("/export/series", api.export_series)
+    app.router.add_get("/live", api.live)
+
+    async def start_snapshots(app: web.Application):
+        api.snapshots.start()
+
+    async def close_queries(app: web.Application):
+        await api.snapshots.stop()
+        await api.live_feed.stop()
+        await api.queries.close()
+
+    app.on_startup.append(start_snapshots)
+    app.on_cleanup.append(close_queries)
 
     return app
 
@@ -0,0 +1,147 @@
+"""
+Concurrent-client load test for the report API.
+
+Runs N concurrent clients against one or more endpoints for a fixed duration
+per concurrency level, while a separate probe polls /health. Reports
+throughput, latency percentiles and the /health latency under load (which
+shows whether slow queries block the event loop).
+
+Usage:
+    python report_api_loadtest.py --url http://localhost:8099 --concurrency 1,4,16
+    python report_api_loadtest.py --path /reports/today --path "/tools/device_events?days=30" --duration 20
+"""
+
+import os
+import time
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import aiohttp
+from dotenv import load_dotenv
+
+
+@dataclass
+class LevelResult:
+    """Measurements of one concurrency level."""
+    concurrency: int
+    duration: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    health_latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    @staticmethod
+    def _percentile(values: List[float], pct: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "concurrency": self.concurrency,
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "rps": round(len(self.latencies) / self.duration, 1) if self.duration else 0.0,
+            "p50_ms": round(self._percentile(self.latencies, 50) * 1000, 1),
+            "p95_ms": round(self._percentile(self.latencies, 95) * 1000, 1),
+            "max_ms": round(max(self.latencies, default=0.0) * 1000, 1),
+            "health_p95_ms": round(self._percentile(self.health_latencies, 95) * 1000, 1),
+        }
+
+
+async def _client(session: aiohttp.ClientSession, urls: List[str], deadline: float,
+                  offset: int, result: LevelResult):
+    index = offset
+    while time.perf_counter() < deadline:
+        url = urls[index % len(urls)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                if response.status >= 400:
+                    result.errors += 1
+                    continue
+        except aiohttp.ClientError:
+            result.errors += 1
+            continue
+        result.latencies.append(time.perf_counter() - started)
+
+
+async def _health_probe(session: aiohttp.ClientSession, url: str, deadline: float,
+                        result: LevelResult, interval: float = 0.1):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as response:
+                await response.read()
+            result.health_latencies.append(time.perf_counter() - started)
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(interval)
+
+
+async def run_level(base_url: str, paths: List[str], concurrency: int, duration: float,
+                    token: str = "") -> LevelResult:
+    """Run `concurrency` clients for `duration` seconds."""
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    urls = [base_url.rstrip("/") + path for path in paths]
+    result = LevelResult(concurrency=concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency + 1)
+    timeout = aiohttp.ClientTimeout(total=max(60.0, duration * 2))
+
+    async with aiohttp.ClientSession(headers=headers, connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(
+            _health_probe(session, base_url.rstrip("/") + "/health", deadline, result),
+            *(_client(session, urls, deadline, offset, result) for offset in range(concurrency))
+        )
+        result.duration = time.perf_counter() - started
+    return result
+
+
+def print_results(results: List[LevelResult]):
+    columns = ["concurrency", "requests", "errors", "rps", "p50_ms", "p95_ms", "max_ms", "health_p95_ms"]
+    print("  ".join(f"{name:>13}" for name in columns))
+    for result in results:
+        summary = result.summary()
+        print("  ".join(f"{summary[name]:>13}" for name in columns))
+    if results and results[0].latencies:
+        base = results[0].summary()["rps"]
+        best = max(results, key=lambda r: r.summary()["rps"]).summary()
+        if base:
+            print(f"\nThroughput scaling: {best['rps'] / base:.1f}x at concurrency {best['concurrency']}")
+
+
+async def main_async(args):
+    token = args.token if args.token is not None else os.getenv("REPORT_API_TOKEN", "")
+    results = []
+    for level in [int(value) for value in args.concurrency.split(",")]:
+        result = await run_level(args.url, args.path or ["/reports/today"], level, args.duration, token)
+        print(f"concurrency {level}: {result.summary()}")
+        results.append(result)
+    print()
+    print_results(results)
+
+
+def main():
+    """Entry point."""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Concurrent-client load test for the report API")
+    parser.add_argument("--url", default=os.getenv("REPORT_API_URL", "http://localhost:8099"),
+                        help="Report API base URL (default: REPORT_API_URL or http://localhost:8099)")
+    parser.add_argument("--path", action="append",
+                        help="Endpoint path incl. query string (repeatable, default: /reports/today)")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        help="Comma-separated concurrent client counts (default: 1,4,16)")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="Seconds per concurrency level (default: 10)")
+    parser.add_argument("--token", default=None, help="API token (default: REPORT_API_TOKEN)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Background-refreshed report snapshots for the report API.
+
+Common reports (today, solar, comparison, top devices) are recomputed in the
+background and served from memory. Reads are O(1) with
+stale-while-revalidate semantics:
+
+- a fresh snapshot is returned as is
+- a stale snapshot (older than `refresh_seconds`, or expired by new data) is
+  returned immediately and a background refresh is started
+- only the very first request for a snapshot waits for its computation
+
+Refreshes follow demand: the periodic pass (every `refresh_seconds`) only
+recomputes snapshots that were read since their last refresh, so unread
+periods cost nothing. When new data arrives (rollups written, backfill),
+`invalidate()` recomputes the snapshots in use right away and expires the
+others, which are then recomputed on their next read.
+
+A failed refresh keeps the previous snapshot. Every snapshot carries the time
+it was computed (`as_of`), which the API includes in its responses, and an
+ETag of its payload alone, so a refresh that produced the same data keeps the
+same ETag.
+
+Usage:
+    store = SnapshotStore()
+    store.register("today", build_today_report)    # async () -> dict
+    store.start()                                   # on app startup
+    snapshot = await store.get("today")             # snapshot.payload, snapshot.as_of, snapshot.etag
+    store.invalidate()                              # after new data arrived
+    await store.stop()
+"""
+
+import os
+import math
+import time
+import hashlib
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fast_json import dumps
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag of a serialized representation (truncated SHA-256)."""
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+@dataclass
+class Snapshot:
+    """A computed report, when it was computed and the ETag of its payload."""
+    payload: Any
+    as_of: datetime
+    computed_in: float
+    etag: str
+
+    def age(self) -> float:
+        return (datetime.now(timezone.utc) - self.as_of).total_seconds()
+
+
+class SnapshotStore:
+    """In-memory report snapshots with background refresh."""
+
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        """
+        Initialize the store.
+
+        Args:
+            refresh_seconds: Refresh interval and freshness limit
+                (env REPORT_SNAPSHOT_INTERVAL, default 60s)
+        """
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else \
+            float(os.getenv("REPORT_SNAPSHOT_INTERVAL", "60"))
+        self._builders: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._flights = SingleFlight()
+        self._background: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._counters: Dict[str, Dict[str, int]] = {}
+        # Monotonic times of the last read and the start of the last refresh
+        self._last_read: Dict[str, float] = {}
+        self._refresh_started: Dict[str, float] = {}
+        self._expired: Set[str] = set()
+
+    def register(self, name: str, build: Callable[[], Awaitable[Any]]):
+        """Register a snapshot and the coroutine function that builds its payload."""
+        self._builders[name] = build
+        self._counters[name] = {"served": 0, "stale_served": 0, "refreshes": 0, "skipped": 0, "errors": 0}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._builders
+
+    def _read_since_refresh(self, name: str) -> bool:
+        return self._last_read.get(name, -math.inf) >= self._refresh_started.get(name, -math.inf)
+
+    async def _build(self, name: str) -> Snapshot:
+        started = time.perf_counter()
+        self._refresh_started[name] = time.monotonic()
+        expired = name in self._expired
+        self._expired.discard(name)
+        try:
+            payload = await self._builders[name]()
+        except Exception as e:
+            if expired:
+                self._expired.add(name)
+            self._counters[name]["errors"] += 1
+            logger.error(f"Snapshot {name}: refresh failed: {e}")
+            raise
+        snapshot = Snapshot(
+            payload=payload,
+            as_of=datetime.now(timezone.utc),
+            computed_in=time.perf_counter() - started,
+            etag=content_etag(dumps(payload))
+        )
+        self._snapshots[name] = snapshot
+        self._counters[name]["refreshes"] += 1
+        logger.debug(f"Snapshot {name}: refreshed in {snapshot.computed_in * 1000:.0f} ms")
+        return snapshot
+
+    async def refresh(self, name: str) -> Snapshot:
+        """Recompute a snapshot (concurrent refreshes of the same snapshot are coalesced)."""
+        return await self._flights.do(name, lambda: self._build(name), name=name)
+
+    def refresh_in_background(self, name: str):
+        task = asyncio.ensure_future(self.refresh(name))
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled():
+            task.exception()  # logged in _build; the previous snapshot stays in place
+
+    def invalidate(self) -> Dict[str, List[str]]:
+        """
+        New data arrived: refresh the snapshots in use now, expire the others.
+
+        A snapshot is in use if it was read within the last two refresh
+        intervals. Expired snapshots are served once more and refreshed on
+        their next read.
+
+        Returns:
+            {"refreshing": [...], "expired": [...]} snapshot names
+        """
+        in_use_since = time.monotonic() - 2 * self.refresh_seconds
+        result: Dict[str, List[str]] = {"refreshing": [], "expired": []}
+        for name in self._builders:
+            if self._last_read.get(name, -math.inf) >= in_use_since:
+                self.refresh_in_background(name)
+                result["refreshing"].append(name)
+            elif name in self._snapshots:
+                self._expired.add(name)
+                result["expired"].append(name)
+        return result
+
+    async def get(self, name: str) -> Snapshot:
+        """
+        Current snapshot; stale ones are returned immediately and refreshed in the background.
+
+        Raises:
+            KeyError: Unknown snapshot name
+            Exception: The first computation of a snapshot failed
+        """
+        if name not in self._builders:
+            raise KeyError(name)
+        self._last_read[name] = time.monotonic()
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            snapshot = await self.refresh(name)
+        elif name in self._expired or snapshot.age() >= self.refresh_seconds:
+            self._counters[name]["stale_served"] += 1
+            self.refresh_in_background(name)
+        self._counters[name]["served"] += 1
+        return snapshot
+
+    async def _run(self):
+        warm_up = True
+        while True:
+            for name in list(self._builders):
+                # Snapshots nobody read since their last refresh wait for their next read
+                if not warm_up and not self._read_since_refresh(name):
+                    self._counters[name]["skipped"] += 1
+                    continue
+                try:
+                    await self.refresh(name)
+                except Exception:
+                    pass  # logged in _build
+            warm_up = False
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self):
+        """Start the periodic refresh (the first pass warms every snapshot, later ones only those read)."""
+        if self._loop_task is None:
+            self._loop_task = asyncio.ensure_future(self._run())
+            logger.info(f"Report snapshots: {len(self._builders)} registered, "
+                        f"refresh every {self.refresh_seconds:.0f}s")
+
+    async def stop(self):
+        """Stop the periodic and pending background refreshes."""
+        tasks = list(self._background) + ([self._loop_task] if self._loop_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-snapshot age, compute time and counters for metrics endpoints."""
+        result = {}
+        for name, counters in self._counters.items():
+            snapshot = self._snapshots.get(name)
+            result[name] = {
+                "as_of": snapshot.as_of.isoformat() if snapshot else None,
+                "age_seconds": round(snapshot.age(), 1) if snapshot else None,
+                "computed_in_ms": round(snapshot.computed_in * 1000, 1) if snapshot else None,
+                "expired": name in self._expired,
+                **counters
+            }
+        return result
@@ -5,6 +5,7 @@ This module provides decorators and utilities for retrying operations with expon
 special handling for authentication errors, and configurable retry policies.
 """
 
+import time
 import asyncio
 import functools
 import logging
@@ -237,3 +238,70 @@ async def retry_async_operation(
     # If all retries exhausted, raise the last exception
     if last_exception:
         raise last_exception
+
+
+def retry_operation(
+    operation: Callable,
+    policy: Optional[RetryPolicy] = None,
+    operation_name: str = "operation"
+) -> Any:
+    """
+    Retry a sync operation with the given policy.
+
+    Args:
+        operation: Callable to retry
+        policy: RetryPolicy configuration (uses default if None)
+        operation_name: Name for logging purposes
+
+    Returns:
+        Result of the operation
+
+    Raises:
+        Last exception if all retries exhausted
+
+    Example:
+        retry_operation(
+            lambda: write_api.write(bucket=bucket, record=points),
+            policy=RetryPolicy(max_retries=5),
+            operation_name="write_events"
+        )
+    """
+    if policy is None:
+        policy = RetryPolicy()
+
+    retry_count = 0
+    last_exception = None
+
+    while retry_count <= policy.max_retries:
+        try:
+            return operation()
+        except Exception as e:
+            last_exception = e
+
+            # Check for authentication errors
+            if policy.raise_on_auth_error and is_authentication_error(e):
+                logger.error(f"Authentication error in {operation_name}: {e}")
+                raise
+
+            retry_count += 1
+            if retry_count > policy.max_retries:
+                logger.error(
+                    f"Failed {operation_name} after {policy.max_retries} retries: {e}"
+                )
+                break
+
+            # Calculate delay with exponential backoff
+            delay = min(
+                policy.initial_delay * (policy.exponential_base ** (retry_count - 1)),
+                policy.max_delay
+            )
+            logger.warning(
+                f"Retry {retry_count}/{policy.max_retries} for {operation_name} "
+                f"after {delay}s delay. Error: {e}"
+            )
+
+            time.sleep(delay)
+
+    # If all retries exhausted, raise the last exception
+    if last_exception:
+        raise last_exception
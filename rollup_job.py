@@ -0,0 +1,472 @@
+"""
+Hourly and daily power rollups for MyTapo.
+
+Reports over weeks or years used to scan raw 15s points (a yearly report
+touches ~25 million rows). This job materializes per-device rollups:
+
+- `power_hourly` bucket, measurement `power_hourly`, one point per device and
+  hour (timestamped at the hour start): mean_w, energy_wh (time integral),
+  samples, min_w, max_w
+- `consumption_daily` bucket, measurement `power_daily`, one point per device
+  and UTC day built from the hourly rollups (same fields plus hours)
+
+A `rollup_status` point in the hourly bucket records the covered range
+(`covered_from` / `complete_until`, epoch seconds); readers only use rollups
+inside it. Every run catches up from `complete_until` to the last closed hour
+and recomputes the most recent `late_hours` hours so late samples are folded
+in. Points are keyed by device and window start, so recomputing overwrites.
+
+Readers (see query_planner.py) combine rollup rows with sample weights, so
+the mean over any hour-aligned window equals the raw mean() over the same
+points.
+
+Usage:
+    python rollup_job.py                       # catch up (first run: ROLLUP_BACKFILL_DAYS)
+    python rollup_job.py --recompute 2026-03-01 2026-03-08
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+import pandas as pd
+from dotenv import load_dotenv
+from influxdb_client import InfluxDBClient
+
+from influx_batch_writer import InfluxBatchWriter
+from influx_stream import read_frame
+from retry_manager import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_FIELDS = ["mean_w", "energy_wh", "samples", "min_w", "max_w"]
+COUNT_FIELDS = {"samples", "hours"}
+HOURLY_MEASUREMENT = "power_hourly"
+DAILY_MEASUREMENT = "power_daily"
+STATUS_MEASUREMENT = "rollup_status"
+
+FLUX_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def to_utc(timestamp: datetime) -> datetime:
+    """Treat naive datetimes as UTC."""
+    return timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)
+
+
+def floor_hour(timestamp: datetime) -> datetime:
+    return to_utc(timestamp).replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(timestamp: datetime) -> datetime:
+    return to_utc(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def query_rollup_status(client: InfluxDBClient, hourly_bucket: str) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Range covered by the hourly rollups.
+
+    Returns:
+        Tuple of (covered_from, complete_until) as aware UTC datetimes, or None
+    """
+    query = f'''
+    from(bucket: "{hourly_bucket}")
+        |> range(start: 0)
+        |> filter(fn: (r) => r["_measurement"] == "{STATUS_MEASUREMENT}")
+        |> last()
+        |> keep(columns: ["_field", "_value"])
+    '''
+    values = {}
+    for table in client.query_api().query(query):
+        for record in table.records:
+            values[record.get_field()] = record.get_value()
+    if "covered_from" not in values or "complete_until" not in values:
+        return None
+    return (
+        datetime.fromtimestamp(int(values["covered_from"]), timezone.utc),
+        datetime.fromtimestamp(int(values["complete_until"]), timezone.utc)
+    )
+
+
+def query_hourly_rollups(
+    client: InfluxDBClient,
+    hourly_bucket: str,
+    start: datetime,
+    end: datetime,
+    device_filter: str = ""
+) -> pd.DataFrame:
+    """
+    Hourly rollup rows in [start, end) (hour-aligned), one row per device and hour.
+
+    Args:
+        client: InfluxDB client
+        hourly_bucket: Bucket holding the hourly rollups
+        start: Range start
+        end: Range end
+        device_filter: Optional additional Flux filter line
+
+    Returns:
+        DataFrame with _time (hour start), device and the rollup fields
+    """
+    query = f'''
+    from(bucket: "{hourly_bucket}")
+        |> range(start: {to_utc(start).strftime(FLUX_TIME_FORMAT)}, stop: {to_utc(end).strftime(FLUX_TIME_FORMAT)})
+        |> filter(fn: (r) => r["_measurement"] == "{HOURLY_MEASUREMENT}")
+        {device_filter}
+        |> pivot(rowKey: ["_time"], columnKey: ["_field"], valueColumn: "_value")
+        |> group()
+        |> keep(columns: ["_time", "device", {", ".join(f'"{name}"' for name in ROLLUP_FIELDS)}])
+    '''
+    return read_frame(
+        client, query, ["_time", "device"] + ROLLUP_FIELDS,
+        {name: "float64" for name in ROLLUP_FIELDS}
+    )
+
+
+def query_window_stats(
+    client: InfluxDBClient,
+    source_bucket: str,
+    start: datetime,
+    end: datetime,
+    every: str = "1h",
+    device_filter: str = ""
+) -> pd.DataFrame:
+    """
+    Aggregate raw samples in [start, end) into one row per device and window.
+
+    Args:
+        client: InfluxDB client
+        source_bucket: Raw power_consumption bucket
+        start: Range start
+        end: Range end
+        every: Flux window duration (e.g. "1h", "5m")
+        device_filter: Optional additional Flux filter line
+
+    Returns:
+        DataFrame with _time (window start), device and the rollup fields
+    """
+    def stat(fn: str, name: str) -> str:
+        return f'''data
+        |> aggregateWindow(every: {every}, fn: {fn}, timeSrc: "_start", createEmpty: false)
+        |> toFloat()
+        |> set(key: "stat", value: "{name}")'''
+
+    query = f'''
+    data = from(bucket: "{source_bucket}")
+        |> range(start: {to_utc(start).strftime(FLUX_TIME_FORMAT)}, stop: {to_utc(end).strftime(FLUX_TIME_FORMAT)})
+        |> filter(fn: (r) => r["_measurement"] == "power_consumption")
+        |> filter(fn: (r) => r["_field"] == "power")
+        {device_filter}
+        |> keep(columns: ["_start", "_stop", "_time", "_value", "device"])
+        |> toFloat()
+        |> group(columns: ["device"])
+
+    union(tables: [
+        {stat("mean", "mean_w")},
+        {stat("(column, tables=<-) => tables |> integral(unit: 1h, column: column)", "energy_wh")},
+        {stat("count", "samples")},
+        {stat("min", "min_w")},
+        {stat("max", "max_w")}
+    ])
+        |> group()
+        |> pivot(rowKey: ["_time", "device"], columnKey: ["stat"], valueColumn: "_value")
+        |> keep(columns: ["_time", "device", {", ".join(f'"{name}"' for name in ROLLUP_FIELDS)}])
+    '''
+    frame = read_frame(
+        client, query, ["_time", "device"] + ROLLUP_FIELDS,
+        {name: "float64" for name in ROLLUP_FIELDS}
+    )
+    return frame.dropna(subset=["_time", "device", "mean_w"])
+
+
+def combine_rollups(rows: pd.DataFrame, every: pd.Timedelta) -> pd.DataFrame:
+    """
+    Combine rollup rows into coarser epoch-aligned windows (e.g. hours into days).
+
+    Means are weighted by sample counts, so the result equals aggregating the
+    raw samples of each window directly.
+
+    Args:
+        rows: Rollup rows with _time, device and the rollup fields
+        every: Target window length (a multiple of the row interval)
+
+    Returns:
+        DataFrame with _time (window start), device, the rollup fields and
+        hours (number of combined rows)
+    """
+    rows = rows[rows["samples"] > 0]
+    rows = rows.assign(
+        window=rows["_time"].dt.floor(every),
+        weighted=rows["mean_w"] * rows["samples"]
+    )
+    grouped = rows.groupby(["window", "device"])
+    combined = pd.DataFrame({
+        "weighted": grouped["weighted"].sum(),
+        "energy_wh": grouped["energy_wh"].sum(),
+        "samples": grouped["samples"].sum(),
+        "min_w": grouped["min_w"].min(),
+        "max_w": grouped["max_w"].max(),
+        "hours": grouped["samples"].count()
+    }).reset_index()
+    combined["mean_w"] = combined["weighted"] / combined["samples"]
+    return combined.drop(columns="weighted").rename(columns={"window": "_time"})
+
+
+class RollupCoverage:
+    """
+    Cached view of the range covered by the hourly rollups.
+
+    Usage:
+        coverage = RollupCoverage("power_hourly")
+        covered_from, complete_until = coverage.status(client) or (None, None)
+    """
+
+    def __init__(self, hourly_bucket: str, refresh_seconds: float = 300):
+        """
+        Initialize the coverage view.
+
+        Args:
+            hourly_bucket: Bucket holding the hourly rollups and their status
+            refresh_seconds: How long a fetched status is reused
+        """
+        self.hourly_bucket = hourly_bucket
+        self.refresh_seconds = refresh_seconds
+        self._status: Optional[Tuple[datetime, datetime]] = None
+        self._fetched_at: Optional[datetime] = None
+
+    def status(self, client: InfluxDBClient) -> Optional[Tuple[datetime, datetime]]:
+        """(covered_from, complete_until), refreshed every refresh_seconds."""
+        now = datetime.now(timezone.utc)
+        if self._fetched_at is None or (now - self._fetched_at).total_seconds() >= self.refresh_seconds:
+            try:
+                self._status = query_rollup_status(client, self.hourly_bucket)
+            except Exception as e:
+                logger.debug(f"Rollup status unavailable: {e}")
+                self._status = None
+            self._fetched_at = now
+        return self._status
+
+    def cached(self) -> Optional[Tuple[datetime, datetime]]:
+        """Last fetched status without querying (None before the first fetch)."""
+        return self._status
+
+
+class RollupJob:
+    """
+    Maintains the hourly and daily rollups with catch-up and late-data recompute.
+
+    Usage:
+        job = RollupJob()
+        job.run_once()                         # periodic (e.g. hourly)
+        job.recompute(start, end)              # after raw data was rewritten
+    """
+
+    def __init__(
+        self,
+        late_hours: Optional[int] = None,
+        backfill_days: Optional[int] = None,
+        chunk_hours: int = 24 * 7
+    ):
+        """
+        Initialize the rollup job.
+
+        Args:
+            late_hours: Closed hours recomputed on every run (env ROLLUP_LATE_HOURS, default 3)
+            backfill_days: History rolled up on the first run (env ROLLUP_BACKFILL_DAYS, default 365)
+            chunk_hours: Hours aggregated per query during catch-up
+        """
+        self.influx_host = os.getenv("INFLUXDB_HOST", "192.168.178.114")
+        self.influx_port = os.getenv("INFLUXDB_PORT", "8088")
+        self.influx_url = f"http://{self.influx_host}:{self.influx_port}"
+        self.influx_token = os.getenv("INFLUXDB_TOKEN")
+        self.influx_org = "None"
+        self.source_bucket = os.getenv("INFLUXDB_BUCKET", "power_consumption")
+        self.hourly_bucket = os.getenv("INFLUXDB_HOURLY_BUCKET", "power_hourly")
+        self.daily_bucket = os.getenv("INFLUXDB_CONSUMPTION_BUCKET", "consumption_daily")
+
+        self.late_hours = late_hours if late_hours is not None else \
+            int(os.getenv("ROLLUP_LATE_HOURS", "3"))
+        self.backfill_days = backfill_days if backfill_days is not None else \
+            int(os.getenv("ROLLUP_BACKFILL_DAYS", "365"))
+        self.chunk_hours = chunk_hours
+        self.write_retry = RetryPolicy(max_retries=3, max_delay=30, raise_on_auth_error=False)
+
+    def _get_client(self) -> InfluxDBClient:
+        """Create InfluxDB client."""
+        return InfluxDBClient(
+            url=self.influx_url,
+            token=self.influx_token,
+            org=self.influx_org
+        )
+
+    def ensure_bucket(self):
+        """Create the hourly bucket if it does not exist yet (best effort)."""
+        try:
+            with self._get_client() as client:
+                buckets_api = client.buckets_api()
+                if buckets_api.find_bucket_by_name(self.hourly_bucket):
+                    return
+                orgs = client.organizations_api().find_organizations()
+                if not orgs:
+                    logger.warning(f"Cannot create bucket {self.hourly_bucket}: no organization visible")
+                    return
+                buckets_api.create_bucket(bucket_name=self.hourly_bucket, org_id=orgs[0].id)
+                logger.info(f"Created bucket {self.hourly_bucket}")
+        except Exception as e:
+            logger.warning(f"Could not ensure bucket {self.hourly_bucket}: {e}")
+
+    def _aggregate_hours(self, client: InfluxDBClient, start: datetime, end: datetime) -> pd.DataFrame:
+        """Aggregate raw samples in [start, end) into one row per device and hour."""
+        return query_window_stats(client, self.source_bucket, start, end, every="1h")
+
+    def _write_rows(self, rows: pd.DataFrame, bucket: str, measurement: str, fields: List[str]) -> bool:
+        """Write rollup rows (one point per device and window_start)."""
+        writer = InfluxBatchWriter(influx_bucket=bucket)
+        for row in rows.to_dict("records"):
+            row_fields = {
+                name: int(row[name]) if name in COUNT_FIELDS else float(row[name])
+                for name in fields
+            }
+            writer.add_custom_measurement(
+                measurement, {"device": str(row["device"])}, row_fields,
+                row["window_start"].to_pydatetime()
+            )
+        return writer.flush_sync(self.write_retry)
+
+    def _write_status(self, covered_from: datetime, complete_until: datetime) -> bool:
+        writer = InfluxBatchWriter(influx_bucket=self.hourly_bucket)
+        writer.add_custom_measurement(
+            STATUS_MEASUREMENT, {"job": "rollup"},
+            {
+                "covered_from": int(covered_from.timestamp()),
+                "complete_until": int(complete_until.timestamp())
+            },
+            datetime.now(timezone.utc)
+        )
+        return writer.flush_sync(self.write_retry)
+
+    def _rollup_hours(self, client: InfluxDBClient, start: datetime, end: datetime) -> int:
+        """Recompute hourly rollups in [start, end) chunk by chunk."""
+        written = 0
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = min(chunk_start + timedelta(hours=self.chunk_hours), end)
+            rows = self._aggregate_hours(client, chunk_start, chunk_end)
+            if not rows.empty:
+                rows = rows.rename(columns={"_time": "window_start"})
+                if not self._write_rows(rows, self.hourly_bucket, HOURLY_MEASUREMENT, ROLLUP_FIELDS):
+                    raise RuntimeError(f"Failed to write hourly rollups for {chunk_start:%Y-%m-%d %H:%M}")
+            written += len(rows)
+            logger.info(f"Hourly rollups {chunk_start:%Y-%m-%d %H:%M} - {chunk_end:%Y-%m-%d %H:%M}: "
+                        f"{len(rows)} rows")
+            chunk_start = chunk_end
+        return written
+
+    def _rollup_days(self, client: InfluxDBClient, start: datetime, end: datetime) -> int:
+        """Recompute daily rollups for the complete days in [start, end) from the hourly rollups."""
+        start, end = floor_day(start), floor_day(end)
+        if start >= end:
+            return 0
+
+        hourly = query_hourly_rollups(client, self.hourly_bucket, start, end)
+        hourly = hourly[hourly["samples"] > 0]
+        if hourly.empty:
+            return 0
+
+        daily = combine_rollups(hourly, pd.Timedelta(days=1)).rename(columns={"_time": "window_start"})
+
+        if not self._write_rows(daily, self.daily_bucket, DAILY_MEASUREMENT, ROLLUP_FIELDS + ["hours"]):
+            raise RuntimeError(f"Failed to write daily rollups for {start:%Y-%m-%d} - {end:%Y-%m-%d}")
+        logger.info(f"Daily rollups {start:%Y-%m-%d} - {end:%Y-%m-%d}: {len(daily)} rows")
+        return len(daily)
+
+    def recompute(self, start: datetime, end: datetime) -> int:
+        """
+        Recompute hourly rollups for [start, end) and the daily rollups of the touched days.
+
+        Use after raw data in the range was rewritten. Ranges are widened to
+        whole hours, and capped at the last closed hour.
+
+        Returns:
+            Number of hourly rows written
+        """
+        last_closed = floor_hour(datetime.now(timezone.utc))
+        start = floor_hour(start)
+        end = min(floor_hour(to_utc(end) + timedelta(minutes=59, seconds=59)), last_closed)
+        if start >= end:
+            return 0
+
+        with self._get_client() as client:
+            status = query_rollup_status(client, self.hourly_bucket)
+            written = self._rollup_hours(client, start, end)
+            # Only complete days get a daily rollup
+            self._rollup_days(client, start, min(floor_day(end) + timedelta(days=1), last_closed))
+
+        if status:
+            covered_from, complete_until = status
+            # Only extend coverage across ranges that connect to it
+            if end >= covered_from and start <= complete_until:
+                self._write_status(min(covered_from, start), max(complete_until, end))
+        else:
+            self._write_status(start, end)
+        return written
+
+    def run_once(self) -> int:
+        """
+        Catch up to the last closed hour and recompute the late-data window.
+
+        Returns:
+            Number of hourly rows written
+        """
+        last_closed = floor_hour(datetime.now(timezone.utc))
+
+        with self._get_client() as client:
+            status = query_rollup_status(client, self.hourly_bucket)
+
+        if status:
+            covered_from, complete_until = status
+            start = min(complete_until, last_closed - timedelta(hours=self.late_hours))
+        else:
+            covered_from = floor_day(last_closed - timedelta(days=self.backfill_days))
+            start = covered_from
+            logger.info(f"No rollups yet, rolling up {self.backfill_days} days of history")
+
+        if start >= last_closed:
+            return 0
+
+        with self._get_client() as client:
+            written = self._rollup_hours(client, start, last_closed)
+            # Daily rollups for every complete day touched by the recomputed hours
+            self._rollup_days(client, start, last_closed)
+
+        self._write_status(covered_from, last_closed)
+        logger.info(f"Rollups complete until {last_closed:%Y-%m-%d %H:%M} UTC ({written} hourly rows)")
+        return written
+
+
+def main():
+    """Entry point."""
+    import argparse
+
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description="Maintain hourly/daily power rollups")
+    parser.add_argument("--recompute", nargs=2, metavar=("START", "END"),
+                        help="Recompute rollups for an ISO date/datetime range (UTC)")
+    args = parser.parse_args()
+
+    job = RollupJob()
+    job.ensure_bucket()
+    if args.recompute:
+        start, end = (datetime.fromisoformat(value) for value in args.recompute)
+        job.recompute(start, end)
+    else:
+        job.run_once()
+
+
+if __name__ == "__main__":
+    main()
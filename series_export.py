@@ -0,0 +1,338 @@
+"""
+Streaming time-series export for the report API.
+
+Exports raw power samples or per-window aggregates for any range without
+materializing the result: the range is processed in UTC-day chunks, each
+chunk is read from the fastest source that has it and encoded right away.
+
+- raw (no `every`): closed days from the local Parquet mirror (see
+  power_mirror.py) when present, the rest streamed from InfluxDB
+- `every` a multiple of 1h: hourly rollups (see rollup_job.py) inside their
+  covered range, combined into coarser windows if needed
+- any other `every`: aggregateWindow over the raw samples in InfluxDB
+
+Only one chunk is held at a time, so memory stays constant regardless of the
+range size. Rows are ordered by chunk, then device, then time.
+
+Output columns:
+    raw:        time, device, power
+    aggregated: time, device, mean_w, energy_wh, samples, min_w, max_w
+
+Chart series reuse the same sources: a device's raw samples are collected as
+NumPy arrays and reduced to a point budget (see downsampling.py).
+
+Usage:
+    export = SeriesExport(InfluxQueries())
+    for data in export.stream(start, end, devices=["kaffe_bar"], every=None, fmt="ndjson"):
+        sink.write(data)
+
+    chart = export.chart_series("kaffe_bar", start, end, points=500)
+"""
+
+import io
+import re
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from downsampling import downsample
+from influx_queries import InfluxQueries
+from influx_stream import iter_frames
+from power_mirror import PowerMirror
+from rollup_job import (
+    ROLLUP_FIELDS, combine_rollups, floor_day, query_hourly_rollups, query_window_stats, to_utc
+)
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+RAW_SCHEMA = pa.schema([
+    ("time", pa.timestamp("ns", tz="UTC")),
+    ("device", pa.string()),
+    ("power", pa.float64()),
+])
+
+AGGREGATE_SCHEMA = pa.schema(
+    [("time", pa.timestamp("ns", tz="UTC")), ("device", pa.string())]
+    + [(name, pa.int64() if name == "samples" else pa.float64()) for name in ROLLUP_FIELDS]
+)
+
+DEVICE_PATTERN = re.compile(r"^[\w.\- ]+$")
+EVERY_PATTERN = re.compile(r"^(\d+)([smhd])$")
+EVERY_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+CSV_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def parse_every(value: Optional[str]) -> Optional[pd.Timedelta]:
+    """
+    Parse the aggregation window (e.g. "15s", "5m", "1h", "1d").
+
+    Returns:
+        Window length, or None for raw samples ("" or "raw")
+
+    Raises:
+        ValueError: Unknown format or a window that does not divide a day
+    """
+    if not value or value == "raw":
+        return None
+    match = EVERY_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid every '{value}' (expected e.g. 15s, 5m, 1h, 1d or raw)")
+    seconds = int(match.group(1)) * EVERY_UNITS[match.group(2)]
+    # Windows must not straddle the day chunks
+    if seconds <= 0 or 86400 % seconds:
+        raise ValueError(f"Invalid every '{value}' (must evenly divide one day)")
+    return pd.Timedelta(seconds=seconds)
+
+
+def parse_devices(value: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated device list.
+
+    Raises:
+        ValueError: A device name contains characters outside [A-Za-z0-9_.- ]
+    """
+    if not value:
+        return None
+    devices = [name.strip() for name in value.split(",") if name.strip()]
+    for name in devices:
+        if not DEVICE_PATTERN.match(name):
+            raise ValueError(f"Invalid device name '{name}'")
+    return devices or None
+
+
+class SeriesEncoder:
+    """Encodes DataFrame chunks of a fixed schema as NDJSON, CSV or an Arrow IPC stream."""
+
+    def __init__(self, fmt: str, schema: pa.Schema):
+        if fmt not in FORMATS:
+            raise ValueError(f"Invalid format '{fmt}' (expected one of {', '.join(FORMATS)})")
+        self.fmt = fmt
+        self.schema = schema
+        self._header_written = False
+        self._sink = io.BytesIO()
+        self._writer = pa.ipc.new_stream(self._sink, schema) if fmt == "arrow" else None
+
+    def _drain(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def encode(self, frame: pd.DataFrame) -> bytes:
+        """Encode one chunk (columns in schema order)."""
+        if self.fmt == "arrow":
+            self._writer.write_table(pa.Table.from_pandas(frame, schema=self.schema, preserve_index=False))
+            return self._drain()
+        if self.fmt == "csv":
+            header = not self._header_written
+            self._header_written = True
+            return frame.to_csv(
+                index=False, header=header, date_format=CSV_TIME_FORMAT, lineterminator="\n"
+            ).encode()
+        if frame.empty:
+            return b""
+        return frame.to_json(orient="records", lines=True, date_format="iso", date_unit="s").encode()
+
+    def finish(self) -> bytes:
+        """Trailing bytes (CSV header of an empty export, Arrow end-of-stream marker)."""
+        if self.fmt == "arrow":
+            self._writer.close()
+            return self._drain()
+        if self.fmt == "csv" and not self._header_written:
+            self._header_written = True
+            return (",".join(self.schema.names) + "\n").encode()
+        return b""
+
+
+class SeriesExport:
+    """Chunked raw/aggregated power series from the mirror, rollups and InfluxDB."""
+
+    def __init__(self, queries: InfluxQueries, mirror: Optional[PowerMirror] = None,
+                 chunk_rows: int = 50_000):
+        """
+        Initialize the export.
+
+        Args:
+            queries: InfluxQueries providing client, buckets and rollup coverage
+            mirror: Local Parquet mirror (default: POWER_MIRROR_DIR)
+            chunk_rows: Rows decoded per InfluxDB parser chunk
+        """
+        self.queries = queries
+        self.mirror = mirror or PowerMirror()
+        self.chunk_rows = chunk_rows
+
+    @staticmethod
+    def _device_filter(devices: Optional[List[str]]) -> str:
+        if not devices:
+            return ""
+        names = ", ".join(f'"{name}"' for name in devices)
+        return f'|> filter(fn: (r) => contains(value: r["device"], set: [{names}]))'
+
+    def _raw_influx(self, client, start: datetime, end: datetime,
+                    devices: Optional[List[str]]) -> Iterator[pd.DataFrame]:
+        query = f'''
+        from(bucket: "{self.queries.power_bucket}")
+            |> range(start: {start.strftime(CSV_TIME_FORMAT)}, stop: {end.strftime(CSV_TIME_FORMAT)})
+            |> filter(fn: (r) => r["_measurement"] == "power_consumption")
+            |> filter(fn: (r) => r["_field"] == "power")
+            {self._device_filter(devices)}
+            |> keep(columns: ["_time", "device", "_value"])
+            |> toFloat()
+        '''
+        for frame in iter_frames(client, query, ["_time", "device", "_value"],
+                                 {"_value": "float64"}, self.chunk_rows):
+            frame = frame.dropna(subset=["_time", "device", "_value"])
+            yield frame.rename(columns={"_time": "time", "_value": "power"})[RAW_SCHEMA.names]
+
+    def _raw_mirror(self, start: datetime, end: datetime, devices: Optional[List[str]]) -> pd.DataFrame:
+        frame = self.mirror.read(start, end, devices=devices)
+        frame["device"] = frame["device"].astype(str)
+        frame["power"] = frame["power"].astype("float64")
+        return frame[RAW_SCHEMA.names]
+
+    def _aggregated(self, client, start: datetime, end: datetime, every: pd.Timedelta,
+                    devices: Optional[List[str]], coverage: Optional[tuple]) -> pd.DataFrame:
+        device_filter = self._device_filter(devices)
+        from_rollups = (
+            coverage is not None and every % pd.Timedelta(hours=1) == pd.Timedelta(0)
+            and coverage[0] <= start and end <= coverage[1]
+        )
+        if from_rollups:
+            rows = query_hourly_rollups(client, self.queries.hourly_bucket, start, end, device_filter)
+            rows = rows.dropna(subset=["_time", "device", "mean_w"])
+            if every > pd.Timedelta(hours=1) and not rows.empty:
+                rows = combine_rollups(rows, every)
+        else:
+            rows = query_window_stats(
+                client, self.queries.power_bucket, start, end,
+                f"{int(every.total_seconds())}s", device_filter
+            )
+        rows = rows.rename(columns={"_time": "time"}).sort_values(["device", "time"], kind="stable")
+        rows["device"] = rows["device"].astype(str)
+        rows["samples"] = rows["samples"].astype("int64")
+        return rows[AGGREGATE_SCHEMA.names]
+
+    def frames(self, start: datetime, end: datetime, devices: Optional[List[str]] = None,
+               every: Optional[pd.Timedelta] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield the series in [start, end) chunk by chunk.
+
+        Args:
+            start: Range start (naive = UTC; floored to `every` when aggregating)
+            end: Range end, exclusive (naive = UTC; ceiled to `every` when aggregating)
+            devices: Devices to include (default: all)
+            every: Aggregation window, None for raw samples
+
+        Yields:
+            DataFrames with the RAW_SCHEMA or AGGREGATE_SCHEMA columns
+        """
+        start, end = to_utc(start), to_utc(end)
+        if every is not None:
+            start = pd.Timestamp(start).floor(every).to_pydatetime()
+            end = pd.Timestamp(end).ceil(every).to_pydatetime()
+        # Hourly and coarser windows have few rows per day, fetch them a week at a time
+        span = timedelta(days=7) if every is not None and every >= pd.Timedelta(hours=1) else timedelta(days=1)
+
+        with self.queries._get_client() as client:
+            mirrored_until = self.mirror.covered_until(start, end) if every is None else start
+            coverage = self.queries.planner.coverage.status(client) if every is not None else None
+
+            # Split chunks at the (window-aligned) rollup coverage bounds
+            bounds = []
+            if coverage is not None:
+                bounds = [pd.Timestamp(coverage[0]).ceil(every).to_pydatetime(),
+                          pd.Timestamp(coverage[1]).floor(every).to_pydatetime()]
+
+            cursor = start
+            while cursor < end:
+                chunk_end = min([floor_day(cursor) + span, end] + [bound for bound in bounds if bound > cursor])
+                if every is not None:
+                    yield self._aggregated(client, cursor, chunk_end, every, devices, coverage)
+                elif chunk_end <= mirrored_until:
+                    yield self._raw_mirror(cursor, chunk_end, devices)
+                else:
+                    yield from self._raw_influx(client, cursor, chunk_end, devices)
+                cursor = chunk_end
+
+    def stream(self, start: datetime, end: datetime, devices: Optional[List[str]] = None,
+               every: Optional[pd.Timedelta] = None, fmt: str = "ndjson") -> Iterator[bytes]:
+        """
+        Yield the encoded export chunk by chunk (empty chunks are skipped).
+
+        Raises:
+            ValueError: Unknown format
+        """
+        encoder = SeriesEncoder(fmt, RAW_SCHEMA if every is None else AGGREGATE_SCHEMA)
+        rows = 0
+        for frame in self.frames(start, end, devices, every):
+            rows += len(frame)
+            data = encoder.encode(frame)
+            if data:
+                yield data
+        data = encoder.finish()
+        if data:
+            yield data
+        logger.info(f"Series export {start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M} "
+                    f"({every or 'raw'}, {fmt}): {rows:,} rows")
+
+    def read_arrays(self, device: str, start: datetime, end: datetime) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        One device's raw samples in [start, end) as kernel arrays.
+
+        Returns:
+            Tuple of (int64 epoch seconds, float32 watts), time-ordered
+        """
+        times, powers = [], []
+        for frame in self.frames(start, end, [device]):
+            times.append(frame["time"].to_numpy(dtype="datetime64[s]").astype(np.int64))
+            powers.append(frame["power"].to_numpy(dtype=np.float32))
+        if not times:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        seconds, watts = np.concatenate(times), np.concatenate(powers)
+        if len(seconds) > 1 and (np.diff(seconds) < 0).any():
+            order = np.argsort(seconds, kind="stable")
+            seconds, watts = seconds[order], watts[order]
+        return seconds, watts
+
+    def chart_series(self, device: str, start: datetime, end: datetime,
+                     points: int = 500, method: str = "lttb") -> Dict[str, Any]:
+        """
+        A device's raw series in [start, end) reduced to a point budget.
+
+        Args:
+            device: Exact device name
+            start: Range start (naive = UTC)
+            end: Range end, exclusive (naive = UTC)
+            points: Point budget
+            method: "lttb" or "minmax" (see downsampling.py)
+
+        Returns:
+            Dict with period, method, source and returned point counts and
+            series as [ISO time, watts] pairs
+
+        Raises:
+            ValueError: Unknown method or a budget too small for it
+        """
+        seconds, watts = self.read_arrays(device, start, end)
+        indices = downsample(seconds, watts, points, method)
+        times = pd.to_datetime(seconds[indices], unit="s", utc=True).strftime(CSV_TIME_FORMAT)
+        return {
+            "device": device,
+            "period": {"start": start.isoformat(), "end": end.isoformat()},
+            "method": method,
+            "source_points": int(len(seconds)),
+            "points": int(len(indices)),
+            "series": [[time, round(float(value), 1)] for time, value in zip(times, watts[indices])]
+        }
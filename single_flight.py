@@ -0,0 +1,75 @@
+"""
+Single-flight coalescing of concurrent identical computations.
+
+When several callers ask for the same key while a computation for it is
+still running, they all await that one computation instead of starting
+their own. Nothing is cached: once the computation finishes, the next call
+starts a new one (result caching is the job of QueryCache).
+
+The computation runs as its own task, so a caller that goes away (e.g. a
+disconnected HTTP client) does not cancel it for the remaining waiters.
+
+Usage:
+    flights = SingleFlight()
+    result = await flights.do(("GET", "/reports/today"), lambda: compute())
+    flights.stats()   # {"calls": 10, "executions": 4, "coalesced": 6, ...}
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight computation."""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self._coalesced_by_name: Dict[str, int] = {}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[Any]], name: str = "") -> Any:
+        """
+        Return the result of compute(), shared with concurrent calls for the same key.
+
+        Args:
+            key: Identity of the computation
+            compute: Coroutine factory, only called if nothing is in flight for key
+            name: Label for the per-name coalescing counter (e.g. the endpoint)
+
+        Returns:
+            Result of the (possibly shared) computation; exceptions propagate to all waiters
+        """
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.coalesced += 1
+            if name:
+                self._coalesced_by_name[name] = self._coalesced_by_name.get(name, 0) + 1
+            logger.debug(f"Coalesced {name or key} onto in-flight computation")
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        # Mark the exception as retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for metrics endpoints."""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "coalesced_by_endpoint": dict(self._coalesced_by_name)
+        }
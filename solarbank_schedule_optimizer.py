@@ -12,9 +12,12 @@ These time windows are boosted in the final profile.
 
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import pandas as pd
 from dotenv import load_dotenv
 from influxdb_client import InfluxDBClient
+from influx_stream import read_frame
+from power_mirror import PowerMirror
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
@@ -137,16 +140,46 @@ def query_half_hourly_profile(days=ANALYSIS_DAYS):
     return dict(sorted(profile.items()))
 
 
+def _mirror_half_hourly_means(mirror, start, end):
+    """
+    30-min means per device from the local Parquet mirror.
+
+    Windows are labelled with their stop time like Flux aggregateWindow().
+    """
+    samples = mirror.read(start, end)
+    samples = samples[~samples["device"].isin(EXCLUDE_DEVICES)]
+    if samples.empty:
+        return pd.DataFrame(columns=["_time", "device", "_value"])
+
+    windows = samples.assign(
+        _time=samples["time"].dt.floor("30min") + pd.Timedelta(minutes=30),
+        device=samples["device"].astype(str)
+    )
+    means = windows.groupby(["_time", "device"], sort=False)["power"].mean()
+    return means.rename("_value").reset_index()
+
+
 def query_half_hourly_profile_fallback(days=ANALYSIS_DAYS):
     """
     Fallback query: fetch 30-min aggregated data per device and compute
     slot averages in Python.
 
+    Days covered by the local Parquet mirror are aggregated from disk; only
+    the remaining days are queried from InfluxDB.
+
     Returns:
         dict: {slot_index (0-47): average_watts (sum across devices)}
     """
     bucket = os.getenv("INFLUXDB_BUCKET", "power_consumption")
-    start_time = f"-{days}d"
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=days)
+
+    mirror = PowerMirror()
+    mirrored_until = mirror.covered_until(start, end)
+    frames = []
+    if mirrored_until > start:
+        logger.info(f"Fallback: aggregating mirrored data until {mirrored_until:%Y-%m-%d}...")
+        frames.append(_mirror_half_hourly_means(mirror, start, mirrored_until))
 
     exclude_filter = " and ".join(
         f'r["device"] != "{dev}"' for dev in EXCLUDE_DEVICES
@@ -154,59 +187,47 @@ def query_half_hourly_profile_fallback(days=ANALYSIS_DAYS):
 
     query = f'''
     from(bucket: "{bucket}")
-        |> range(start: {start_time})
+        |> range(start: {mirrored_until.strftime("%Y-%m-%dT%H:%M:%SZ")})
         |> filter(fn: (r) => r["_measurement"] == "power_consumption")
         |> filter(fn: (r) => r["_field"] == "power")
         |> filter(fn: (r) => {exclude_filter})
         |> aggregateWindow(every: 30m, fn: mean, createEmpty: false)
+        |> keep(columns: ["_time", "device", "_value"])
     '''
 
-    logger.info(f"Fallback query: fetching 30-min means per device for {days} days...")
-
-    from collections import defaultdict, Counter
-
-    # Collect: {(date, slot): {device: mean_power}}
-    slot_device_data = defaultdict(lambda: defaultdict(float))
+    logger.info(f"Fallback query: fetching 30-min means per device since {mirrored_until:%Y-%m-%d %H:%M}...")
 
     with get_influx_client() as client:
-        query_api = client.query_api()
-        tables = query_api.query(query)
-
-        record_count = 0
-        for table in tables:
-            for record in table.records:
-                time = record.get_time()
-                value = record.get_value()
-                device = record.values.get("device", "unknown")
-                if time and value is not None:
-                    date_key = time.strftime("%Y-%m-%d")
-                    slot = time.hour * 2 + (1 if time.minute >= 30 else 0)
-                    slot_device_data[(date_key, slot)][device] = float(value)
-                    record_count += 1
+        frames.append(read_frame(client, query, ["_time", "device", "_value"], {"_value": "float64"}))
 
-    logger.info(f"Fetched {record_count} half-hourly records")
+    frame = pd.concat([f for f in frames if not f.empty] or frames[-1:], ignore_index=True)
+    frame = frame.dropna(subset=["_time", "_value"])
+    logger.info(f"Fetched {len(frame)} half-hourly records")
 
-    if not slot_device_data:
+    if frame.empty:
         logger.warning("No data returned from InfluxDB")
         return {s: 0.0 for s in range(SLOTS_PER_DAY)}
 
-    # Sum across devices per (date, slot), then average across days per slot
-    slot_totals = defaultdict(float)
-    slot_counts = Counter()
+    times = frame["_time"]
+    frame = frame.assign(
+        date_key=times.dt.floor("D"),
+        slot=times.dt.hour * 2 + (times.dt.minute >= 30).astype(int),
+        device=frame["device"].fillna("unknown")
+    )
 
-    for (date_key, slot), devices in slot_device_data.items():
-        total_power = sum(devices.values())
-        slot_totals[slot] += total_power
-        slot_counts[slot] += 1
+    # Sum across devices per (date, slot), then average across days per slot
+    per_device = frame.drop_duplicates(subset=["date_key", "slot", "device"], keep="last")
+    slot_totals = per_device.groupby(["date_key", "slot"])["_value"].sum()
+    slot_means = slot_totals.groupby(level="slot").mean()
 
     profile = {}
     for s in range(SLOTS_PER_DAY):
-        if slot_counts[s] > 0:
-            profile[s] = round(slot_totals[s] / slot_counts[s], 1)
+        if s in slot_means.index:
+            profile[s] = round(float(slot_means[s]), 1)
         else:
             profile[s] = 0.0
 
-    num_days = len(set(dk for dk, _ in slot_device_data.keys()))
+    num_days = frame["date_key"].nunique()
     logger.info(f"Computed half-hourly profile from {num_days} days of data")
 
     return dict(sorted(profile.items()))
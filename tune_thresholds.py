@@ -0,0 +1,445 @@
+"""
+Threshold auto-tuning for MyTapo appliance profiles.
+
+Loads a device's raw power history once into NumPy arrays (cached under
+state/tuning/, raw data comes from the Parquet mirror where available) and
+runs the vectorized detection kernel for every combination of a parameter
+grid in a process pool. Combinations are ranked against labelled events if a
+labels file is given, otherwise by stability heuristics:
+
+- stability: how little the event count changes when one parameter moves one
+  grid step (a plateau is more trustworthy than a cliff)
+- fragmentation: share of events starting shortly after the previous one ended
+  (one usage split into several events)
+- capped: share of events cut off at max_duration_seconds
+
+Labels file (CSV): columns `start,end` (ISO timestamps), optionally `device`.
+
+Usage:
+    python tune_thresholds.py kaffe_bar --days 365
+    python tune_thresholds.py kaffe_bar --labels espresso_labels.csv
+    python tune_thresholds.py television --grid threshold_on=20,30,40 --grid cooldown_seconds=60:600:60
+"""
+
+import os
+import sys
+import json
+import time
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from backfill_events import EventBackfiller
+from detection_engine import DEFAULT_DETECTION_TYPE, create_detector
+from detection_kernel import as_sample_arrays, detect_batch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "state",
+    "tuning"
+)
+
+# Default grid: multiples of the current profile value. Which confirmation
+# parameter is tuned depends on the detector (see tuned_parameters).
+DEFAULT_FACTORS = {
+    "threshold_on": (0.5, 0.75, 1.0, 1.25, 1.5, 2.0),
+    "threshold_off": (0.5, 0.75, 1.0, 1.25, 1.5, 2.0),
+    "cooling_confirmation_seconds": (0.25, 0.5, 1.0, 2.0, 4.0),
+    "pause_tolerance_seconds": (0.25, 0.5, 1.0, 2.0, 4.0),
+    "cooldown_seconds": (0.25, 0.5, 1.0, 2.0, 4.0),
+}
+
+
+def parse_grid_values(spec: str) -> List[float]:
+    """
+    Parse a grid axis: comma list ("20,30,40") or range ("60:600:60", stop inclusive).
+    """
+    if ":" in spec:
+        start, stop, step = (float(part) for part in spec.split(":"))
+        return [round(float(value), 6) for value in np.arange(start, stop + step / 2, step)]
+    return [float(part) for part in spec.split(",") if part.strip()]
+
+
+def default_grid(profile: dict, settings: dict) -> Dict[str, List[float]]:
+    """Grid around the device's current parameter values."""
+    current = current_parameters(profile, settings)
+    return {
+        name: sorted({round(value * factor, 1) for factor in DEFAULT_FACTORS[name]})
+        for name, value in current.items()
+    }
+
+
+def current_parameters(profile: dict, settings: dict) -> Dict[str, float]:
+    """
+    The tuned parameters as the profile's detector resolves them today.
+
+    The confirmation axis is the one the detector actually reads:
+    pause_tolerance_seconds for cycle profiles, cooling_confirmation_seconds
+    otherwise (each with its global settings fallback).
+    """
+    detector = create_detector("tuning", profile, settings)
+    return {
+        "threshold_on": detector.threshold_on,
+        "threshold_off": detector.threshold_off,
+        detector.confirmation_parameter: detector.confirmation,
+        "cooldown_seconds": detector.cooldown,
+    }
+
+
+def tuned_parameters(profile: dict, settings: dict) -> List[str]:
+    """Names of the parameters swept for this profile's detector."""
+    return list(current_parameters(profile, settings))
+
+
+def load_labels(path: str, device: str) -> np.ndarray:
+    """
+    Load labelled events as an (n, 2) int64 array of [start, end] epoch seconds.
+
+    Naive timestamps are treated as UTC.
+    """
+    frame = pd.read_csv(path)
+    if "device" in frame.columns:
+        frame = frame[frame["device"] == device]
+    starts = pd.to_datetime(frame["start"], utc=True).to_numpy(dtype="datetime64[s]").astype(np.int64)
+    ends = pd.to_datetime(frame["end"], utc=True).to_numpy(dtype="datetime64[s]").astype(np.int64)
+    order = np.argsort(starts)
+    return np.stack([starts[order], ends[order]], axis=1)
+
+
+def match_events(detected: np.ndarray, labels: np.ndarray, tolerance: float) -> Tuple[int, float]:
+    """
+    One-to-one match of detected and labelled intervals (both sorted by start).
+
+    Two intervals match if they overlap after widening the label by
+    `tolerance` seconds on both sides.
+
+    Returns:
+        Tuple of (matched count, mean absolute start error of the matches)
+    """
+    matched = 0
+    start_errors = 0.0
+    i = j = 0
+    while i < len(detected) and j < len(labels):
+        det_start, det_end = detected[i]
+        label_start, label_end = labels[j]
+        if det_end < label_start - tolerance:
+            i += 1
+        elif label_end + tolerance < det_start:
+            j += 1
+        else:
+            matched += 1
+            start_errors += abs(det_start - label_start)
+            i += 1
+            j += 1
+    return matched, (start_errors / matched if matched else 0.0)
+
+
+# Set once per pool worker by _init_worker, so the arrays are transferred once
+_WORKER: Dict[str, Any] = {}
+
+
+def _init_worker(device: str, profile: dict, settings: dict, timestamps: np.ndarray,
+                 powers: np.ndarray, labels: Optional[np.ndarray], tolerance: float,
+                 split_gap: float):
+    _WORKER.update(
+        device=device, profile=profile, settings=settings, timestamps=timestamps,
+        powers=powers, labels=labels, tolerance=tolerance, split_gap=split_gap
+    )
+
+
+def _evaluate(params: Dict[str, float]) -> Dict[str, Any]:
+    """Run the kernel over the whole history with one parameter combination."""
+    profile = {**_WORKER["profile"], **params}
+    detector = create_detector(_WORKER["device"], profile, _WORKER["settings"])
+    events = detect_batch(detector, _WORKER["timestamps"], _WORKER["powers"])
+    event = detector.finalize()
+    if event:
+        events.append(event)
+
+    intervals = np.array(
+        [(e.start_time.timestamp(), e.end_time.timestamp()) for e in events], dtype=np.float64
+    ).reshape(-1, 2)
+    durations = intervals[:, 1] - intervals[:, 0]
+    gaps = intervals[1:, 0] - intervals[:-1, 1]
+
+    result: Dict[str, Any] = dict(params)
+    result["events"] = len(events)
+    result["median_duration"] = float(np.median(durations)) if len(events) else 0.0
+    result["energy_wh"] = float(sum(e.energy_wh for e in events))
+    result["fragmentation"] = float(np.mean(gaps < _WORKER["split_gap"])) if len(gaps) else 0.0
+    max_duration = detector.max_duration
+    result["capped"] = (
+        float(np.mean(durations >= max_duration)) if max_duration and len(events) else 0.0
+    )
+
+    labels = _WORKER["labels"]
+    if labels is not None:
+        matched, start_error = match_events(intervals, labels, _WORKER["tolerance"])
+        precision = matched / len(events) if len(events) else 0.0
+        recall = matched / len(labels) if len(labels) else 0.0
+        result["precision"] = precision
+        result["recall"] = recall
+        result["f1"] = 2 * precision * recall / (precision + recall) if matched else 0.0
+        result["start_error"] = start_error
+    return result
+
+
+def count_stability(results: pd.DataFrame, grid: Dict[str, List[float]]) -> pd.Series:
+    """
+    1 - mean relative event-count change towards the grid neighbours.
+
+    Neighbours differ from a combination by one step along one axis.
+    """
+    axes = list(grid)
+    position = {
+        name: {value: index for index, value in enumerate(values)}
+        for name, values in grid.items()
+    }
+    keys = [tuple(position[name][row[name]] for name in axes) for _, row in results[axes].iterrows()]
+    counts = dict(zip(keys, results["events"].to_numpy()))
+
+    stability = []
+    for key in keys:
+        count = counts[key]
+        changes = []
+        for axis in range(len(axes)):
+            for step in (-1, 1):
+                neighbour = key[:axis] + (key[axis] + step,) + key[axis + 1:]
+                if neighbour in counts:
+                    changes.append(abs(counts[neighbour] - count) / max(count, 1))
+        stability.append(1.0 - min(1.0, float(np.mean(changes))) if changes else 1.0)
+    return pd.Series(stability, index=results.index)
+
+
+def rank_results(
+    results: pd.DataFrame,
+    grid: Dict[str, List[float]],
+    current: Dict[str, float],
+    labelled: bool
+) -> pd.DataFrame:
+    """Score and sort the sweep results (best first, ties go to the smallest change)."""
+    results = results.copy()
+    results["stability"] = count_stability(results, grid)
+    results["change"] = sum(
+        (results[name] - current[name]).abs() / max(abs(current[name]), 1) for name in grid
+    )
+    if labelled:
+        # F1 first, stability and start accuracy break ties
+        results["score"] = results["f1"] + 0.01 * results["stability"]
+        return results.sort_values(
+            ["score", "start_error", "change"], ascending=[False, True, True], ignore_index=True
+        )
+
+    results["score"] = results["stability"] - results["fragmentation"] - results["capped"]
+    results.loc[results["events"] == 0, "score"] = -np.inf
+    return results.sort_values(["score", "change"], ascending=[False, True], ignore_index=True)
+
+
+class ThresholdTuner:
+    """
+    Grid sweep of detection parameters for one device.
+
+    Usage:
+        tuner = ThresholdTuner("kaffe_bar", days=365)
+        ranked = tuner.sweep(tuner.default_grid())
+        print(ranked.head(10))
+    """
+
+    def __init__(
+        self,
+        device: str,
+        days: int = 365,
+        workers: Optional[int] = None,
+        refresh: bool = False
+    ):
+        """
+        Initialize the tuner.
+
+        Args:
+            device: Device whose profile is tuned
+            days: Days of history to evaluate
+            workers: Pool size (default: CPU count)
+            refresh: Reload the history instead of using the cached arrays
+        """
+        self.device = device
+        self.days = days
+        self.workers = workers or os.cpu_count() or 1
+        self.refresh = refresh
+        self.cache_dir = os.getenv("TUNING_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+        self.backfiller = EventBackfiller(days_back=days, workers=1)
+        if device not in self.backfiller.profiles:
+            raise ValueError(f"No appliance profile for device '{device}'")
+        self.profile = self.backfiller.profiles[device]
+        self.settings = self.backfiller.settings
+
+    def default_grid(self) -> Dict[str, List[float]]:
+        """Grid around the current profile values."""
+        return default_grid(self.profile, self.settings)
+
+    def load_history(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load the device's raw history (cached as .npz per device and day count).
+
+        Returns:
+            Tuple of (int64 epoch seconds, float32 watts)
+        """
+        cache_path = os.path.join(self.cache_dir, f"{self.device}_{self.days}d.npz")
+        if not self.refresh and os.path.exists(cache_path):
+            cached = np.load(cache_path)
+            logger.info(f"Loaded {len(cached['timestamps']):,} cached samples from {cache_path}")
+            return as_sample_arrays(cached["timestamps"], cached["powers"])
+
+        end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        start = end - timedelta(days=self.days)
+        logger.info(f"Loading {self.days} days of history for {self.device}...")
+        timestamps, powers = self.backfiller.query_power_data(self.device, start, end)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.tmp.npz"
+        np.savez(tmp_path, timestamps=timestamps, powers=powers)
+        os.replace(tmp_path, cache_path)
+        logger.info(f"Cached {len(timestamps):,} samples in {cache_path}")
+        return as_sample_arrays(timestamps, powers)
+
+    def sweep(
+        self,
+        grid: Dict[str, List[float]],
+        labels: Optional[np.ndarray] = None,
+        tolerance: float = 60,
+        split_gap: float = 300
+    ) -> pd.DataFrame:
+        """
+        Evaluate every grid combination and rank the results.
+
+        Args:
+            grid: Values per tuned parameter
+            labels: Optional (n, 2) array of labelled [start, end] epoch seconds
+            tolerance: Seconds of slack when matching detected to labelled events
+            split_gap: Gaps shorter than this count as fragmentation
+
+        Returns:
+            One row per combination, best first
+        """
+        timestamps, powers = self.load_history()
+        if len(timestamps) == 0:
+            raise RuntimeError(f"No power data for {self.device}")
+
+        names = list(grid)
+        combinations = [
+            dict(zip(names, values))
+            for values in itertools.product(*(grid[name] for name in names))
+        ]
+        # A threshold_off above threshold_on would never let an event end
+        combinations = [
+            params for params in combinations
+            if params.get("threshold_off", self.profile["threshold_off"])
+            <= params.get("threshold_on", self.profile["threshold_on"])
+        ]
+        logger.info(f"Sweeping {len(combinations)} combinations over {len(timestamps):,} samples "
+                    f"with {self.workers} workers...")
+
+        started = time.monotonic()
+        init_args = (self.device, self.profile, self.settings, timestamps, powers,
+                     labels, tolerance, split_gap)
+        if self.workers == 1:
+            _init_worker(*init_args)
+            rows = [_evaluate(params) for params in combinations]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=init_args
+            ) as pool:
+                chunksize = max(1, len(combinations) // (self.workers * 4))
+                rows = list(pool.map(_evaluate, combinations, chunksize=chunksize))
+        elapsed = time.monotonic() - started
+        logger.info(f"Sweep finished in {elapsed:.1f}s "
+                    f"({len(combinations) / elapsed if elapsed else 0:.1f} combinations/s)")
+
+        current = current_parameters(self.profile, self.settings)
+        return rank_results(pd.DataFrame(rows), grid, current, labels is not None)
+
+
+def print_ranking(ranked: pd.DataFrame, current: Dict[str, float], top: int):
+    """Print the best combinations and a profile snippet for the winner."""
+    columns = list(current) + ["events", "median_duration"]
+    if "f1" in ranked.columns:
+        columns += ["precision", "recall", "f1", "start_error"]
+    columns += ["stability", "fragmentation", "capped", "score"]
+
+    print("\nCurrent profile: " + ", ".join(f"{name}={value}" for name, value in current.items()))
+    print(f"\nTop {min(top, len(ranked))} of {len(ranked)} combinations:")
+    with pd.option_context("display.width", 200, "display.max_columns", None,
+                           "display.float_format", "{:.3f}".format):
+        print(ranked[columns].head(top).to_string(index=False))
+
+    best = ranked.iloc[0]
+    snippet = {
+        name: (int(best[name]) if float(best[name]).is_integer() else float(best[name]))
+        for name in current
+    }
+    print("\nSuggested profile values:")
+    print(json.dumps(snippet, indent=2))
+
+
+def main():
+    """Entry point."""
+    import argparse
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Grid-search detection parameters of a device")
+    parser.add_argument("device", help="Device name from appliance_profiles.json")
+    parser.add_argument("--days", type=int, default=365, help="Days of history (default: 365)")
+    parser.add_argument("--grid", action="append", default=[], metavar="PARAM=VALUES",
+                        help="Grid axis, e.g. threshold_on=400,600,800 or cooldown_seconds=30:300:30 "
+                             "(repeatable; axes not given use multiples of the current value)")
+    parser.add_argument("--labels", help="CSV of labelled events (start,end[,device])")
+    parser.add_argument("--tolerance", type=float, default=60,
+                        help="Seconds of slack when matching labels (default: 60)")
+    parser.add_argument("--split-gap", type=float, default=300,
+                        help="Gap in seconds below which consecutive events count as split (default: 300)")
+    parser.add_argument("--workers", type=int, default=None, help="Pool size (default: CPU count)")
+    parser.add_argument("--top", type=int, default=15, help="Rows to print (default: 15)")
+    parser.add_argument("--csv", help="Write all ranked results to this CSV file")
+    parser.add_argument("--refresh", action="store_true", help="Reload history instead of using the cache")
+    args = parser.parse_args()
+
+    try:
+        tuner = ThresholdTuner(args.device, days=args.days, workers=args.workers, refresh=args.refresh)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    grid = tuner.default_grid()
+    tuned = tuned_parameters(tuner.profile, tuner.settings)
+    for spec in args.grid:
+        name, _, values = spec.partition("=")
+        if name not in tuned:
+            detection_type = tuner.profile.get("detection_type", DEFAULT_DETECTION_TYPE)
+            logger.error(f"Parameter '{name}' is not used by {args.device}'s {detection_type} detector "
+                         f"(choose from {', '.join(tuned)})")
+            sys.exit(1)
+        grid[name] = sorted(set(parse_grid_values(values)))
+
+    labels = load_labels(args.labels, args.device) if args.labels else None
+    if labels is not None:
+        logger.info(f"Loaded {len(labels)} labelled events")
+
+    ranked = tuner.sweep(grid, labels=labels, tolerance=args.tolerance, split_gap=args.split_gap)
+    if args.csv:
+        ranked.to_csv(args.csv, index=False)
+        logger.info(f"Wrote {len(ranked)} results to {args.csv}")
+
+    print_ranking(ranked, current_parameters(tuner.profile, tuner.settings), args.top)
+
+
+if __name__ == "__main__":
+    main()